@@ -0,0 +1,36 @@
+"""style embedding hnsw indexes
+
+Revision ID: 3c1f7a9d2b64
+Revises: 57efbf9514a8
+Create Date: 2026-10-18 10:12:41.305117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f7a9d2b64'
+down_revision = '57efbf9514a8'
+branch_labels = None
+depends_on = None
+
+CATEGORIES = ['topwear', 'bottomwear', 'shoes', 'accessories']
+
+
+def upgrade():
+    for category in CATEGORIES:
+        op.create_index(f'ix_product_style_embedding_hnsw_{category}',
+                        'product', ['style_embedding'], unique=False,
+                        postgresql_using='hnsw',
+                        postgresql_with={'m': 16, 'ef_construction': 64},
+                        postgresql_ops={
+                            'style_embedding': 'vector_cosine_ops'},
+                        postgresql_where=sa.text(f"lower(sub_category) = '{category}'"))
+
+
+def downgrade():
+    for category in CATEGORIES:
+        op.drop_index(f'ix_product_style_embedding_hnsw_{category}',
+                      table_name='product')
@@ -0,0 +1,44 @@
+"""inventory updated_at
+
+Revision ID: 5d8e2b7a1c94
+Revises: 4c7e1a9f2d58
+Create Date: 2026-10-19 14:02:37.208114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8e2b7a1c94'
+down_revision = '4c7e1a9f2d58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('inventory', sa.Column('updated_at', sa.DateTime(timezone=True),
+                                         server_default=sa.text('now()'), nullable=False))
+    op.create_index(op.f('ix_inventory_updated_at'), 'inventory', ['updated_at'], unique=False)
+    # A trigger, so writes that don't go through the app are stamped too
+    op.execute("""
+        CREATE FUNCTION inventory_set_updated_at() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at = now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER inventory_updated_at
+        BEFORE INSERT OR UPDATE ON inventory
+        FOR EACH ROW EXECUTE FUNCTION inventory_set_updated_at()
+    """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER inventory_updated_at ON inventory")
+    op.execute("DROP FUNCTION inventory_set_updated_at()")
+    op.drop_index(op.f('ix_inventory_updated_at'), table_name='inventory')
+    op.drop_column('inventory', 'updated_at')
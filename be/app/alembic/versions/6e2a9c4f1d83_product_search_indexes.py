@@ -0,0 +1,34 @@
+"""product search indexes
+
+Revision ID: 6e2a9c4f1d83
+Revises: c3d81f5a0b47
+Create Date: 2026-10-18 20:41:05.117342
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2a9c4f1d83'
+down_revision = 'c3d81f5a0b47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index('ix_product_search_text_trgm', 'product',
+                    [sa.text("(name || ' ' || brand) gin_trgm_ops")],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_product_semantic_embedding_hnsw', 'product',
+                    ['semantic_embedding'], unique=False,
+                    postgresql_using='hnsw',
+                    postgresql_with={'m': 16, 'ef_construction': 64},
+                    postgresql_ops={'semantic_embedding': 'vector_cosine_ops'})
+
+
+def downgrade():
+    op.drop_index('ix_product_semantic_embedding_hnsw', table_name='product')
+    op.drop_index('ix_product_search_text_trgm', table_name='product')
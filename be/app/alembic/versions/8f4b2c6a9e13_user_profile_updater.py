@@ -0,0 +1,38 @@
+"""user style embedding in product space
+
+Revision ID: 8f4b2c6a9e13
+Revises: 5a9d3e1f7c20
+Create Date: 2026-10-18 18:32:44.910272
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+import pgvector.sqlalchemy
+
+
+# revision identifiers, used by Alembic.
+revision = '8f4b2c6a9e13'
+down_revision = '5a9d3e1f7c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nothing ever wrote a 768-d user vector, and one couldn't be compared
+    # with the 512-d product vectors anyway: existing values are dropped
+    op.alter_column('user', 'style_embedding',
+                    type_=pgvector.sqlalchemy.vector.VECTOR(dim=512),
+                    existing_type=pgvector.sqlalchemy.vector.VECTOR(dim=768),
+                    postgresql_using='NULL')
+    op.add_column('user', sa.Column('style_weight', sa.Float(), nullable=False, server_default='0'))
+    op.add_column('user', sa.Column('profile_updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('user', 'profile_updated_at')
+    op.drop_column('user', 'style_weight')
+    op.alter_column('user', 'style_embedding',
+                    type_=pgvector.sqlalchemy.vector.VECTOR(dim=768),
+                    existing_type=pgvector.sqlalchemy.vector.VECTOR(dim=512),
+                    postgresql_using='NULL')
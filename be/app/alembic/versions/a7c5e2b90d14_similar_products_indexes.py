@@ -0,0 +1,42 @@
+"""similar products indexes
+
+Revision ID: a7c5e2b90d14
+Revises: 6e2a9c4f1d83
+Create Date: 2026-10-18 21:36:18.402957
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c5e2b90d14'
+down_revision = '6e2a9c4f1d83'
+branch_labels = None
+depends_on = None
+
+CATEGORIES = ['topwear', 'bottomwear', 'shoes', 'accessories']
+GENDERS = ['men', 'women']
+
+
+def upgrade():
+    for category in CATEGORIES:
+        for gender in GENDERS:
+            op.create_index(f'ix_product_style_embedding_hnsw_{category}_{gender}',
+                            'product', ['style_embedding'], unique=False,
+                            postgresql_using='hnsw',
+                            postgresql_with={'m': 16, 'ef_construction': 64},
+                            postgresql_ops={
+                                'style_embedding': 'vector_cosine_ops'},
+                            postgresql_where=sa.text(
+                                f"lower(sub_category) = '{category}' AND lower(gender) = '{gender}'"))
+    op.create_index(op.f('ix_inventory_product_id'), 'inventory', ['product_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_inventory_product_id'), table_name='inventory')
+    for category in CATEGORIES:
+        for gender in GENDERS:
+            op.drop_index(f'ix_product_style_embedding_hnsw_{category}_{gender}',
+                          table_name='product')
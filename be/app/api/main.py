@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.routes import products, login, private, recommedation, users, utils
+from app.api.routes import events, products, login, private, recommedation, users, utils
 from app.core.config import settings
 
 api_router = APIRouter()
@@ -9,6 +9,7 @@ api_router.include_router(users.router)
 api_router.include_router(utils.router)
 api_router.include_router(products.router)
 api_router.include_router(recommedation.router)
+api_router.include_router(events.router)
 
 
 if settings.ENVIRONMENT == "local":
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, HTTPException
+
+from app.api.deps import CurrentUserId
+from app.models import InteractionEvent, Message
+from app.service.event_log import append_events, stamp_events
+from app.service.profile_events import record_interactions
+from app.service.queue_service import queue_service
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+# Events accepted per request
+MAX_EVENTS = 500
+
+
+@router.post("/", status_code=202, response_model=Message)
+async def record_events(
+    current_user_id: CurrentUserId,
+    events: InteractionEvent | list[InteractionEvent],
+) -> Message:
+    """
+    Record views, clicks, add-to-carts and purchases. Nothing touches the
+    database here: the events go to the Redis event stream (written to the
+    event log by the worker) and to the user's profile buffer.
+    """
+    if not isinstance(events, list):
+        events = [events]
+    if len(events) > MAX_EVENTS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {MAX_EVENTS} events per request"
+        )
+    events = stamp_events(events)
+    redis = await queue_service.get_redis()
+    await append_events(redis, current_user_id, events)
+    await record_interactions(redis, current_user_id, events)
+    return Message(message=f"{len(events)} events recorded")
@@ -1,104 +1,286 @@
+import base64
+import json
+import logging
 import uuid
 from typing import Any
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import tuple_
+from sqlmodel import col, select
+from sqlmodel.sql.expression import SelectOfScalar
 
-from app.api.deps import CurrentUser, SessionDep
+from app.api.deps import (
+    AsyncCurrentUser,
+    AsyncSessionDep,
+    get_current_active_superuser_async,
+    get_current_user_async,
+)
 from app.models import (
+    PRODUCT_PUBLIC_COLUMNS,
+    Message,
     Product,
+    ProductCompatibility,
     ProductCreate,
     ProductPublic,
     ProductsPublic,
     ProductUpdate,
-    Message,
 )
+from app.service import product_search
+from app.service.embedding_batcher import EncoderOverloaded
+from app.service.product_count import product_count
 from app.service.queue_service import queue_service
+from app.service.recommendation_cache import recommendation_cache
+from app.service.similar_products import similar_products
+from app.service.stock_bitmap import stock_bitmap
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+# Newest first; id breaks ties so every row has a unique position
+PRODUCT_ORDER = (col(Product.catalog_date).desc(), col(Product.id).desc())
+
+# Reads an in_stock page may take to refill the sold-out products it drops
+IN_STOCK_MAX_READS = 4
+
+
+def encode_cursor(catalog_date: int, product_id: uuid.UUID) -> str:
+    raw = json.dumps([catalog_date, str(product_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[int, uuid.UUID]:
+    try:
+        catalog_date, product_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return int(catalog_date), uuid.UUID(product_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def products_page_statement(
+    cursor: str | None, skip: int, limit: int
+) -> SelectOfScalar[Any]:
+    """
+    The public columns of one page of products, newest first. catalog_date
+    isn't public, it's selected last for the next cursor.
+    """
+    columns = (*PRODUCT_PUBLIC_COLUMNS, col(Product.catalog_date))
+    statement = select(*columns).order_by(*PRODUCT_ORDER)
+    if cursor:
+        catalog_date, product_id = decode_cursor(cursor)
+        statement = statement.where(
+            tuple_(col(Product.catalog_date), col(Product.id))
+            < (catalog_date, product_id)
+        )
+    elif skip:
+        statement = statement.offset(skip)
+    return statement.limit(limit)
+
 
 @router.get("/", response_model=ProductsPublic)
-def read_products(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+async def read_products(
+    session: AsyncSessionDep,
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=1, le=100),
+    cursor: str | None = None,
+    in_stock: bool = False,
+) -> Any:
     """
-    Retrieve products.
+    Retrieve products, newest first.
+
+    Pass the returned `next_cursor` as `cursor` to get the next page; each
+    page is an index range scan however deep it is. `skip` still works for
+    older clients, but costs a scan of every skipped row. The two can't be
+    combined.
+
+    With `in_stock`, sold-out products are dropped and the page is refilled
+    with the products after it, up to IN_STOCK_MAX_READS reads. Only when
+    nearly everything is sold out can a page with a `next_cursor` hold
+    fewer than `limit` products.
     """
+    if cursor and skip:
+        raise HTTPException(status_code=400, detail="Pass either cursor or skip")
 
-    count_statement = select(func.count()).select_from(Product)
-    count = session.exec(count_statement).one()
-    statement = select(Product).offset(skip).limit(limit)
-    products = session.exec(statement).all()
-    public_data = [ProductPublic.model_validate(p) for p in products]
+    products: list[Any] = []
+    # Last row read, in stock or not: the next read starts after it
+    last = None
+    more = False
+    for _ in range(IN_STOCK_MAX_READS if in_stock else 1):
+        wanted = limit - len(products)
+        statement = products_page_statement(cursor, skip, wanted)
+        rows = (await session.exec(statement)).all()
+        more = len(rows) == wanted
+        if rows:
+            last = rows[-1]
+            cursor, skip = encode_cursor(last.catalog_date, last.id), 0
+        products.extend(p for p in rows if not in_stock or stock_bitmap.in_stock(p.id))
+        if not more or len(products) == limit:
+            break
+    public_data = stock_bitmap.mark([ProductPublic.model_validate(p) for p in products])
 
-    return ProductsPublic(data=public_data, count=count)
+    next_cursor = None
+    if more and last is not None:
+        next_cursor = encode_cursor(last.catalog_date, last.id)
+
+    return ProductsPublic(
+        data=public_data,
+        count=await product_count.get(session),
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/search", response_model=ProductsPublic)
+async def search_products(
+    session: AsyncSessionDep,
+    q: str = Query(min_length=1, max_length=200),
+    gender: str | None = None,
+    category: str | None = None,
+    min_price: float | None = Query(default=None, ge=0),
+    max_price: float | None = Query(default=None, ge=0),
+    in_stock: bool = False,
+    skip: int = Query(default=0, ge=0),
+    limit: int = Query(default=20, ge=1, le=100),
+) -> Any:
+    """
+    Search products by meaning (semantic embedding) and by name / brand
+    (trigram match), best first. `category` filters on sub_category.
+    `count` is the number of matches found, at most 2 x SEARCH_CANDIDATES.
+    """
+    filters = product_search.search_filters(gender, category, min_price, max_price)
+    try:
+        rows, total = await product_search.search_products(
+            session, q, filters, skip, limit, in_stock=in_stock
+        )
+    except EncoderOverloaded:
+        raise HTTPException(
+            status_code=503,
+            detail="Search is overloaded, try again",
+            headers={"Retry-After": "1"},
+        )
+    return ProductsPublic(
+        data=stock_bitmap.mark([ProductPublic.model_validate(r) for r in rows]),
+        count=total,
+    )
 
 
 @router.get("/{id}", response_model=ProductPublic)
-def read_product(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+async def read_product(
+    session: AsyncSessionDep, current_user: AsyncCurrentUser, id: uuid.UUID
+) -> Any:
     """
     Get product by ID.
     """
-    product = session.get(Product, id)
+    statement = select(*PRODUCT_PUBLIC_COLUMNS).where(Product.id == id)
+    product = (await session.exec(statement)).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return stock_bitmap.mark([ProductPublic.model_validate(product)])[0]
+
+
+@router.get(
+    "/{id}/similar",
+    response_model=ProductsPublic,
+    dependencies=[Depends(get_current_user_async)],
+)
+async def read_similar_products(
+    session: AsyncSessionDep,
+    id: uuid.UUID,
+    gender: str | None = None,
+    min_price: float | None = Query(default=None, ge=0),
+    max_price: float | None = Query(default=None, ge=0),
+    in_stock: bool = False,
+    limit: int = Query(default=12, ge=1, le=100),
+) -> Any:
+    """
+    Visually similar products of the same category, most similar first.
+    """
+    rows = await similar_products(
+        session,
+        id,
+        limit,
+        gender=gender,
+        min_price=min_price,
+        max_price=max_price,
+        in_stock=in_stock,
+    )
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return ProductsPublic(
+        data=stock_bitmap.mark([ProductPublic.model_validate(r) for r in rows]),
+        count=len(rows),
+    )
 
 
 @router.post("/", response_model=ProductPublic)
 async def create_product(
-    *, session: SessionDep, current_user: CurrentUser, product_in: ProductCreate
+    *,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+    product_in: ProductCreate,
 ) -> Any:
     product = Product.model_validate(
         product_in,
     )
+    session.add(product)
+    await session.commit()
+    await session.refresh(product)
+
+    # Queued after the commit, so the worker always finds the row
     queued = await queue_service.queue_product(product_id=product.id)
 
     if not queued:
         raise HTTPException(status_code=500, detail="Queuing issue")
 
-    session.add(product)
-    session.commit()
-    session.refresh(product)
-
     return product
 
 
-@router.put("/{id}", response_model=ProductPublic)
-def update_product(
+# Products have no owner, only superusers edit the catalog
+@router.put(
+    "/{id}",
+    response_model=ProductPublic,
+    dependencies=[Depends(get_current_active_superuser_async)],
+)
+async def update_product(
     *,
-    session: SessionDep,
-    current_user: CurrentUser,
+    session: AsyncSessionDep,
     id: uuid.UUID,
     product_in: ProductUpdate,
 ) -> Any:
     """
     Update an product.
     """
-    product = session.get(Product, id)
+    product = await session.get(Product, id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    if not current_user.is_superuser and (product.owner_id != current_user.id):
-        raise HTTPException(status_code=400, detail="Not enough permissions")
     update_dict = product_in.model_dump(exclude_unset=True)
     product.sqlmodel_update(update_dict)
     session.add(product)
-    session.commit()
-    session.refresh(product)
+    await session.commit()
+    await session.refresh(product)
+
+    # Cached outfits show the product's fields: its own, and those of every
+    # base product it's a candidate of (outfits only use a base's edges)
+    bases = await session.exec(
+        select(ProductCompatibility.base_product_id).where(
+            ProductCompatibility.recommended_product_id == id
+        )
+    )
+    try:
+        await recommendation_cache.invalidate([id, *bases.all()])
+    except Exception as e:
+        # Stale entries then live until RECOMMENDATION_CACHE_TTL
+        logger.warning(f"Recommendation cache unavailable: {e}")
     return product
 
 
-@router.delete("/{id}")
-def delete_product(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
-) -> Message:
+@router.delete("/{id}", dependencies=[Depends(get_current_active_superuser_async)])
+async def delete_product(session: AsyncSessionDep, id: uuid.UUID) -> Message:
     """
     Delete an product.
     """
-    product = session.get(Product, id)
+    product = await session.get(Product, id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    if not current_user.is_superuser and (product.owner_id != current_user.id):
-        raise HTTPException(status_code=400, detail="Not enough permissions")
-    session.delete(product)
-    session.commit()
+    await session.delete(product)
+    await session.commit()
     return Message(message="Product deleted successfully")
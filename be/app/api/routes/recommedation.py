@@ -1,11 +1,45 @@
+import json
+import logging
+import time
 import uuid
-from fastapi import APIRouter, HTTPException
+from collections.abc import Iterable
+from typing import Any
 
-from sqlmodel import Session, select, and_
-from sentence_transformers import util
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.api.deps import SessionDep, CurrentUser
-from app.models import PersonalizedOutfits, Product, ProductCompatibility, User
+from app.api.deps import (
+    AsyncCurrentUser,
+    AsyncSessionDep,
+    get_current_active_superuser_async,
+)
+from app.core.config import settings
+from app.models import (
+    PersonalizedOutfits,
+    PersonalizedOutfitsBatch,
+    PersonalizedOutfitsBatchRequest,
+    Product,
+    ProductCompatibility,
+    ProductOutfit,
+    User,
+    product_load_options,
+)
+from app.service.compatibility_graph import compatibility_graph
+from app.service.outfit_assembly import (
+    N_OUTFITS,
+    PAIR_WEIGHT,
+    Outfit,
+    OutfitAssembler,
+    get_outfit_assembler,
+    select_disjoint,
+)
+from app.service.recommendation_cache import recommendation_cache
+from app.service.stock_bitmap import stock_bitmap
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/recommendation", tags=["/recommendation"])
 USER_WEIGHTS = {
@@ -35,105 +69,436 @@ def calculate_price_score(user: User, product: Product) -> float:
         return 0.1
 
 
-def generate_personalized_outfits(session: Session, user: User, base_product: Product):
+def calculate_price_scores(
+    user: User, prices: np.ndarray, categories: list[str]
+) -> np.ndarray:
+    """Vectorised calculate_price_score over all candidates."""
+    codes: dict[str, int] = {}
+    inverse = np.array(
+        [codes.setdefault(c.lower(), len(codes)) for c in categories], dtype=np.int32
+    )
+    dna = [user.spending_profile.get(c, {}) for c in codes]
+    avg_spent = np.array([d.get("avg", 0) for d in dna], dtype=np.float32)[inverse]
+    max_spent = np.array([d.get("max", 0) for d in dna], dtype=np.float32)[inverse]
+
+    ratio = (prices - avg_spent) / (max_spent - avg_spent + 1e-6)
+    scores = np.where(
+        prices <= avg_spent,
+        1.0,
+        np.where(prices <= max_spent, 1.0 - ratio * user.price_sensitivity_score, 0.1),
+    )
+    return np.where(avg_spent == 0, 0.5, scores).astype(np.float32)
+
+
+def calculate_style_scores(
+    user: User, embeddings: list[list[float] | None]
+) -> np.ndarray:
+    """
+    Cosine similarity between the user's Style DNA and every candidate, as a
+    single matrix-vector product. Missing vectors score a neutral 0.6.
+    """
+    scores = np.full(len(embeddings), 0.6, dtype=np.float32)
+    if user.style_embedding is None:
+        return scores
+
+    user_vec = np.asarray(user.style_embedding, dtype=np.float32)
+    user_norm = np.linalg.norm(user_vec)
+    present = [
+        (i, e)
+        for i, e in enumerate(embeddings)
+        if e is not None and len(e) == len(user_vec)
+    ]
+    if not present or not user_norm:
+        return scores
+
+    rows = [i for i, _ in present]
+    matrix = np.stack([e for _, e in present], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * user_norm
+    scores[rows] = (matrix @ user_vec) / np.maximum(norms, 1e-12)
+    return scores
+
+
+def calculate_user_scores(user: User, products: list[Product]) -> np.ndarray:
+    """
+    The user-dependent part of the re-rank score (price + style). It doesn't
+    depend on the base product, so shared candidates are scored once.
+    """
+    if not products:
+        return np.zeros(0, dtype=np.float32)
+    # Read each ORM attribute once, everything after works on arrays
+    prices = np.array([p.price for p in products], dtype=np.float32)
+    categories = [p.sub_category for p in products]
+    embeddings = [p.style_embedding for p in products]
+
+    return (
+        calculate_price_scores(user, prices, categories) * USER_WEIGHTS["price_match"]
+        + calculate_style_scores(user, embeddings) * USER_WEIGHTS["style_alignment"]
+    )
+
+
+def rank_candidates(
+    user: User, products: list[Product], comp_scores: list[float]
+) -> np.ndarray:
+    """Final re-rank score of every candidate, weighted by USER_WEIGHTS."""
+    if not products:
+        return np.zeros(0, dtype=np.float32)
+    compatibility = np.asarray(comp_scores, dtype=np.float32)
+    scores: np.ndarray = compatibility * USER_WEIGHTS[
+        "compatibility"
+    ] + calculate_user_scores(user, products)
+    return scores
+
+
+async def load_products(
+    session: AsyncSession, product_ids: Iterable[uuid.UUID], *embeddings: str
+) -> dict[uuid.UUID, Product]:
+    """Products by id in one query, with only the requested embeddings."""
+    if not product_ids:
+        return {}
+    statement = (
+        select(Product)
+        .options(*product_load_options(*embeddings))
+        .where(col(Product.id).in_(list(product_ids)))
+    )
+    return {p.id: p for p in (await session.exec(statement)).all()}
+
+
+async def load_outfit_triples(
+    session: AsyncSession, base_ids: list[uuid.UUID]
+) -> dict[uuid.UUID, list[ProductOutfit]]:
+    statement = select(ProductOutfit).where(
+        col(ProductOutfit.base_product_id).in_(base_ids)
+    )
+    triples: dict[uuid.UUID, list[ProductOutfit]] = {}
+    for t in (await session.exec(statement)).all():
+        triples.setdefault(t.base_product_id, []).append(t)
+    return triples
+
+
+async def load_edges(
+    session: AsyncSession, base_ids: list[uuid.UUID]
+) -> dict[uuid.UUID, list[tuple[uuid.UUID, float]]]:
+    """
+    (candidate id, compatibility_score) pairs of every base product. Edges
+    come from the in-memory graph when it's loaded, otherwise from one DB
+    query for all of them.
+    """
+    edges: dict[uuid.UUID, list[tuple[uuid.UUID, float]]] = {}
+    missing: list[uuid.UUID] = []
+    for base_id in base_ids:
+        graph_edges = compatibility_graph.get_edges(base_id)
+        if graph_edges is None:
+            missing.append(base_id)
+        else:
+            edges[base_id] = graph_edges
+
+    if missing:
+        statement = select(
+            ProductCompatibility.base_product_id,
+            ProductCompatibility.recommended_product_id,
+            ProductCompatibility.compatibility_score,
+        ).where(col(ProductCompatibility.base_product_id).in_(missing))
+        for base_id, rec_id, score in (await session.exec(statement)).all():
+            edges.setdefault(base_id, []).append((rec_id, score))
+    return edges
+
+
+def pick_precomputed_outfits(
+    base_product: Product,
+    triples: list[ProductOutfit],
+    pieces: dict[uuid.UUID, Product],
+    user_scores: dict[uuid.UUID, float],
+    n_outfits: int = N_OUTFITS,
+) -> list[Outfit] | None:
+    """
+    Re-weights the outfits the worker stored for the base product with the
+    user's DNA and picks the best disjoint ones. The work is bounded by
+    OUTFIT_TRIPLES_PER_PRODUCT, however many candidates the product has.
+    None when there aren't enough stored outfits, so the caller assembles live.
+    """
+    weight = USER_WEIGHTS["compatibility"]
+    outfits: list[tuple[uuid.UUID, ...]] = []
+    scores: list[float] = []
+    for t in triples:
+        ids = (t.bottom_id, t.shoe_id, t.accessory_id)
+        if all(pid in pieces for pid in ids):
+            outfits.append(ids)
+            scores.append(
+                (t.bottom_score + t.shoe_score + t.accessory_score) * weight
+                + sum(user_scores[pid] for pid in ids)
+                + PAIR_WEIGHT * t.pair_score
+            )
+
+    picked = select_disjoint(outfits, np.asarray(scores), n_outfits)
+    if len(picked) < n_outfits:
+        return None
+    return [
+        OutfitAssembler.make_outfit(base_product, [pieces[pid] for pid in ids])
+        for ids in picked
+    ]
+
+
+def assemble_outfits(
+    base_product: Product,
+    edges: list[tuple[uuid.UUID, float]],
+    candidates: dict[uuid.UUID, Product],
+    user_scores: dict[uuid.UUID, float],
+) -> list[Outfit]:
+    edges = [(pid, comp) for pid, comp in edges if pid in candidates]
+    products = [candidates[pid] for pid, _ in edges]
+    scores = np.array(
+        [
+            comp * USER_WEIGHTS["compatibility"] + user_scores[pid]
+            for pid, comp in edges
+        ],
+        dtype=np.float32,
+    )
+    return get_outfit_assembler().assemble(base_product, products, scores)
+
+
+def score_products(
+    user: User, products: dict[uuid.UUID, Product]
+) -> dict[uuid.UUID, float]:
+    scores = calculate_user_scores(user, list(products.values()))
+    return dict(zip(products, scores.tolist(), strict=True))
+
+
+async def generate_personalized_outfits(
+    session: AsyncSession,
+    user: User,
+    base_products: list[Product],
+    deadline: float | None = None,
+) -> tuple[dict[uuid.UUID, list[Outfit]], list[uuid.UUID]]:
     """
     1. Retrieval: Fetch pre-computed items from the Graph.
     2. Re-rank: Apply User DNA.
     3. Outfit Construction: Assemble Top/Bottom/Shoe/Acc sets.
+
+    Works on many base products at once: every step is one query for all
+    of them, and candidates shared between base products are loaded and
+    scored once. Sold-out pieces are dropped before anything is loaded, so
+    outfits are back-filled with the next-best in-stock candidates.
+    Returns (outfits per base id, ids not done by `deadline`), the deadline
+    is checked before every load and between live assemblies.
     """
+    by_id = {b.id: b for b in base_products}
+    results: dict[uuid.UUID, list[Outfit]] = {}
 
-    statement = (
-        select(Product, ProductCompatibility.compatibility_score)
-        .join(
-            ProductCompatibility,
-            and_(Product.id == ProductCompatibility.recommended_product_id),
-        )
-        .where(ProductCompatibility.base_product_id == base_product.id)
+    def expired() -> bool:
+        return deadline is not None and time.perf_counter() > deadline
+
+    if expired():
+        return results, list(by_id)
+    # Outfits materialised by the worker, only re-weighted here
+    triples = await load_outfit_triples(session, list(by_id))
+    piece_ids = {
+        pid
+        for group in triples.values()
+        for t in group
+        for pid in (t.bottom_id, t.shoe_id, t.accessory_id)
+    }
+    if expired():
+        return results, list(by_id)
+    # Stored outfits with a sold-out piece are skipped; when fewer than
+    # N_OUTFITS remain, the product is assembled live below
+    pieces = await load_products(
+        session, stock_bitmap.filter_ids(piece_ids), "style_embedding"
     )
-    results = session.exec(statement).all()
-    scored_items = []
 
-    for candidate, comp_score in results:
-        p_score = calculate_price_score(user, candidate)
-        if not user.style_embedding or not candidate.style_embedding:
-            u_style_score = 0.6
-        else:
-            u_style_score = util.cos_sim(
-                user.style_embedding, candidate.style_embedding
-            ).item()
-
-        final_rank_score = (
-            (comp_score * USER_WEIGHTS["compatibility"])
-            + (p_score * USER_WEIGHTS["price_match"])
-            + (u_style_score * USER_WEIGHTS["style_alignment"])
-        )
+    def pick_all() -> None:
+        user_scores = score_products(user, pieces)
+        for base_id, group in triples.items():
+            outfits = pick_precomputed_outfits(
+                by_id[base_id], group, pieces, user_scores
+            )
+            if outfits is not None:
+                results[base_id] = outfits
 
-        scored_items.append({"product": candidate, "score": final_rank_score})
-
-    scored_items.sort(key=lambda x: x["score"], reverse=True)
-    outfits = []
-
-    for i in range(5):
-        try:
-            outfit = {
-                "base": base_product,
-                "bottom": next(
-                    item["product"]
-                    for item in scored_items
-                    if item["product"].sub_category == "Bottomwear"
-                ),
-                "shoe": next(
-                    item["product"]
-                    for item in scored_items
-                    if item["product"].sub_category == "Shoes"
-                ),
-                "accessory": next(
-                    item["product"]
-                    for item in scored_items
-                    if item["product"].sub_category == "Accessories"
-                ),
-            }
-            scored_items = [
-                item
-                for item in scored_items
-                if item["product"].id
-                not in [outfit["bottom"].id, outfit["shoe"].id, outfit["accessory"].id]
-            ]
-            outfits.append(outfit)
-        except StopIteration:
-            break
-
-    return outfits
+    await run_in_threadpool(pick_all)
 
+    live = [base_id for base_id in by_id if base_id not in results]
+    if not live:
+        return results, []
 
-@router.get("/{product_id}", response_model=PersonalizedOutfits)
-def get_personalized_outfits_route(
-    product_id: uuid.UUID,
-    session: SessionDep,
-    current_user: CurrentUser,
-):
+    if expired():
+        return results, live
+    edges = await load_edges(session, live)
+    if expired():
+        return results, live
+    candidates = await load_products(
+        session,
+        stock_bitmap.filter_ids(pid for group in edges.values() for pid, _ in group),
+        "style_embedding",
+        "complementary_embedding",
+    )
+
+    pending: list[uuid.UUID] = []
+
+    # Ranking long candidate lists and the beam search are CPU work
+    def assemble_all() -> None:
+        user_scores = score_products(user, candidates)
+        for base_id in live:
+            if expired():
+                pending.append(base_id)
+                continue
+            results[base_id] = assemble_outfits(
+                by_id[base_id], edges.get(base_id, []), candidates, user_scores
+            )
+
+    await run_in_threadpool(assemble_all)
+    return results, pending
+
+
+def serialize_outfits(outfits: list[Outfit]) -> bytes:
+    """Serialized PersonalizedOutfits, the body that gets cached."""
+    response = PersonalizedOutfits.model_validate({"outfits": outfits or []})
+    stock_bitmap.mark(
+        [p for o in response.outfits for p in (o.base, o.bottom, o.shoe, o.accessory)]
+    )
+    return response.model_dump_json().encode()
+
+
+def restock_body(body: bytes) -> bytes | None:
     """
-    Fetch the base product, then retrieve and re-rank compatible items
-    to build 5 personalized outfits based on the user's DNA.
+    A cached body with is_in_stock refreshed from the stock bitmap, or None
+    (regenerate it) when one of its pieces has sold out since.
     """
-    print(current_user)
+    data = json.loads(body)
+    changed = False
+    for outfit in data["outfits"]:
+        for slot in ("base", "bottom", "shoe", "accessory"):
+            product = outfit[slot]
+            in_stock = stock_bitmap.in_stock(uuid.UUID(product["id"]))
+            if not in_stock and slot != "base":
+                return None
+            if product.get("is_in_stock") != in_stock:
+                product["is_in_stock"] = in_stock
+                changed = True
+    return json.dumps(data, separators=(",", ":")).encode() if changed else body
 
-    base_product = session.get(Product, product_id)
-    if not base_product:
-        raise HTTPException(status_code=404, detail="Product not found")
 
+async def cached_bodies(
+    user: User, product_ids: list[uuid.UUID]
+) -> tuple[dict[uuid.UUID, bytes], dict[uuid.UUID, str]]:
+    """(cached body per product id, cache key per product id still missing)."""
+    if not settings.RECOMMENDATION_CACHE_ENABLED:
+        return {}, {}
     try:
-        recommendations = generate_personalized_outfits(
-            session=session, user=current_user, base_product=base_product
-        )
+        if not await recommendation_cache.available():
+            return {}, {}
+        keys = await recommendation_cache.keys(user, product_ids)
+        cached = await recommendation_cache.get_many(list(keys.values()))
+    except Exception as e:
+        # A cache outage only costs latency
+        logger.warning(f"Recommendation cache unavailable: {e}")
+        return {}, {}
+    bodies: dict[uuid.UUID, bytes] = {}
+    for pid, body in zip(keys, cached, strict=True):
+        if body is not None and (body := restock_body(body)) is not None:
+            bodies[pid] = body
+    return bodies, {pid: key for pid, key in keys.items() if pid not in bodies}
+
+
+async def store_bodies(
+    keys: dict[uuid.UUID, str], bodies: dict[uuid.UUID, bytes]
+) -> None:
+    entries = {keys[pid]: body for pid, body in bodies.items() if pid in keys}
+    if not entries:
+        return
+    try:
+        await recommendation_cache.set_many(entries)
     except Exception as e:
-        print(f"Error generating outfits: {e}")
+        logger.warning(f"Recommendation cache unavailable: {e}")
+
+
+async def build_outfit_bodies(
+    session: AsyncSession,
+    user: User,
+    product_ids: list[uuid.UUID],
+    deadline: float | None = None,
+) -> tuple[dict[uuid.UUID, bytes], list[uuid.UUID], list[uuid.UUID]]:
+    """(body per product id, ids past the deadline, ids not found)."""
+    bodies, keys = await cached_bodies(user, product_ids)
+    missing = [pid for pid in product_ids if pid not in bodies]
+    if not missing:
+        return bodies, [], []
+
+    # Only the public fields of the base products are used
+    base_products = await load_products(session, missing)
+    not_found = [pid for pid in missing if pid not in base_products]
+
+    try:
+        outfits, pending = await generate_personalized_outfits(
+            session, user, list(base_products.values()), deadline=deadline
+        )
+    except Exception:
+        logger.exception("Error generating outfits")
         raise HTTPException(
             status_code=500,
             detail="Could not generate recommendations at this time.",
         )
 
-    if not recommendations:
-        return {"outfits": []}
+    fresh = {pid: serialize_outfits(o) for pid, o in outfits.items()}
+    await store_bodies(keys, fresh)
+    bodies.update(fresh)
+    return bodies, pending, not_found
+
+
+@router.get("/cache/stats", dependencies=[Depends(get_current_active_superuser_async)])
+async def get_recommendation_cache_stats() -> dict[str, Any]:
+    """Hit/miss counters and memory use of the outfit response cache."""
+    return await recommendation_cache.stats()
+
+
+@router.post("/batch", response_model=PersonalizedOutfitsBatch)
+async def get_personalized_outfits_batch_route(
+    body: PersonalizedOutfitsBatchRequest,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+) -> Response:
+    """
+    Outfits for many base products at once, e.g. for listing pages. The
+    user is loaded once and shared candidates are fetched and scored once.
+    Products not done within RECOMMENDATION_BATCH_TIME_BUDGET_MS are listed
+    in `pending` (fetch them again), unknown ones in `not_found`.
+    """
+    product_ids = list(dict.fromkeys(body.product_ids))
+    deadline = time.perf_counter() + settings.RECOMMENDATION_BATCH_TIME_BUDGET_MS / 1000
+
+    bodies, pending, not_found = await build_outfit_bodies(
+        session, current_user, product_ids, deadline=deadline
+    )
+
+    # Each cached body is {"outfits": [...]}, spliced in as is instead of
+    # being parsed and serialized again
+    results = b",".join(
+        b'{"product_id":"%s",%s' % (str(pid).encode(), bodies[pid][1:])
+        for pid in product_ids
+        if pid in bodies
+    )
+    content = b'{"results":[%s],"pending":%s,"not_found":%s}' % (
+        results,
+        json.dumps([str(pid) for pid in pending]).encode(),
+        json.dumps([str(pid) for pid in not_found]).encode(),
+    )
+    return Response(content=content, media_type="application/json")
+
+
+@router.get("/{product_id}", response_model=PersonalizedOutfits)
+async def get_personalized_outfits_route(
+    product_id: uuid.UUID,
+    session: AsyncSessionDep,
+    current_user: AsyncCurrentUser,
+) -> Response:
+    """
+    Fetch the base product, then retrieve and re-rank compatible items
+    to build 5 personalized outfits based on the user's DNA.
+    Responses are cached per (profile version, product, graph version).
+    """
+    bodies, _, not_found = await build_outfit_bodies(
+        session, current_user, [product_id]
+    )
+    if not_found:
+        raise HTTPException(status_code=404, detail="Product not found")
 
-    return {"outfits": recommendations}
+    return Response(content=bodies[product_id], media_type="application/json")
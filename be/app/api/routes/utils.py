@@ -1,9 +1,12 @@
+from typing import Any
+
 import boto3
-from fastapi import APIRouter, UploadFile, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, HTTPException
 from botocore.exceptions import NoCredentialsError
 
-from app.api.deps import CurrentUser
+from app.api.deps import CurrentUser, get_current_active_superuser
 from app.core.config import settings
+from app.service.embedding_batcher import text_batcher, vision_batcher
 
 
 router = APIRouter(prefix="/utils", tags=["utils"])
@@ -54,3 +57,9 @@ async def upload_image(file: UploadFile, file_name: str, current_user: CurrentUs
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
+
+
+@router.get("/embedding-stats/", dependencies=[Depends(get_current_active_superuser)])
+async def embedding_stats() -> dict[str, dict[str, Any]]:
+    """Queue depth, batch sizes and rejections of this process' encoders."""
+    return {b.name: b.stats() for b in (text_batcher, vision_batcher)}
@@ -66,6 +66,10 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    # API: connections of the async engine used by the hot routes
+    ASYNC_DB_POOL_SIZE: int = 20
+    ASYNC_DB_MAX_OVERFLOW: int = 10
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
@@ -118,5 +122,98 @@ class Settings(BaseSettings):
     VULTR_BUCKET_NAME: str | None = None
     VULTR_REGION: str | None = None
 
+    # API: keep the compatibility graph in memory, refreshed over Redis pub/sub
+    COMPATIBILITY_GRAPH_IN_MEMORY: bool = True
+    # API: seconds the total product count of GET /products is cached for
+    PRODUCT_COUNT_TTL: int = 60
+    # API: seconds between refreshes of the in-memory stock bitmap, each one
+    # only re-reads the products whose Inventory rows were written since
+    STOCK_REFRESH_SECONDS: int = 30
+    # API: seconds between full rebuilds of the stock bitmap (deleted
+    # Inventory rows only show up in those)
+    STOCK_FULL_REFRESH_SECONDS: int = 600
+    # API: how outfits are assembled from the re-ranked candidates
+    OUTFIT_ASSEMBLER: Literal["greedy", "beam"] = "beam"
+    OUTFIT_BEAM_WIDTH: int = 8
+    # API: best candidates per category the beam search considers
+    OUTFIT_BUCKET_SIZE: int = 24
+    # API: hard budget for the beam search, the rest is filled greedily
+    OUTFIT_TIME_BUDGET_MS: float = 20.0
+    # API: cache of personalized outfit responses, see recommendation_cache
+    RECOMMENDATION_CACHE_ENABLED: bool = True
+    RECOMMENDATION_CACHE_TTL: int = 15 * 60
+    # Separate Redis for the entries, with maxmemory and an evicting policy.
+    # Responses are not cached when it's unset or unbounded
+    RECOMMENDATION_CACHE_REDIS_URL: str | None = None
+    # API: POST /recommendation/batch returns what it has after this long
+    RECOMMENDATION_BATCH_TIME_BUDGET_MS: float = 800.0
+
+    # Worker: source rows scored per matrix product in the full graph rebuild
+    COMPATIBILITY_REBUILD_BLOCK_SIZE: int = 512
+    # Worker: nearest candidates fetched per target category, in CATEGORY_MAP order
+    COMPATIBILITY_CANDIDATE_LIMITS: list[int] = [500, 300, 200]
+    # pgvector hnsw.ef_search for candidate retrieval (raised to the limit if lower)
+    COMPATIBILITY_ANN_EF_SEARCH: int = 100
+    # Worker: products encoded per batched ingestion job
+    INGEST_BATCH_SIZE: int = 32
+    # Worker: failed runs after which batched ingestion stops picking a product
+    INGEST_MAX_ATTEMPTS: int = 3
+    # Worker: after this long a batch's claim on its products lapses (job died)
+    INGEST_CLAIM_TTL_SECONDS: int = 15 * 60
+    # Worker: shared image fetcher (parallel downloads, per-request timeout, retries)
+    IMAGE_DOWNLOAD_CONCURRENCY: int = 8
+    IMAGE_DOWNLOAD_TIMEOUT: float = 10.0
+    IMAGE_DOWNLOAD_RETRIES: int = 3
+    # Worker: on-disk cache of the encoded taxonomy prompts (None disables it)
+    LABEL_BANK_CACHE_DIR: str | None = ".cache/label_bank"
+    # Worker: encoder backend per model, see app/worker/utils/encoders.py.
+    # CLIP has no ONNX export in sentence-transformers, so no onnx for vision
+    VISION_ENCODER_BACKEND: Literal["torch", "int8"] = "torch"
+    TEXT_ENCODER_BACKEND: Literal["torch", "onnx", "int8"] = "torch"
+    # Worker: where inference and scoring run, off the arq event loop. Each
+    # "process" child holds its own copy of the models (~700 MB in fp32)
+    WORKER_EXECUTOR: Literal["thread", "process"] = "thread"
+    WORKER_EXECUTOR_WORKERS: int = 2
+    # Worker: calls allowed in flight on the executor at once
+    WORKER_EXECUTOR_MAX_INFLIGHT: int = 4
+    # API: /products/search candidates taken from each of the ANN and trigram
+    # rankings before fusion
+    SEARCH_CANDIDATES: int = 100
+    # API: pgvector hnsw.ef_search for the semantic side (raised to SEARCH_CANDIDATES)
+    SEARCH_EF_SEARCH: int = 200
+    # API: pgvector (>= 0.8) hnsw.iterative_scan, so filtered searches (and
+    # similar products) keep scanning the index until enough rows pass.
+    # "off" for older pgvector
+    SEARCH_ITERATIVE_SCAN: Literal["off", "strict_order", "relaxed_order"] = (
+        "strict_order"
+    )
+    # API: pg_trgm word similarity a name/brand match needs (0-1)
+    SEARCH_TRIGRAM_THRESHOLD: float = 0.4
+    # API: query embeddings kept per process
+    SEARCH_QUERY_CACHE_SIZE: int = 10_000
+    # API: pgvector hnsw.ef_search for GET /products/{id}/similar, the rows
+    # one scan returns before the price and stock filters (see
+    # SEARCH_ITERATIVE_SCAN)
+    SIMILAR_EF_SEARCH: int = 200
+    # API and worker: concurrent encode calls are batched into one forward
+    # pass of at most this many inputs, waiting at most this long for more
+    EMBEDDING_BATCH_MAX_SIZE: int = 32
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0
+    # API: inputs waiting to be encoded before new requests get a 503
+    EMBEDDING_MAX_PENDING: int = 256
+    # API: events kept in the Redis stream if the flusher falls behind
+    EVENT_STREAM_MAXLEN: int = 1_000_000
+    # Worker: the event log is written when either limit is reached
+    EVENT_FLUSH_BATCH_SIZE: int = 5000
+    EVENT_FLUSH_INTERVAL_SECONDS: float = 2.0
+    # Worker: a user's events are folded into their profile once per window
+    PROFILE_UPDATE_WINDOW_SECONDS: int = 10
+    # Worker: half-life of an interaction's weight in the user's Style DNA
+    PROFILE_HALF_LIFE_DAYS: float = 30.0
+    # Worker: complete outfits stored per base product
+    OUTFIT_TRIPLES_PER_PRODUCT: int = 50
+    # Worker: arq jobs run concurrently
+    WORKER_MAX_JOBS: int = 4
+
 
 settings = Settings()
@@ -0,0 +1,16 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+# NumPy-only vector helpers, so the API never has to import torch
+
+
+def cosine_similarity(
+    a: Sequence[float] | np.ndarray, b: Sequence[float] | np.ndarray
+) -> float:
+    u = np.asarray(a, dtype=np.float32)
+    v = np.asarray(b, dtype=np.float32)
+    denom = np.linalg.norm(u) * np.linalg.norm(v)
+    if not denom:
+        return 0.0
+    return float(u @ v / denom)
@@ -1,7 +1,9 @@
 import uuid
 from typing import Any
 
+from fastapi.concurrency import run_in_threadpool
 from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.security import get_password_hash, verify_password
 from app.models import Product, ProductCreate, User, UserCreate, UserUpdate
@@ -9,8 +11,7 @@ from app.models import Product, ProductCreate, User, UserCreate, UserUpdate
 
 def create_user(*, session: Session, user_create: UserCreate) -> User:
     db_obj = User.model_validate(
-        user_create, update={
-            "hashed_password": get_password_hash(user_create.password)}
+        user_create, update={"hashed_password": get_password_hash(user_create.password)}
     )
     session.add(db_obj)
     session.commit()
@@ -47,6 +48,23 @@ def authenticate(*, session: Session, email: str, password: str) -> User | None:
     return db_user
 
 
+async def get_user_by_email_async(*, session: AsyncSession, email: str) -> User | None:
+    statement = select(User).where(User.email == email)
+    return (await session.exec(statement)).first()
+
+
+async def authenticate_async(
+    *, session: AsyncSession, email: str, password: str
+) -> User | None:
+    db_user = await get_user_by_email_async(session=session, email=email)
+    if not db_user:
+        return None
+    # bcrypt is deliberately slow, keep it off the event loop
+    if not await run_in_threadpool(verify_password, password, db_user.hashed_password):
+        return None
+    return db_user
+
+
 def create_item(
     *, session: Session, item_in: ProductCreate, owner_id: uuid.UUID
 ) -> Product:
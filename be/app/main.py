@@ -1,3 +1,7 @@
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
 import sentry_sdk
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
@@ -5,6 +9,10 @@ from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.db import async_engine
+from app.service.compatibility_graph import compatibility_graph
+from app.service.queue_service import queue_service
+from app.service.stock_bitmap import stock_bitmap
 
 
 def custom_generate_unique_id(route: APIRoute) -> str:
@@ -14,8 +22,27 @@ def custom_generate_unique_id(route: APIRoute) -> str:
 if settings.SENTRY_DSN and settings.ENVIRONMENT != "local":
     sentry_sdk.init(dsn=str(settings.SENTRY_DSN), enable_tracing=True)
 
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    graph_task = None
+    if settings.COMPATIBILITY_GRAPH_IN_MEMORY:
+        # Loads in the background, requests use the DB until it's ready
+        graph_task = asyncio.create_task(
+            compatibility_graph.run(queue_service.get_redis)
+        )
+    # Everything counts as in stock until the first load
+    stock_task = asyncio.create_task(stock_bitmap.run())
+    yield
+    stock_task.cancel()
+    if graph_task:
+        graph_task.cancel()
+    await async_engine.dispose()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
+    lifespan=lifespan,
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
     generate_unique_id_function=custom_generate_unique_id,
 )
@@ -1,15 +1,54 @@
-from datetime import datetime, timezone
 import uuid
+from datetime import datetime, timezone
+from typing import Any, Literal, cast
 
+import pgvector.sqlalchemy
 from pydantic import EmailStr
+from sqlalchemy import DateTime, Index, text
+from sqlalchemy.orm import InstrumentedAttribute, defer
+from sqlalchemy.orm.interfaces import LoaderOption
 from sqlmodel import JSON, Column, Field, SQLModel
-import pgvector.sqlalchemy
+
+# Sub-categories with their own ANN index on Product.style_embedding
+# (kept in sync with CATEGORY_MAP in app/worker/utils/config_model.py)
+ANN_INDEXED_CATEGORIES = ["topwear", "bottomwear", "shoes", "accessories"]
+
+
+# Genders with their own index per category, for GET /products/{id}/similar
+ANN_INDEXED_GENDERS = ["men", "women"]
+
+
+def style_embedding_hnsw_index(category: str, gender: str | None = None) -> Index:
+    # Partial HNSW index so sub_category-filtered ANN search never falls
+    # back to post-filtering a global index
+    name = f"ix_product_style_embedding_hnsw_{category}"
+    where = f"lower(sub_category) = '{category}'"
+    if gender:
+        name += f"_{gender}"
+        where += f" AND lower(gender) = '{gender}'"
+    return Index(
+        name,
+        "style_embedding",
+        postgresql_using="hnsw",
+        postgresql_with={"m": 16, "ef_construction": 64},
+        postgresql_ops={"style_embedding": "vector_cosine_ops"},
+        postgresql_where=text(where),
+    )
+
+
+def vector_col(column: list[float] | None) -> InstrumentedAttribute[Any]:
+    """
+    col() for the pgvector columns: mypy sees their Python field type, which
+    hides the distance comparators (cosine_distance, ...).
+    """
+    return cast(InstrumentedAttribute[Any], column)
 
 
 # Shared properties
 class UserBase(SQLModel):
     email: EmailStr = Field(unique=True, index=True, max_length=255)
     full_name: str
+    is_superuser: bool = False
     gender: str | None = None
     body_type: str | None = None
     skin_tone: str | None = None
@@ -45,8 +84,7 @@ class UpdatePassword(SQLModel):
 class User(UserBase, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     hashed_password: str
-    created_at: datetime = Field(
-        default_factory=lambda: datetime.now(timezone.utc))
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
     # --- Dynamic Analytics (Computed) ---
     style_scores: dict[str, float] = Field(default={}, sa_column=Column(JSON))
@@ -65,18 +103,22 @@ class User(UserBase, table=True):
     # AI & Embeddings
     # This stores a vector representation of the user's taste for vector DB search
 
+    # Lives in product space (Product.style_embedding, 512-d), updated from
+    # interaction events by the worker's update_user_profile job
     style_embedding: list[float] | None = Field(
         default=None,
-        sa_column=Column(pgvector.sqlalchemy.Vector(768)),
+        sa_column=Column(pgvector.sqlalchemy.Vector(512)),
         description="Latent vector representing aesthetic preference for similarity matching",
     )
+    # Decayed event weight behind style_embedding and spending_profile
+    style_weight: float = Field(default=0.0)
+    profile_updated_at: datetime | None = None
 
     # Behavioral Metrics
     return_rate: float = Field(
         default=0.0, description="Predicts purchase satisfaction"
     )
-    last_active: datetime = Field(
-        default_factory=lambda: datetime.now(timezone.utc))
+    last_active: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 # Properties to return via API, id is always required
@@ -109,6 +151,31 @@ class ProductBase(SQLModel):
 
 # --- DATABASE TABLES ---
 class Product(ProductBase, table=True):
+    __table_args__ = (
+        *(style_embedding_hnsw_index(c) for c in ANN_INDEXED_CATEGORIES),
+        *(
+            style_embedding_hnsw_index(c, g)
+            for c in ANN_INDEXED_CATEGORIES
+            for g in ANN_INDEXED_GENDERS
+        ),
+        # Keyset pagination of GET /products
+        Index("ix_product_catalog_date_id", "catalog_date", "id"),
+        # GET /products/search: trigram side (must match PRODUCT_SEARCH_TEXT)
+        Index(
+            "ix_product_search_text_trgm",
+            text("(name || ' ' || brand) gin_trgm_ops"),
+            postgresql_using="gin",
+        ),
+        # GET /products/search: semantic side
+        Index(
+            "ix_product_semantic_embedding_hnsw",
+            "semantic_embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"semantic_embedding": "vector_cosine_ops"},
+        ),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     # Data Science Signals
     rating: float = Field(default=0.0)
@@ -139,15 +206,26 @@ class Product(ProductBase, table=True):
     semantic_embedding: list[float] | None = Field(
         default=None, sa_column=Column(pgvector.sqlalchemy.Vector(384))
     )
+    # Batched ingestion runs that couldn't compute the signals (no image, ...)
+    ingest_attempts: int = Field(default=0)
+    # Set while a batched ingestion job works on the product
+    ingest_claimed_at: datetime | None = None
 
 
 class Inventory(SQLModel, table=True):
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    product_id: uuid.UUID = Field(foreign_key="product.id")
+    product_id: uuid.UUID = Field(foreign_key="product.id", index=True)
     sku_id: int = Field(index=True)
     size: str
     stock_count: int
     available: bool = True
+    # Set on every write by a trigger (migration 5d8e2b7a1c94), so the stock
+    # bitmap only re-reads the products written since its last refresh
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        index=True,
+    )
 
 
 # --- API SCHEMAS ---
@@ -166,18 +244,57 @@ class ProductPublic(ProductBase):
     occasion_tags: list[str]
     images: list[str]
     formality_score: float
-    is_in_stock: bool = True  # Computed property
+    is_in_stock: bool = True  # Set from the stock bitmap (app/service/stock_bitmap.py)
+
+
+# Public endpoints select only these columns and validate ProductPublic
+# straight from the rows, so the pgvector columns are never transferred
+PRODUCT_PUBLIC_COLUMNS: tuple[InstrumentedAttribute[Any], ...] = tuple(
+    getattr(Product, name)
+    for name in ProductPublic.model_fields
+    if name != "is_in_stock"
+)
+
+PRODUCT_EMBEDDING_COLUMNS = {
+    "style_embedding": vector_col(Product.style_embedding),
+    "complementary_embedding": vector_col(Product.complementary_embedding),
+    "semantic_embedding": vector_col(Product.semantic_embedding),
+}
+
+
+def product_load_options(*embeddings: str) -> list[LoaderOption]:
+    """
+    Loader options for select(Product) that skip every embedding column but
+    `embeddings`. Reading a skipped one raises instead of lazy-loading it.
+    """
+    return [
+        defer(column, raiseload=True)
+        for name, column in PRODUCT_EMBEDDING_COLUMNS.items()
+        if name not in embeddings
+    ]
 
 
 # Properties to receive on item update
 class ProductUpdate(ProductBase):
-    title: str | None = Field(
-        default=None, min_length=1, max_length=255)  # type: ignore
+    title: str | None = Field(default=None, min_length=1, max_length=255)  # type: ignore
 
 
 class ProductsPublic(SQLModel):
     data: list[ProductPublic]
+    # Cached, refreshed every PRODUCT_COUNT_TTL seconds
     count: int
+    # Opaque keyset cursor of the next page, None on the last one
+    next_cursor: str | None = None
+
+
+class ImageEmbedding(SQLModel, table=True):
+    # Content-addressed cache of image embeddings, keyed by (image hash, model)
+    content_hash: str = Field(primary_key=True, max_length=64)
+    model_name: str = Field(primary_key=True)
+    embedding: list[float] = Field(
+        sa_column=Column(pgvector.sqlalchemy.Vector(512), nullable=False)
+    )
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 
 class ProductCompatibility(SQLModel, table=True):
@@ -192,6 +309,44 @@ class ProductCompatibility(SQLModel, table=True):
     occasion_context: str
 
 
+class ProductOutfit(SQLModel, table=True):
+    """Top outfits of a base product, precomputed by the worker."""
+
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    base_product_id: uuid.UUID = Field(foreign_key="product.id", index=True)
+    bottom_id: uuid.UUID = Field(foreign_key="product.id")
+    shoe_id: uuid.UUID = Field(foreign_key="product.id")
+    accessory_id: uuid.UUID = Field(foreign_key="product.id")
+
+    # Compatibility of every piece with the base product
+    bottom_score: float
+    shoe_score: float
+    accessory_score: float
+    # Style compatibility between the pieces themselves (sum over the 3 pairs)
+    pair_score: float
+
+
+class InteractionEventRecord(SQLModel, table=True):
+    """
+    Raw interaction log, written in bulk by the worker's EventFlusher.
+    Range-partitioned by month on occurred_at, the flusher creates the
+    partitions as events arrive.
+    """
+
+    __tablename__ = "interaction_event"
+    __table_args__ = (
+        Index("ix_interaction_event_user_id_occurred_at", "user_id", "occurred_at"),
+        {"postgresql_partition_by": "RANGE (occurred_at)"},
+    )
+
+    # Redis stream entry id: a re-delivered entry is written only once
+    event_id: str = Field(primary_key=True, max_length=32)
+    occurred_at: datetime = Field(primary_key=True, sa_type=DateTime(timezone=True))
+    user_id: uuid.UUID
+    product_id: uuid.UUID
+    event_type: str = Field(max_length=16)
+
+
 class OutfitResponse(SQLModel):
     base: ProductPublic
     bottom: ProductPublic
@@ -203,6 +358,28 @@ class PersonalizedOutfits(SQLModel):
     outfits: list[OutfitResponse]
 
 
+class InteractionEvent(SQLModel):
+    product_id: uuid.UUID
+    event_type: Literal["view", "click", "add_to_cart", "purchase"]
+    # Set on ingestion when the client doesn't send it
+    occurred_at: datetime | None = None
+
+
+class PersonalizedOutfitsBatchRequest(SQLModel):
+    product_ids: list[uuid.UUID] = Field(min_length=1, max_length=100)
+
+
+class ProductOutfits(PersonalizedOutfits):
+    product_id: uuid.UUID
+
+
+class PersonalizedOutfitsBatch(SQLModel):
+    results: list[ProductOutfits]
+    # Not done within the time budget, request them again
+    pending: list[uuid.UUID] = []
+    not_found: list[uuid.UUID] = []
+
+
 # Generic message
 class Message(SQLModel):
     message: str
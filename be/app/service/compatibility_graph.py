@@ -0,0 +1,264 @@
+import asyncio
+import json
+import logging
+import uuid
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+from redis.asyncio import Redis
+from sqlmodel import Session, col, select
+
+from app.core.db import engine
+from app.models import Product, ProductCompatibility
+from app.service.recommendation_cache import bump_graph_version, bump_product_versions
+
+# Redis pub/sub channel the worker publishes graph changes on
+GRAPH_CHANNEL = "compatibility-graph"
+
+# Rebuild the CSR arrays once this share of the nodes lives in the overlay
+COMPACT_RATIO = 0.1
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CSRGraph:
+    indptr: np.ndarray  # int32, n_nodes + 1
+    indices: np.ndarray  # int32 node indices of the recommended products
+    scores: np.ndarray  # float32 compatibility scores
+
+
+class CompatibilityGraph:
+    """
+    In-process copy of the ProductCompatibility graph for the API.
+
+    Edges live in compact CSR arrays (int32 node indices, float32 scores),
+    so fetching the candidates of a base product is an array slice instead
+    of a DB join. The graph is built from a DB snapshot (`from_db`). After
+    that, the worker publishes the rows of every product whose edges
+    changed. Those rows go into a small overlay, which is folded back into
+    the CSR arrays once it grows.
+    """
+
+    def __init__(self) -> None:
+        self.node_ids: list[uuid.UUID] = []
+        self.node_index: dict[uuid.UUID, int] = {}
+        self.csr = CSRGraph(
+            indptr=np.zeros(1, dtype=np.int32),
+            indices=np.zeros(0, dtype=np.int32),
+            scores=np.zeros(0, dtype=np.float32),
+        )
+        self.overlay: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+    def _node(self, product_id: uuid.UUID) -> int:
+        node = self.node_index.get(product_id)
+        if node is None:
+            node = len(self.node_ids)
+            self.node_ids.append(product_id)
+            self.node_index[product_id] = node
+        return node
+
+    @classmethod
+    def from_db(cls) -> "CompatibilityGraph":
+        """Builds the graph from a DB snapshot. Blocking, run it off the loop."""
+        with Session(engine) as session:
+            product_ids = session.exec(select(Product.id)).all()
+            edges = session.exec(
+                select(
+                    ProductCompatibility.base_product_id,
+                    ProductCompatibility.recommended_product_id,
+                    ProductCompatibility.compatibility_score,
+                )
+            ).all()
+
+        graph = cls()
+        graph.node_ids = list(product_ids)
+        graph.node_index = {pid: i for i, pid in enumerate(graph.node_ids)}
+
+        index = graph.node_index
+        known = [
+            (index[base_id], index[rec_id], score)
+            for base_id, rec_id, score in edges
+            if base_id in index and rec_id in index
+        ]
+        base = np.fromiter((e[0] for e in known), np.int32, len(known))
+        rec = np.fromiter((e[1] for e in known), np.int32, len(known))
+        scores = np.fromiter((e[2] for e in known), np.float32, len(known))
+        graph.csr = cls._to_csr(base, rec, scores, len(graph.node_ids))
+        return graph
+
+    @staticmethod
+    def _to_csr(
+        base: np.ndarray, rec: np.ndarray, scores: np.ndarray, n_nodes: int
+    ) -> CSRGraph:
+        order = np.lexsort((-scores, base))
+        indptr = np.zeros(n_nodes + 1, dtype=np.int32)
+        np.cumsum(np.bincount(base, minlength=n_nodes), out=indptr[1:])
+        return CSRGraph(indptr=indptr, indices=rec[order], scores=scores[order])
+
+    def get_edges(self, product_id: uuid.UUID) -> tuple[np.ndarray, np.ndarray]:
+        """(node indices, scores) of the recommended products, best first."""
+        node = self.node_index.get(product_id)
+        if node is None:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        # One lookup: compaction may swap the overlay out between two
+        overlaid = self.overlay.get(node)
+        if overlaid is not None:
+            return overlaid
+        csr = self.csr
+        if node + 1 >= len(csr.indptr):
+            # Node added after the last compaction without edges of its own
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        start, end = csr.indptr[node], csr.indptr[node + 1]
+        return csr.indices[start:end], csr.scores[start:end]
+
+    def product_ids(self, nodes: np.ndarray) -> list[uuid.UUID]:
+        return [self.node_ids[i] for i in nodes]
+
+    def apply_update(self, nodes: dict[str, Any]) -> None:
+        """
+        `nodes` maps a base product id to {"edges": [[recommended_id, score],
+        ...]}, the complete new edge list.
+        """
+        for base_id, payload in nodes.items():
+            base = self._node(uuid.UUID(base_id))
+            edges = sorted(payload["edges"], key=lambda e: e[1], reverse=True)
+            indices = np.array(
+                [self._node(uuid.UUID(e[0])) for e in edges], dtype=np.int32
+            )
+            scores = np.array([e[1] for e in edges], dtype=np.float32)
+            self.overlay[base] = (indices, scores)
+
+    def needs_compaction(self) -> bool:
+        return len(self.overlay) > COMPACT_RATIO * max(len(self.node_ids), 1)
+
+    def compact(self) -> None:
+        """
+        Folds the overlay back into fresh CSR arrays. CPU-bound on large
+        graphs, so it runs on a thread; readers keep using the current arrays
+        and overlay until both are swapped.
+        """
+        n_nodes = len(self.node_ids)
+        csr, overlay = self.csr, self.overlay
+        bases, recs, scores = [], [], []
+        for node in range(n_nodes):
+            if node in overlay:
+                idx, sc = overlay[node]
+            elif node + 1 < len(csr.indptr):
+                start, end = csr.indptr[node], csr.indptr[node + 1]
+                idx, sc = csr.indices[start:end], csr.scores[start:end]
+            else:
+                continue
+            bases.append(np.full(len(idx), node, dtype=np.int32))
+            recs.append(idx)
+            scores.append(sc)
+
+        self.csr = self._to_csr(
+            np.concatenate(bases) if bases else np.zeros(0, dtype=np.int32),
+            np.concatenate(recs) if recs else np.zeros(0, dtype=np.int32),
+            np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32),
+            n_nodes,
+        )
+        self.overlay = {}
+
+
+class LiveCompatibilityGraph:
+    """
+    The API's graph. Each snapshot is built aside and published by replacing
+    the single `graph` attribute, so request threads never see a half-built
+    graph; the worker's updates are applied to the current one.
+    """
+
+    def __init__(self) -> None:
+        # None until the first snapshot is loaded
+        self.graph: CompatibilityGraph | None = None
+
+    def load(self) -> CompatibilityGraph:
+        graph = CompatibilityGraph.from_db()
+        self.graph = graph
+        logger.info(
+            f"Compatibility graph loaded: {len(graph.node_ids)} nodes, "
+            f"{len(graph.csr.indices)} edges"
+        )
+        return graph
+
+    def get_edges(self, product_id: uuid.UUID) -> list[tuple[uuid.UUID, float]] | None:
+        """
+        (recommended product id, score) pairs, best first. None when the
+        graph isn't loaded, so callers can fall back to the DB.
+        """
+        graph = self.graph
+        if graph is None:
+            return None
+        nodes, scores = graph.get_edges(product_id)
+        return list(zip(graph.product_ids(nodes), scores.tolist(), strict=True))
+
+    async def run(self, get_redis: Callable[[], Awaitable[Redis]]) -> None:
+        """
+        Loads the snapshot and applies the worker's updates until cancelled.
+        On a lost connection the snapshot is reloaded, since messages published
+        in the meantime are gone.
+        """
+        while True:
+            try:
+                redis = await get_redis()
+                # Closed on every exit, so reconnects don't pile up connections
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(GRAPH_CHANNEL)
+                    # Subscribe first, so nothing published during the load is lost
+                    graph = await asyncio.to_thread(self.load)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        payload = json.loads(message["data"])
+                        if payload.get("rebuild"):
+                            graph = await asyncio.to_thread(self.load)
+                            continue
+                        graph.apply_update(payload["nodes"])
+                        if graph.needs_compaction():
+                            await asyncio.to_thread(graph.compact)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Compatibility graph listener error: {e}")
+                await asyncio.sleep(5)
+
+
+def load_edge_rows(
+    session: Session, base_ids: list[uuid.UUID]
+) -> dict[str, dict[str, list[list[Any]]]]:
+    """Complete edge lists of `base_ids`, in the pub/sub message format."""
+    existing = session.exec(select(Product.id).where(col(Product.id).in_(base_ids)))
+    nodes: dict[str, dict[str, list[list[Any]]]] = {
+        str(base_id): {"edges": []} for base_id in existing
+    }
+    statement = select(
+        ProductCompatibility.base_product_id,
+        ProductCompatibility.recommended_product_id,
+        ProductCompatibility.compatibility_score,
+    ).where(col(ProductCompatibility.base_product_id).in_(base_ids))
+    for base_id, rec_id, score in session.exec(statement).all():
+        if str(base_id) in nodes:
+            nodes[str(base_id)]["edges"].append([str(rec_id), score])
+    return nodes
+
+
+async def publish_graph_update(
+    redis: Redis, session: Session, base_ids: list[uuid.UUID]
+) -> None:
+    if not base_ids:
+        return
+    nodes = await asyncio.to_thread(load_edge_rows, session, base_ids)
+    # Cached outfits of these products are stale from now on
+    await bump_product_versions(redis, base_ids)
+    await redis.publish(GRAPH_CHANNEL, json.dumps({"nodes": nodes}))
+
+
+async def publish_graph_rebuild(redis: Redis) -> None:
+    await bump_graph_version(redis)
+    await redis.publish(GRAPH_CHANNEL, json.dumps({"rebuild": True}))
+
+
+compatibility_graph = LiveCompatibilityGraph()
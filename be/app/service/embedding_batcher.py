@@ -0,0 +1,228 @@
+"""
+Dynamic micro-batching in front of the SentenceTransformer encoders.
+
+Concurrent `encode` calls are queued and a single collector task groups
+them: a batch is run as soon as it holds EMBEDDING_BATCH_MAX_SIZE inputs,
+or EMBEDDING_BATCH_MAX_WAIT_MS after its first request arrived. One forward
+pass then serves every request of the batch, and each caller gets back its
+own rows. Up to `max_concurrent_batches` batches run at once (one by
+default); while all of them are busy, new requests queue up and make up
+the next batch.
+
+The API uses the `text_batcher` / `vision_batcher` singletons below (the
+models load on the first call). The worker builds its own instances on the
+inference executor, see compute_product.py.
+"""
+
+import asyncio
+import functools
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+import numpy as np
+
+from app.core.config import settings
+
+
+class EncoderOverloaded(Exception):
+    """More inputs are waiting than the batcher accepts (`max_pending`)."""
+
+
+# (inputs, future of their rows, perf_counter() when queued)
+Request = tuple[list[Any], "asyncio.Future[Any]", float]
+
+
+async def _run_in_thread(fn: Callable[..., Any], *args: Any) -> Any:
+    return await asyncio.to_thread(fn, *args)
+
+
+class BatchingEncoder:
+    def __init__(
+        self,
+        name: str,
+        encode: Callable[[list[Any]], Any],
+        run: Callable[..., Awaitable[Any]] | None = None,
+        max_batch_size: int | None = None,
+        max_wait_ms: float | None = None,
+        max_pending: int | None = None,
+        max_concurrent_batches: int = 1,
+    ) -> None:
+        """
+        `encode(inputs) -> rows` is the batched function, `run(fn, *args)` the
+        coroutine that runs it off the event loop (a thread by default).
+        `max_pending=None` never rejects: callers wait instead.
+        `max_concurrent_batches` should match what `run` executes in parallel.
+        """
+        self.name = name
+        self.encode_fn = encode
+        self.run = run or _run_in_thread
+        self.max_batch_size = max_batch_size or settings.EMBEDDING_BATCH_MAX_SIZE
+        self.max_wait = (
+            max_wait_ms
+            if max_wait_ms is not None
+            else settings.EMBEDDING_BATCH_MAX_WAIT_MS
+        ) / 1000
+        self.max_pending = max_pending
+        self.max_concurrent_batches = max_concurrent_batches
+
+        self.queue: asyncio.Queue[Request] | None = None
+        self.task: asyncio.Task[None] | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        # Batches in flight, referenced until they finish
+        self.running: set[asyncio.Task[None]] = set()
+
+        # Inputs queued or being encoded
+        self.pending = 0
+        self.batches = 0
+        self.encoded = 0
+        self.requests = 0
+        self.rejected = 0
+        self.wait_seconds = 0.0
+        # Batch size (rounded up to a power of two) -> batches
+        self.histogram: Counter[int] = Counter()
+
+    def _ensure_collector(self) -> asyncio.Queue[Request]:
+        """The queue of the collector running on this event loop."""
+        loop = asyncio.get_running_loop()
+        if (
+            self.queue is None
+            or self.task is None
+            or self.task.done()
+            or self.loop is not loop
+        ):
+            self.loop = loop
+            self.queue = asyncio.Queue()
+            slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self.task = loop.create_task(self._collect(loop, self.queue, slots))
+        return self.queue
+
+    async def encode(self, inputs: list[Any]) -> Any:
+        """Rows of `inputs`, encoded together with whatever else is queued."""
+        if not inputs:
+            return []
+        if (
+            self.max_pending is not None
+            and self.pending + len(inputs) > self.max_pending
+        ):
+            self.rejected += 1
+            raise EncoderOverloaded(
+                f"{self.name} encoder has {self.pending} inputs pending"
+            )
+        queue = self._ensure_collector()
+        future: asyncio.Future[Any] = asyncio.get_running_loop().create_future()
+        self.pending += len(inputs)
+        queue.put_nowait((inputs, future, time.perf_counter()))
+        return await future
+
+    async def encode_one(self, item: Any) -> Any:
+        return (await self.encode([item]))[0]
+
+    async def _collect(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        queue: asyncio.Queue[Request],
+        slots: asyncio.Semaphore,
+    ) -> None:
+        carry = None
+        while True:
+            first = carry or await queue.get()
+            carry = None
+            # Requests keep queueing while every batch slot is busy
+            await slots.acquire()
+            batch, size = [first], len(first[0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if size + len(request[0]) > self.max_batch_size:
+                    # Starts the next batch. A request bigger than
+                    # max_batch_size still runs, as a batch of its own
+                    carry = request
+                    break
+                batch.append(request)
+                size += len(request[0])
+            task = loop.create_task(self._run_batch(batch, size))
+            self.running.add(task)
+            task.add_done_callback(functools.partial(self._batch_done, slots))
+
+    def _batch_done(self, slots: asyncio.Semaphore, task: asyncio.Task[None]) -> None:
+        self.running.discard(task)
+        slots.release()
+
+    async def _run_batch(self, batch: list[Request], size: int) -> None:
+        started = time.perf_counter()
+        inputs = [item for items, _, _ in batch for item in items]
+        try:
+            rows = await self.run(self.encode_fn, inputs)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            offset = 0
+            for items, future, _ in batch:
+                if not future.done():
+                    future.set_result(rows[offset : offset + len(items)])
+                offset += len(items)
+        finally:
+            self.pending -= size
+
+        self.batches += 1
+        self.encoded += size
+        self.requests += len(batch)
+        self.wait_seconds += sum(started - queued_at for _, _, queued_at in batch)
+        self.histogram[1 << (size - 1).bit_length()] += 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "running_batches": len(self.running),
+            "pending_inputs": self.pending,
+            "batches": self.batches,
+            "requests": self.requests,
+            "encoded": self.encoded,
+            "rejected": self.rejected,
+            "mean_batch_size": self.encoded / self.batches if self.batches else 0.0,
+            "mean_queue_wait_ms": (
+                self.wait_seconds * 1000 / self.requests if self.requests else 0.0
+            ),
+            "batch_size_histogram": {
+                f"<={bound}": count for bound, count in sorted(self.histogram.items())
+            },
+        }
+
+    def report(self) -> str:
+        stats = self.stats()
+        return (
+            f"{self.name} encoder: {stats['encoded']} inputs in {stats['batches']} "
+            f"batches (mean {stats['mean_batch_size']:.1f}), {stats['rejected']} rejected"
+        )
+
+
+def encode_texts(texts: list[str]) -> np.ndarray:
+    # Imported here: the models (and torch) only load in API processes that
+    # actually encode, see tests/test_api_imports.py
+    from app.worker.utils.config_model import text_model
+
+    return text_model.encode(texts, batch_size=len(texts))
+
+
+def encode_images(images: list[Any]) -> np.ndarray:
+    from app.worker.utils.config_model import vision_model
+
+    return vision_model.encode(images, batch_size=len(images))
+
+
+text_batcher = BatchingEncoder(
+    "text", encode_texts, max_pending=settings.EMBEDDING_MAX_PENDING
+)
+vision_batcher = BatchingEncoder(
+    "vision", encode_images, max_pending=settings.EMBEDDING_MAX_PENDING
+)
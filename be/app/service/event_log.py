@@ -0,0 +1,61 @@
+"""
+Write-behind log of interaction events.
+
+POST /events only appends to a Redis stream (one pipelined XADD per
+request). The worker's EventFlusher reads the stream through a consumer
+group and writes it to the partitioned `interaction_event` table with COPY,
+thousands of rows per transaction instead of one commit per click.
+"""
+
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.models import InteractionEvent
+
+EVENT_STREAM_KEY = "events:stream"
+EVENT_GROUP = "event-log"
+
+# Client timestamps further back are clamped, so a bad clock can't create
+# partitions all over the calendar
+MAX_EVENT_AGE = timedelta(days=7)
+
+
+def stamp_events(events: list[InteractionEvent]) -> list[InteractionEvent]:
+    """Fills in missing timestamps, clamps the others to [now - MAX_EVENT_AGE, now]."""
+    now = datetime.now(timezone.utc)
+    stamped = []
+    for event in events:
+        occurred_at = event.occurred_at or now
+        if occurred_at.tzinfo is None:
+            occurred_at = occurred_at.replace(tzinfo=timezone.utc)
+        occurred_at = min(
+            max(occurred_at.astimezone(timezone.utc), now - MAX_EVENT_AGE), now
+        )
+        stamped.append(event.model_copy(update={"occurred_at": occurred_at}))
+    return stamped
+
+
+async def append_events(
+    redis: Redis, user_id: uuid.UUID, events: list[InteractionEvent]
+) -> None:
+    pipe = redis.pipeline(transaction=False)
+    for event in events:
+        # Stamped by stamp_events
+        assert event.occurred_at is not None
+        pipe.xadd(
+            EVENT_STREAM_KEY,
+            {
+                "user_id": str(user_id),
+                "product_id": str(event.product_id),
+                "event_type": event.event_type,
+                "occurred_at": event.occurred_at.isoformat(),
+            },
+            # Approximate trimming is O(1); only drops data if the flusher
+            # is down for long
+            maxlen=settings.EVENT_STREAM_MAXLEN,
+            approximate=True,
+        )
+    await pipe.execute()
@@ -0,0 +1,316 @@
+"""
+Outfit assembly: turns the re-ranked candidates of a base product into
+(bottom, shoe, accessory) outfits.
+
+- "greedy": the best remaining candidate of every slot, one slot at a time.
+  Pieces are picked independently of each other.
+- "beam": scores whole combinations. An outfit's score is the sum of the
+  re-rank scores of its pieces plus PAIR_WEIGHT x the style compatibility
+  of every pair of pieces, searched with a bounded beam over the best
+  OUTFIT_BUCKET_SIZE candidates of each category. Once the time budget is
+  spent (checked between slots of a search too) the remaining outfits are
+  filled greedily, so the cost stays flat however long the candidate list
+  gets.
+"""
+
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.core.config import settings
+from app.models import Product
+
+# (outfit key, sub_category) in the order the slots are filled
+OUTFIT_SLOTS = [
+    ("bottom", "bottomwear"),
+    ("shoe", "shoes"),
+    ("accessory", "accessories"),
+]
+
+# Outfits returned per recommendation request
+N_OUTFITS = 5
+
+# Weight of the piece-to-piece style compatibility against the re-rank scores
+PAIR_WEIGHT = 0.3
+
+# {"base": product, "bottom": product, ...}
+Outfit = dict[str, Product]
+# pairs[(i, j)]: pair scores of slot i (rows) against slot j (columns)
+PairMatrices = dict[tuple[int, int], np.ndarray]
+
+
+@dataclass
+class Bucket:
+    products: list[Product]
+    scores: np.ndarray  # float32 re-rank scores, best first
+    style: np.ndarray  # L2-normalised style embeddings (n x d), 0 if missing
+    complementary: np.ndarray  # L2-normalised, style where it's missing
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    normalised: np.ndarray = matrix / np.maximum(norms, 1e-12)
+    return normalised
+
+
+def piece_vectors(
+    products: list[Product], vectors: bool = True
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (style, complementary) matrices of a bucket. A piece without a style
+    vector gets zero rows, so only its own pair terms drop out; without any
+    vector in the bucket both are (n x 1) zeros.
+    """
+    dim = 0
+    if vectors:
+        present = (p.style_embedding for p in products if p.style_embedding is not None)
+        dim = len(next(present, []))
+    if not dim:
+        zeros = np.zeros((len(products), 1), dtype=np.float32)
+        return zeros, zeros
+
+    style = np.zeros((len(products), dim), dtype=np.float32)
+    complementary = np.zeros_like(style)
+    for k, p in enumerate(products):
+        if p.style_embedding is None or len(p.style_embedding) != dim:
+            continue
+        style[k] = p.style_embedding
+        comp = p.complementary_embedding
+        complementary[k] = comp if comp is not None and len(comp) == dim else style[k]
+    return _normalise(style), _normalise(complementary)
+
+
+def build_buckets(
+    products: list[Product],
+    scores: np.ndarray,
+    size: int | None,
+    vectors: bool = True,
+) -> list[Bucket] | None:
+    """
+    One bucket per slot with its `size` best candidates, pre-sorted by score.
+    None when a slot has no candidate at all.
+    """
+    order = np.argsort(-scores, kind="stable")
+    members: dict[str, list[int]] = {category: [] for _, category in OUTFIT_SLOTS}
+    for i in order:
+        category = (products[i].sub_category or "").lower()
+        if category in members and (size is None or len(members[category]) < size):
+            members[category].append(i)
+
+    buckets = []
+    for _, category in OUTFIT_SLOTS:
+        rows = members[category]
+        if not rows:
+            return None
+        picked = [products[i] for i in rows]
+        style, complementary = piece_vectors(picked, vectors)
+        buckets.append(
+            Bucket(
+                products=picked,
+                scores=scores[rows].astype(np.float32),
+                style=style,
+                complementary=complementary,
+            )
+        )
+    return buckets
+
+
+def pair_matrix(a: Bucket, b: Bucket) -> np.ndarray:
+    """Symmetric style compatibility of every piece of `a` with every piece of `b`."""
+    if a.style.shape[1] != b.style.shape[1]:
+        return np.zeros((len(a.products), len(b.products)), dtype=np.float32)
+    pairs: np.ndarray = (a.complementary @ b.style.T + a.style @ b.complementary.T) / 2
+    return pairs
+
+
+class OutfitAssembler(ABC):
+    @abstractmethod
+    def assemble(
+        self,
+        base_product: Product,
+        products: list[Product],
+        scores: np.ndarray,
+        n_outfits: int = N_OUTFITS,
+    ) -> list[Outfit]: ...
+
+    @staticmethod
+    def make_outfit(base_product: Product, pieces: list[Product]) -> Outfit:
+        outfit = {"base": base_product}
+        for (key, _), piece in zip(OUTFIT_SLOTS, pieces, strict=True):
+            outfit[key] = piece
+        return outfit
+
+
+class GreedyAssembler(OutfitAssembler):
+    """Best unused candidate per slot, no piece appears in two outfits."""
+
+    def assemble(
+        self,
+        base_product: Product,
+        products: list[Product],
+        scores: np.ndarray,
+        n_outfits: int = N_OUTFITS,
+    ) -> list[Outfit]:
+        buckets = build_buckets(products, scores, size=None, vectors=False)
+        if buckets is None:
+            return []
+        used = [np.zeros(len(b.products), dtype=bool) for b in buckets]
+        return [
+            self.make_outfit(base_product, pieces)
+            for pieces in greedy_fill(buckets, used, n_outfits)
+        ]
+
+
+def greedy_fill(
+    buckets: list[Bucket], used: list[np.ndarray], n_outfits: int
+) -> list[list[Product]]:
+    outfits: list[list[Product]] = []
+    for _ in range(n_outfits):
+        picks = []
+        for taken in used:
+            free = np.flatnonzero(~taken)
+            if not len(free):
+                return outfits
+            # Buckets are sorted, the first free row is the best one
+            picks.append(free[0])
+        for taken, row in zip(used, picks, strict=True):
+            taken[row] = True
+        outfits.append([b.products[row] for b, row in zip(buckets, picks, strict=True)])
+    return outfits
+
+
+class BeamSearchAssembler(OutfitAssembler):
+    def __init__(
+        self,
+        beam_width: int | None = None,
+        bucket_size: int | None = None,
+        time_budget_ms: float | None = None,
+    ) -> None:
+        self.beam_width = beam_width or settings.OUTFIT_BEAM_WIDTH
+        self.bucket_size = bucket_size or settings.OUTFIT_BUCKET_SIZE
+        self.time_budget_ms = (
+            time_budget_ms
+            if time_budget_ms is not None
+            else settings.OUTFIT_TIME_BUDGET_MS
+        )
+
+    def assemble(
+        self,
+        base_product: Product,
+        products: list[Product],
+        scores: np.ndarray,
+        n_outfits: int = N_OUTFITS,
+    ) -> list[Outfit]:
+        deadline = time.perf_counter() + self.time_budget_ms / 1000
+        buckets = build_buckets(products, scores, size=self.bucket_size)
+        if buckets is None:
+            return []
+
+        pairs = pair_matrices(buckets, PAIR_WEIGHT)
+        used = [np.zeros(len(b.products), dtype=bool) for b in buckets]
+
+        outfits: list[list[Product]] = []
+        while len(outfits) < n_outfits:
+            best = self.search(buckets, pairs, used, deadline)
+            if best is None:
+                break
+            for taken, row in zip(used, best, strict=True):
+                taken[row] = True
+            outfits.append(
+                [b.products[row] for b, row in zip(buckets, best, strict=True)]
+            )
+
+        if len(outfits) < n_outfits:
+            # Out of time (or beam exhausted): the remaining outfits are greedy
+            outfits += greedy_fill(buckets, used, n_outfits - len(outfits))
+
+        return [self.make_outfit(base_product, pieces) for pieces in outfits]
+
+    def search(
+        self,
+        buckets: list[Bucket],
+        pairs: PairMatrices,
+        used: list[np.ndarray],
+        deadline: float | None = None,
+    ) -> list[int] | None:
+        """
+        Best combination of unused pieces, or None when a slot ran out or
+        the deadline passed.
+        """
+        paths, _ = beam_search(buckets, pairs, used, self.beam_width, deadline)
+        return [int(row) for row in paths[0]] if len(paths) else None
+
+
+def pair_matrices(buckets: list[Bucket], weight: float = 1.0) -> PairMatrices:
+    """pairs[(i, j)]: slot i (rows) against slot j (columns), for i < j."""
+    return {
+        (i, j): pair_matrix(buckets[i], buckets[j]) * weight
+        for i in range(len(buckets))
+        for j in range(i + 1, len(buckets))
+    }
+
+
+def beam_search(
+    buckets: list[Bucket],
+    pairs: PairMatrices,
+    used: list[np.ndarray] | None,
+    beam_width: int,
+    deadline: float | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Best combinations of pieces (rows per slot, beam x slots) and their
+    totals, best first. Empty when a slot has no unused piece left, or when
+    `deadline` passes before the last slot is expanded.
+    """
+    empty = np.zeros((0, len(buckets)), dtype=np.int64), np.zeros(0, dtype=np.float32)
+    # Beam: rows chosen so far (beam x slots filled) and their scores
+    paths = np.zeros((1, 0), dtype=np.int64)
+    totals = np.zeros(1, dtype=np.float32)
+
+    for slot, bucket in enumerate(buckets):
+        if deadline is not None and time.perf_counter() > deadline:
+            return empty
+        # beam x candidates of this slot
+        gains = np.broadcast_to(bucket.scores, (len(paths), len(bucket.scores))).copy()
+        for prev in range(slot):
+            gains += pairs[(prev, slot)][paths[:, prev]]
+        if used is not None:
+            gains[:, used[slot]] = -np.inf
+        expanded = (totals[:, None] + gains).ravel()
+
+        k = min(beam_width, int(np.isfinite(expanded).sum()))
+        if k == 0:
+            return empty
+        keep = np.argpartition(-expanded, k - 1)[:k]
+        keep = keep[np.argsort(-expanded[keep], kind="stable")]
+
+        beam_idx, rows = np.divmod(keep, len(bucket.scores))
+        paths = np.column_stack([paths[beam_idx], rows])
+        totals = expanded[keep]
+
+    return paths, totals
+
+
+def select_disjoint(
+    outfits: Sequence[tuple[uuid.UUID, ...]], scores: np.ndarray, n_outfits: int
+) -> list[tuple[uuid.UUID, ...]]:
+    """The best `n_outfits` outfits (tuples of piece ids) sharing no piece."""
+    picked: list[tuple[uuid.UUID, ...]] = []
+    used: set[uuid.UUID] = set()
+    for i in np.argsort(-scores, kind="stable"):
+        if used.isdisjoint(outfits[i]):
+            picked.append(outfits[i])
+            used.update(outfits[i])
+            if len(picked) == n_outfits:
+                break
+    return picked
+
+
+def get_outfit_assembler() -> OutfitAssembler:
+    if settings.OUTFIT_ASSEMBLER == "greedy":
+        return GreedyAssembler()
+    return BeamSearchAssembler()
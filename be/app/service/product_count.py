@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.models import Product
+
+
+class ProductCountCache:
+    """
+    Total product count for GET /products, refreshed at most once every
+    PRODUCT_COUNT_TTL seconds per process instead of a full scan per page.
+    """
+
+    def __init__(self) -> None:
+        self.count: int | None = None
+        self.refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get(self, session: AsyncSession) -> int:
+        count = self._fresh()
+        if count is not None:
+            return count
+        async with self._lock:
+            # Concurrent requests wait for the one refresh in flight
+            count = self._fresh()
+            if count is None:
+                statement = select(func.count()).select_from(Product)
+                count = (await session.exec(statement)).one()
+                self.count = count
+                self.refreshed_at = time.monotonic()
+        return count
+
+    def _fresh(self) -> int | None:
+        """The cached count, None when there is none or it is too old."""
+        if time.monotonic() - self.refreshed_at < settings.PRODUCT_COUNT_TTL:
+            return self.count
+        return None
+
+
+product_count = ProductCountCache()
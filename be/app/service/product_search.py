@@ -0,0 +1,145 @@
+"""
+Hybrid product search for GET /products/search.
+
+Two rankings, each served by its own index:
+
+- semantic: ANN on Product.semantic_embedding (MiniLM) with the query's
+  embedding, from the HNSW index;
+- lexical: pg_trgm word similarity of the query against name + brand, from
+  the trigram GIN index. Catches brand names, SKU-like words and typos the
+  embedding misses.
+
+They are fused with reciprocal rank fusion, which only uses ranks, so
+cosine distances and trigram similarities never need a common scale.
+"""
+
+import uuid
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+from sqlalchemy import ColumnElement, func, literal_column
+from sqlalchemy.sql.elements import ColumnClause
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.models import PRODUCT_PUBLIC_COLUMNS, Product, vector_col
+from app.service.query_embeddings import query_embeddings
+from app.service.stock_bitmap import stock_bitmap
+
+# Usual RRF constant: flattens the gap between the very first ranks
+RRF_K = 60
+
+# Same expression as the ix_product_search_text_trgm index
+PRODUCT_SEARCH_TEXT: ColumnClause[str] = literal_column(
+    "(product.name || ' ' || product.brand)"
+)
+
+
+def search_filters(
+    gender: str | None = None,
+    category: str | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+) -> list[ColumnElement[bool]]:
+    filters: list[ColumnElement[bool]] = []
+    if gender:
+        filters.append(func.lower(Product.gender) == gender.lower())
+    if category:
+        filters.append(func.lower(Product.sub_category) == category.lower())
+    if min_price is not None:
+        filters.append(col(Product.price) >= min_price)
+    if max_price is not None:
+        filters.append(col(Product.price) <= max_price)
+    return filters
+
+
+async def semantic_ranking(
+    session: AsyncSession,
+    vector: np.ndarray,
+    filters: list[ColumnElement[bool]],
+    k: int,
+) -> list[uuid.UUID]:
+    embedding = vector_col(Product.semantic_embedding)
+    statement = (
+        select(Product.id)
+        .where(embedding.is_not(None), *filters)
+        .order_by(embedding.cosine_distance(vector))
+        .limit(k)
+    )
+    return list((await session.exec(statement)).all())
+
+
+async def lexical_ranking(
+    session: AsyncSession, query: str, filters: list[ColumnElement[bool]], k: int
+) -> list[uuid.UUID]:
+    statement = (
+        select(Product.id)
+        # `text %> query`: word_similarity(query, text) above the threshold,
+        # the form the GIN index can serve
+        .where(PRODUCT_SEARCH_TEXT.op("%>")(query), *filters)
+        .order_by(
+            func.word_similarity(query, PRODUCT_SEARCH_TEXT).desc(), col(Product.id)
+        )
+        .limit(k)
+    )
+    return list((await session.exec(statement)).all())
+
+
+def reciprocal_rank_fusion(
+    *rankings: Sequence[uuid.UUID],
+) -> list[tuple[uuid.UUID, float]]:
+    """(item, score) best first, score = sum over rankings of 1 / (RRF_K + rank)."""
+    scores: dict[uuid.UUID, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (RRF_K + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+async def search_products(
+    session: AsyncSession,
+    query: str,
+    filters: list[ColumnElement[bool]],
+    skip: int,
+    limit: int,
+    in_stock: bool = False,
+) -> tuple[list[Any], int]:
+    """One page of public product rows, and the number of fused results."""
+    # Encoded before the first query, so no connection is held meanwhile
+    vector = await query_embeddings.get(query)
+
+    k = settings.SEARCH_CANDIDATES
+    # Transaction-local. One HNSW scan returns at most ef_search rows and the
+    # filters are applied after it; with iterative scans pgvector keeps
+    # going until k rows pass them (or hnsw.max_scan_tuples is reached)
+    configs = [
+        func.set_config("hnsw.ef_search", str(max(settings.SEARCH_EF_SEARCH, k)), True),
+        func.set_config(
+            "pg_trgm.word_similarity_threshold",
+            str(settings.SEARCH_TRIGRAM_THRESHOLD),
+            True,
+        ),
+    ]
+    if filters and settings.SEARCH_ITERATIVE_SCAN != "off":
+        configs.append(
+            func.set_config("hnsw.iterative_scan", settings.SEARCH_ITERATIVE_SCAN, True)
+        )
+    await session.exec(select(*configs))
+    fused = reciprocal_rank_fusion(
+        await semantic_ranking(session, vector, filters, k),
+        await lexical_ranking(session, query, filters, k),
+    )
+
+    if in_stock:
+        fused = [(pid, score) for pid, score in fused if stock_bitmap.in_stock(pid)]
+
+    page = [product_id for product_id, _ in fused[skip : skip + limit]]
+    if not page:
+        return [], len(fused)
+    rows = await session.exec(
+        select(*PRODUCT_PUBLIC_COLUMNS).where(col(Product.id).in_(page))
+    )
+    by_id = {row.id: row for row in rows.all()}
+    return [by_id[p] for p in page if p in by_id], len(fused)
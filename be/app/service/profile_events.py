@@ -0,0 +1,47 @@
+"""
+Buffer between interaction events and the user profile.
+
+Events are appended to a per-user Redis list and folded into the profile by
+the worker's `update_user_profile` job. Every event of a window of
+PROFILE_UPDATE_WINDOW_SECONDS enqueues the same job id, which arq refuses
+to enqueue twice, and the job only runs once the window is over: a burst of
+clicks ends up as one profile update instead of one per click.
+"""
+
+import time
+import uuid
+from collections.abc import Awaitable
+from datetime import datetime, timezone
+from typing import cast
+
+from arq.connections import ArqRedis
+
+from app.core.config import settings
+from app.models import InteractionEvent
+
+PROFILE_EVENTS_KEY = "profile-events:{}"
+
+
+async def schedule_profile_update(redis: ArqRedis, user_id: uuid.UUID | str) -> None:
+    window = settings.PROFILE_UPDATE_WINDOW_SECONDS
+    bucket = int(time.time() // window)
+    await redis.enqueue_job(
+        "update_user_profile",
+        str(user_id),
+        _job_id=f"update_user_profile:{user_id}:{bucket}",
+        _defer_until=datetime.fromtimestamp((bucket + 1) * window, timezone.utc),
+    )
+
+
+async def record_interactions(
+    redis: ArqRedis, user_id: uuid.UUID, events: list[InteractionEvent]
+) -> None:
+    """`events` are expected to be stamped (see event_log.stamp_events)."""
+    if not events:
+        return
+    payload = [e.model_dump_json() for e in events]
+    # The list commands are typed for the sync and async clients at once
+    await cast(
+        Awaitable[int], redis.rpush(PROFILE_EVENTS_KEY.format(user_id), *payload)
+    )
+    await schedule_profile_update(redis, user_id)
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from app.core.config import settings
+from app.service.embedding_batcher import text_batcher
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    LRU of search query -> MiniLM vector, keyed by the normalized query
+    text, so popular queries skip the encoder. Per process, like the
+    counters.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.entries: OrderedDict[str, np.ndarray] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, query: str) -> np.ndarray:
+        key = normalize_query(query)
+        cached = self.entries.get(key)
+        if cached is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        # Misses of concurrent searches share one forward pass
+        vector: np.ndarray = await text_batcher.encode_one(key)
+        self.entries[key] = vector
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        return vector
+
+    def report(self) -> str:
+        total = self.hits + self.misses
+        return (
+            f"Query embedding cache: {self.hits} hits / {total} lookups, "
+            f"{len(self.entries)} entries"
+        )
+
+
+query_embeddings = QueryEmbeddingCache(settings.SEARCH_QUERY_CACHE_SIZE)
@@ -1,6 +1,7 @@
 from uuid import UUID
 from arq import create_pool
 from arq.connections import RedisSettings, ArqRedis
+from arq.jobs import Job
 import os
 
 # Configuration
@@ -22,5 +23,12 @@ class StyleQueueService:
         redis = await self.get_redis()
         return await redis.enqueue_job("process_product", product_id)
 
+    async def queue_products_batch(
+        self, product_ids: list[UUID] | None = None
+    ) -> Job | None:
+        """Without ids the worker picks up to N products still missing signals."""
+        redis = await self.get_redis()
+        return await redis.enqueue_job("process_products_batch", product_ids)
+
 
 queue_service = StyleQueueService()
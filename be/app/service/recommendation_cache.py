@@ -0,0 +1,170 @@
+"""
+Response cache for GET /recommendation/{product_id}.
+
+Entries are keyed by (user profile version, base product id, graph
+version), so nothing is ever deleted to invalidate them:
+
+- The profile version is a fingerprint of the user's Style DNA, spending
+  profile and price sensitivity. Any change to them yields a new key.
+- The graph version is a global counter bumped by full rebuilds, plus a
+  per-product counter the worker bumps whenever it rewrites that product's
+  edges (see `publish_graph_update`). Editing a product bumps it for the
+  product and for every base product with an edge to it, whose outfits
+  may show it (see `update_product`).
+
+Stock isn't part of the key, a sold-out piece would otherwise invalidate
+every cached outfit: bodies are checked against the stock bitmap when read
+instead (see `restock_body` in the recommendation routes).
+
+Old entries simply stop being read and age out with the TTL. The counters
+live in the queue Redis, which never evicts. Entries go to a separate Redis
+(RECOMMENDATION_CACHE_REDIS_URL) run with `maxmemory` and an evicting
+policy such as `allkeys-lru`, so the cache is memory-bounded without
+putting queued jobs at risk. Without one, or if it doesn't evict, responses
+are not cached.
+"""
+
+import hashlib
+import json
+import logging
+import uuid
+from collections.abc import Awaitable, Callable, Sequence
+from typing import Any
+
+import numpy as np
+from redis.asyncio import Redis
+
+from app.core.config import settings
+from app.models import User
+from app.service.queue_service import queue_service
+
+GRAPH_VERSION_KEY = "outfits:graph-version"
+PRODUCT_VERSION_KEY = "outfits:product-version:{}"
+HITS_KEY = "outfits:cache:hits"
+MISSES_KEY = "outfits:cache:misses"
+
+logger = logging.getLogger(__name__)
+
+
+def profile_version(user: User) -> str:
+    digest = hashlib.blake2b(user.id.bytes, digest_size=8)
+    if user.style_embedding is not None:
+        digest.update(np.asarray(user.style_embedding, dtype=np.float32).tobytes())
+    digest.update(json.dumps(user.spending_profile, sort_keys=True).encode())
+    digest.update(repr(user.price_sensitivity_score).encode())
+    return digest.hexdigest()
+
+
+async def bump_product_versions(redis: Redis, product_ids: Sequence[uuid.UUID]) -> None:
+    if not product_ids:
+        return
+    pipe = redis.pipeline(transaction=False)
+    for product_id in product_ids:
+        pipe.incr(PRODUCT_VERSION_KEY.format(product_id))
+    await pipe.execute()
+
+
+async def bump_graph_version(redis: Redis) -> None:
+    await redis.incr(GRAPH_VERSION_KEY)
+
+
+class RecommendationCache:
+    def __init__(self, get_redis: Callable[[], Awaitable[Redis]]) -> None:
+        # Queue Redis: versions and hit/miss counters
+        self.get_redis = get_redis
+        self._entries: Redis | None = None
+        self._bounded = False
+
+    async def entries(self) -> Redis | None:
+        """Redis holding the cached responses, None unless it's memory-bounded."""
+        if not settings.RECOMMENDATION_CACHE_REDIS_URL:
+            return None
+        if self._entries is None:
+            entries = Redis.from_url(settings.RECOMMENDATION_CACHE_REDIS_URL)
+            memory = await entries.info("memory")
+            self._bounded = bool(memory.get("maxmemory")) and (
+                memory.get("maxmemory_policy") != "noeviction"
+            )
+            if not self._bounded:
+                logger.warning(
+                    "Recommendation cache Redis has no maxmemory or doesn't evict "
+                    "(policy %s), responses are not cached",
+                    memory.get("maxmemory_policy"),
+                )
+            self._entries = entries
+        return self._entries if self._bounded else None
+
+    async def available(self) -> bool:
+        return await self.entries() is not None
+
+    async def keys(
+        self, user: User, product_ids: list[uuid.UUID]
+    ) -> dict[uuid.UUID, str]:
+        """Cache key per product id, with one round trip for all versions."""
+        redis = await self.get_redis()
+        graph_version, *product_versions = await redis.mget(
+            GRAPH_VERSION_KEY, *(PRODUCT_VERSION_KEY.format(p) for p in product_ids)
+        )
+        profile = profile_version(user)
+        return {
+            product_id: (
+                f"outfits:{profile}:{product_id}:"
+                f"{int(graph_version or 0)}.{int(product_version or 0)}"
+            )
+            for product_id, product_version in zip(
+                product_ids, product_versions, strict=True
+            )
+        }
+
+    async def key(self, user: User, product_id: uuid.UUID) -> str:
+        return (await self.keys(user, [product_id]))[product_id]
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        entries = await self.entries()
+        if not keys or entries is None:
+            return [None] * len(keys)
+        cached: list[bytes | None] = await entries.mget(keys)
+        hits = sum(c is not None for c in cached)
+        pipe = (await self.get_redis()).pipeline(transaction=False)
+        pipe.incrby(HITS_KEY, hits)
+        pipe.incrby(MISSES_KEY, len(keys) - hits)
+        await pipe.execute()
+        return cached
+
+    async def get(self, key: str) -> bytes | None:
+        return (await self.get_many([key]))[0]
+
+    async def set_many(self, payloads: dict[str, bytes]) -> None:
+        entries = await self.entries()
+        if entries is None:
+            return
+        pipe = entries.pipeline(transaction=False)
+        for key, payload in payloads.items():
+            pipe.set(key, payload, ex=settings.RECOMMENDATION_CACHE_TTL)
+        await pipe.execute()
+
+    async def set(self, key: str, payload: bytes) -> None:
+        await self.set_many({key: payload})
+
+    async def invalidate(self, product_ids: Sequence[uuid.UUID]) -> None:
+        """Cached outfits of these base products are stale from now on."""
+        await bump_product_versions(await self.get_redis(), product_ids)
+
+    async def stats(self) -> dict[str, Any]:
+        hits, misses = await (await self.get_redis()).mget(HITS_KEY, MISSES_KEY)
+        hits, misses = int(hits or 0), int(misses or 0)
+        entries = await self.entries()
+        memory = await entries.info("memory") if entries is not None else {}
+        return {
+            "enabled": entries is not None,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "used_memory": memory.get("used_memory"),
+            "maxmemory": memory.get("maxmemory"),
+            "maxmemory_policy": memory.get("maxmemory_policy"),
+            "ttl": settings.RECOMMENDATION_CACHE_TTL,
+        }
+
+
+recommendation_cache = RecommendationCache(queue_service.get_redis)
@@ -0,0 +1,97 @@
+"""
+"More like this" for GET /products/{id}/similar: nearest neighbours of a
+product's style_embedding within its own sub_category.
+
+The category (and gender, when it has one) predicates are inlined, so the
+planner can pick the matching partial HNSW index: the scan then only walks
+products that already pass those filters. Price and stock are checked on
+the rows the scan returns; with iterative scans (pgvector >= 0.8) it keeps
+going until `limit` rows pass them. Stock comes from the stock bitmap, so
+no Inventory lookup runs per scanned row.
+"""
+
+import uuid
+from typing import Any
+
+from sqlalchemy import ColumnElement, func, literal
+from sqlalchemy.orm import Mapped
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.models import (
+    ANN_INDEXED_CATEGORIES,
+    ANN_INDEXED_GENDERS,
+    PRODUCT_PUBLIC_COLUMNS,
+    Product,
+    vector_col,
+)
+from app.service.stock_bitmap import stock_bitmap
+
+
+def _lower_equals(
+    column: Mapped[str], value: str, indexed: list[str]
+) -> ColumnElement[bool]:
+    # Only values with an index are inlined, the rest stay bound parameters
+    value = value.lower()
+    if value in indexed:
+        return func.lower(column) == literal(value, literal_execute=True)
+    return func.lower(column) == value
+
+
+async def similar_products(
+    session: AsyncSession,
+    product_id: uuid.UUID,
+    limit: int,
+    gender: str | None = None,
+    min_price: float | None = None,
+    max_price: float | None = None,
+    in_stock: bool = False,
+) -> list[Any] | None:
+    """Public rows, most similar first. None when the product doesn't exist."""
+    embedding = vector_col(Product.style_embedding)
+    base = (
+        await session.exec(
+            select(col(Product.sub_category), embedding).where(
+                col(Product.id) == product_id
+            )
+        )
+    ).first()
+    if base is None:
+        return None
+    sub_category, style_embedding = base
+    if style_embedding is None:
+        return []
+
+    filters = [
+        col(Product.id) != product_id,
+        embedding.is_not(None),
+        _lower_equals(
+            col(Product.sub_category), sub_category or "", ANN_INDEXED_CATEGORIES
+        ),
+    ]
+    if gender:
+        filters.append(_lower_equals(col(Product.gender), gender, ANN_INDEXED_GENDERS))
+    if min_price is not None:
+        filters.append(col(Product.price) >= min_price)
+    if max_price is not None:
+        filters.append(col(Product.price) <= max_price)
+    if in_stock:
+        filters.append(stock_bitmap.in_stock_clause(col(Product.id)))
+
+    # Transaction-local; one HNSW scan returns at most ef_search rows
+    ef_search = max(settings.SIMILAR_EF_SEARCH, limit)
+    configs = [func.set_config("hnsw.ef_search", str(ef_search), True)]
+    if settings.SEARCH_ITERATIVE_SCAN != "off":
+        configs.append(
+            func.set_config("hnsw.iterative_scan", settings.SEARCH_ITERATIVE_SCAN, True)
+        )
+    await session.exec(select(*configs))
+
+    statement = (
+        select(*PRODUCT_PUBLIC_COLUMNS)
+        .where(*filters)
+        .order_by(embedding.cosine_distance(style_embedding))
+        .limit(limit)
+    )
+    return list((await session.exec(statement)).all())
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import cached_property
+
+import numpy as np
+from sqlalchemy import ARRAY, ColumnElement, Uuid, all_, and_, case, func, literal, true
+from sqlalchemy.orm import Mapped
+from sqlmodel import Session, col, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import Inventory, ProductPublic
+
+logger = logging.getLogger(__name__)
+
+# 1 when any size of the product can be bought
+AVAILABLE = func.max(
+    case((and_(col(Inventory.available), col(Inventory.stock_count) > 0), 1), else_=0)
+)
+
+# A refresh re-reads rows stamped this long before the previous one, for
+# writes whose transaction started before it but committed after it
+DELTA_OVERLAP = timedelta(minutes=1)
+
+
+@dataclass(frozen=True)
+class StockSnapshot:
+    """One immutable build of the bitmap: row per tracked product, bit per row."""
+
+    index: dict[uuid.UUID, int] = field(default_factory=dict)
+    bits: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=bool))
+
+    @classmethod
+    def build(cls, rows: Sequence[tuple[uuid.UUID, bool]]) -> "StockSnapshot":
+        return cls(
+            index={product_id: i for i, (product_id, _) in enumerate(rows)},
+            bits=np.fromiter((a for _, a in rows), dtype=bool, count=len(rows)),
+        )
+
+    def apply(self, rows: Sequence[tuple[uuid.UUID, bool]]) -> "StockSnapshot":
+        """A copy with the (product id, in stock) `rows` set, new products appended."""
+        index = self.index
+        new = [product_id for product_id, _ in rows if product_id not in index]
+        if new:
+            # Copied only when it grows, otherwise shared with this snapshot
+            index = {**index, **{pid: len(index) + i for i, pid in enumerate(new)}}
+        bits = np.zeros(len(index), dtype=bool)
+        bits[: len(self.bits)] = self.bits
+        for product_id, available in rows:
+            bits[index[product_id]] = available
+        return StockSnapshot(index=index, bits=bits)
+
+    def in_stock(self, product_id: uuid.UUID) -> bool:
+        slot = self.index.get(product_id)
+        return slot is None or bool(self.bits[slot])
+
+    @cached_property
+    def sold_out(self) -> list[uuid.UUID]:
+        """Tracked products with no size in stock, built on first use."""
+        return [pid for pid, slot in self.index.items() if not self.bits[slot]]
+
+
+class StockBitmap:
+    """
+    In-process availability bitmap, so recommendations and product lists
+    can drop sold-out products without joining Inventory per request.
+
+    One bit per product with Inventory rows, set when any of its sizes is
+    available with stock_count > 0. Products without Inventory rows aren't
+    tracked and count as in stock. Every STOCK_REFRESH_SECONDS only the
+    products with Inventory rows written since the last refresh are read
+    again (Inventory.updated_at, set by a trigger); the full GROUP BY runs
+    on the first load and every STOCK_FULL_REFRESH_SECONDS, which also
+    picks up deleted rows. Each refresh publishes a new StockSnapshot by
+    replacing the `snapshot` attribute; readers never see a half-built
+    bitmap. Until the first load everything is in stock.
+    """
+
+    def __init__(self) -> None:
+        self.snapshot = StockSnapshot()
+        # Database clock at the last refresh, None until the first one
+        self.synced_at: datetime | None = None
+        self.rebuilt_at = 0.0
+
+    def load(self) -> int:
+        """Refreshes the bitmap. Returns how many products changed state."""
+        with Session(engine) as session:
+            return self.refresh(session)
+
+    def refresh(self, session: Session) -> int:
+        full = (
+            self.synced_at is None
+            or time.monotonic() - self.rebuilt_at >= settings.STOCK_FULL_REFRESH_SECONDS
+        )
+        # Transaction start, like the updated_at of concurrent writes
+        now = session.exec(select(func.now())).one()
+        statement = select(col(Inventory.product_id), AVAILABLE).group_by(
+            col(Inventory.product_id)
+        )
+        if not full and self.synced_at is not None:
+            written = select(col(Inventory.product_id)).where(
+                col(Inventory.updated_at) > self.synced_at - DELTA_OVERLAP
+            )
+            statement = statement.where(col(Inventory.product_id).in_(written))
+        rows = [(product_id, bool(a)) for product_id, a in session.exec(statement)]
+
+        previous = self.snapshot
+        if full:
+            snapshot = StockSnapshot.build(rows)
+            product_ids: Iterable[uuid.UUID] = (
+                previous.index.keys() | snapshot.index.keys()
+            )
+            self.rebuilt_at = time.monotonic()
+        else:
+            snapshot = previous.apply(rows)
+            product_ids = [product_id for product_id, _ in rows]
+        changed = sum(
+            previous.in_stock(product_id) != snapshot.in_stock(product_id)
+            for product_id in product_ids
+        )
+
+        self.snapshot = snapshot
+        self.synced_at = now
+        return changed
+
+    def in_stock(self, product_id: uuid.UUID) -> bool:
+        return self.snapshot.in_stock(product_id)
+
+    def filter_ids(self, product_ids: Iterable[uuid.UUID]) -> set[uuid.UUID]:
+        snapshot = self.snapshot
+        return {pid for pid in product_ids if snapshot.in_stock(pid)}
+
+    def in_stock_clause(self, column: Mapped[uuid.UUID]) -> ColumnElement[bool]:
+        """
+        SQL filter dropping the sold-out products, for queries that have to
+        fill `limit` rows. One array parameter however many are sold out.
+        """
+        sold_out = self.snapshot.sold_out
+        if not sold_out:
+            return true()
+        return column != all_(literal(sold_out, ARRAY(Uuid())))
+
+    def mark(self, products: list[ProductPublic]) -> list[ProductPublic]:
+        """Sets is_in_stock on public product models."""
+        snapshot = self.snapshot
+        for product in products:
+            product.is_in_stock = snapshot.in_stock(product.id)
+        return products
+
+    async def run(self) -> None:
+        while True:
+            try:
+                changed = await asyncio.to_thread(self.load)
+                if changed:
+                    logger.info(
+                        f"Stock bitmap: {changed} products changed availability"
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Stock bitmap refresh error: {e}")
+            await asyncio.sleep(settings.STOCK_REFRESH_SECONDS)
+
+
+stock_bitmap = StockBitmap()
@@ -1,8 +1,18 @@
+import asyncio
+import logging
 from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
 from app.core.config import settings
 from app.models import Product
-from app.worker.utils.config_model import Image, vision_model, text_model
-import httpx
+from app.service.embedding_batcher import BatchingEncoder, encode_texts
+from app.worker.utils.config_model import vision_model
+from app.worker.utils.embedding_cache import embedding_cache
+from app.worker.utils.executor import inference_executor
+from app.worker.utils.image_fetcher import ImageFetcher
+from app.worker.utils.label_bank import LabelBank
 
 OCCASIONS = [
     "Wedding",
@@ -24,68 +34,100 @@ ARCHETYPES = [
 # Formality Anchors (used to calculate the 0-1 score)
 FORMALITY_LABELS = ["Extremely Casual Streetwear", "Very Formal Black Tie"]
 
+logger = logging.getLogger(__name__)
+
 VULTR_REGION = settings.VULTR_REGION  # e.g., ewr1, sgp1, ams1
 VULTR_ENDPOINT = f"https://{VULTR_REGION}.vultrobjects.com"
 
 
-async def load_image_from_url(url: str) -> Image.Image:
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        if response.status_code != 200:
-            raise Exception(f"Failed to download image from {url}")
-
-        # Wrap the bytes in a BytesIO object so Pillow can read it
-        return Image.open(BytesIO(response.content))
-
-
-async def compute_product_signals(product: Product) -> Product:
+def get_image_url(product: Product) -> str | None:
+    image_path = product.images[0] if product.images else None
+    if not image_path:
+        return None
+    return f"{VULTR_ENDPOINT}/{image_path}"
+
+
+LABEL_TAXONOMIES = {
+    "occasion": [f"A photo of clothing for a {o}" for o in OCCASIONS],
+    "archetype": [f"clothing in {a} style" for a in ARCHETYPES],
+    "formality": [f"a photo of {f}" for f in FORMALITY_LABELS],
+}
+
+_label_bank: LabelBank | None = None
+
+
+def get_label_bank() -> LabelBank:
+    """Taxonomy prompts are encoded once per process (or loaded from disk)."""
+    global _label_bank
+    if _label_bank is None:
+        _label_bank = LabelBank(
+            vision_model,
+            vision_model.name,
+            LABEL_TAXONOMIES,
+            cache_dir=settings.LABEL_BANK_CACHE_DIR,
+        )
+    return _label_bank
+
+
+def warm_up() -> None:
+    get_label_bank()
+
+
+def encode_image_bytes(blobs: list[bytes]) -> list[np.ndarray | None]:
+    """Decodes and encodes a batch of images; undecodable ones come back as None."""
+    images: list[Image.Image | None] = []
+    for data in blobs:
+        try:
+            img = Image.open(BytesIO(data))
+            img.load()
+            images.append(img)
+        except OSError as e:
+            logger.warning(f"Error decoding image: {e}")
+            images.append(None)
+
+    valid = [img for img in images if img is not None]
+    if not valid:
+        return [None] * len(blobs)
+    features = iter(vision_model.encode(valid, batch_size=len(valid)))
+    return [next(features) if img is not None else None for img in images]
+
+
+# Concurrent jobs (WORKER_MAX_JOBS) share forward passes, with as many
+# batches in flight as the executor runs. No max_pending: jobs wait, the
+# executor already bounds the work in flight
+image_batcher = BatchingEncoder(
+    "vision",
+    encode_image_bytes,
+    run=inference_executor.run,
+    max_concurrent_batches=settings.WORKER_EXECUTOR_MAX_INFLIGHT,
+)
+text_batcher = BatchingEncoder(
+    "text",
+    encode_texts,
+    run=inference_executor.run,
+    max_concurrent_batches=settings.WORKER_EXECUTOR_MAX_INFLIGHT,
+)
+
+
+def classify_images(img_features: np.ndarray) -> dict[str, np.ndarray]:
+    return get_label_bank().classify(img_features)
+
+
+def apply_image_tags(products: list[Product], probs: dict[str, np.ndarray]) -> None:
     """
-    Computes visual and textual embeddings + extracts tags.
+    Occasion tags, archetype and formality for a batch of products,
+    from the label bank probabilities of their image embeddings.
     """
-    # A. Visual Embedding (The 'Style' DNA)
-    image_path = product.images[0]
+    for i, product in enumerate(products):
+        product.occasion_tags = [
+            OCCASIONS[j] for j, score in enumerate(probs["occasion"][i]) if score > 0.20
+        ]
+        product.style_archetype = ARCHETYPES[int(probs["archetype"][i].argmax())]
+        product.formality_score = float(probs["formality"][i][1])
 
-    if not image_path:
-        raise Exception("image path not exist")
-
-    formatted_image_url = f"{VULTR_ENDPOINT}/{image_path}"
-
-    try:
-        img = await load_image_from_url(formatted_image_url)
-    except Exception as e:
-        print(f"Error loading image: {e}")
-        return
-
-    img_features = vision_model.encode(img, convert_to_tensor=True)
-    product.style_embedding = img_features.tolist()
-
-    product.complementary_embedding = product.style_embedding
-
-    occasion_queries = [f"A photo of clothing for a {o}" for o in OCCASIONS]
-
-    text_features = vision_model.encode(
-        occasion_queries, convert_to_tensor=True)
-
-    probs = (img_features @ text_features.T).softmax(dim=-1)
-
-    product.occasion_tags = [
-        OCCASIONS[i] for i, score in enumerate(probs) if score > 0.20
-    ]
 
-    archetype_queries = [f"clothing in {a} style" for a in ARCHETYPES]
-    archetype_features = vision_model.encode(
-        archetype_queries, convert_to_tensor=True)
-
-    archetype_probs = (img_features @ archetype_features.T).softmax(dim=-1)
-    product.style_archetype = ARCHETYPES[archetype_probs.argmax()]
-
-    formality_queries = [f"a photo of {f}" for f in FORMALITY_LABELS]
-    f_features = vision_model.encode(formality_queries, convert_to_tensor=True)
-
-    f_probs = (img_features @ f_features.T).softmax(dim=-1)
-    product.formality_score = float(f_probs[1])
-
-    text_desc = (
+def build_text_description(product: Product) -> str:
+    return (
         f"Product Name: {product.name}. "
         f"Brand: {product.brand}. "
         f"Category: {product.gender} {product.master_category} - "
@@ -96,6 +138,80 @@ async def compute_product_signals(product: Product) -> Product:
         f"{product.article_type}"
         f"with a formality score of {product.formality_score}."
     )
-    product.semantic_embedding = text_model.encode(text_desc).tolist()
 
-    return product
+
+async def compute_products_signals(
+    products: list[Product], fetcher: ImageFetcher
+) -> list[Product]:
+    """
+    Batched version of compute_product_signals: images are downloaded
+    concurrently, then encoded in a single forward pass, and so are the
+    text descriptions. Images already seen (by content hash) reuse their
+    cached embedding. Products whose image can't be loaded are skipped.
+    """
+    urls = [get_image_url(product) for product in products]
+    for product, url in zip(products, urls, strict=True):
+        if not url:
+            logger.info(f"Skipping {product.id}: image path not exist")
+
+    with_url = [(p, url) for p, url in zip(products, urls, strict=True) if url]
+    fetched = await fetcher.fetch_many([url for _, url in with_url])
+    downloaded = [
+        (p, f) for (p, _), f in zip(with_url, fetched, strict=True) if f is not None
+    ]
+
+    # A. Visual Embedding (The 'Style' DNA)
+    # Identical image bytes are only ever encoded once per model
+    hashes = [f.content_hash for _, f in downloaded]
+    embeddings = await asyncio.to_thread(
+        embedding_cache.get_many, hashes, vision_model.name
+    )
+    misses = {
+        f.content_hash: f.data
+        for _, f in downloaded
+        if f.content_hash not in embeddings
+    }
+    if misses:
+        # Batched with the other jobs' images, run on the executor pool
+        encoded = await image_batcher.encode(list(misses.values()))
+        new_embeddings = {
+            content_hash: features
+            for content_hash, features in zip(misses, encoded, strict=True)
+            if features is not None
+        }
+        await asyncio.to_thread(
+            embedding_cache.put_many, new_embeddings, vision_model.name
+        )
+        embeddings.update(new_embeddings)
+
+    loaded = [(p, f) for p, f in downloaded if f.content_hash in embeddings]
+    if not loaded:
+        return []
+
+    batch = [p for p, _ in loaded]
+    img_features = np.stack([embeddings[f.content_hash] for _, f in loaded])
+    for product, features in zip(batch, img_features, strict=True):
+        product.style_embedding = features.tolist()
+        product.complementary_embedding = product.style_embedding
+
+    # B. Tags from the image embedding
+    apply_image_tags(batch, await inference_executor.run(classify_images, img_features))
+
+    # C. Textual semantic embedding
+    text_features = await text_batcher.encode(
+        [build_text_description(p) for p in batch]
+    )
+    for product, features in zip(batch, text_features, strict=True):
+        product.semantic_embedding = features.tolist()
+
+    return batch
+
+
+async def compute_product_signals(
+    product: Product, fetcher: ImageFetcher
+) -> Product | None:
+    """
+    Computes visual and textual embeddings + extracts tags.
+    """
+    processed = await compute_products_signals([product], fetcher)
+    return processed[0] if processed else None
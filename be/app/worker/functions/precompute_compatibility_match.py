@@ -1,8 +1,19 @@
-from sqlmodel import Session, func, select
-from app.models import Product, ProductCompatibility
-from app.worker.utils.config_model import CATEGORY_MAP, FIT_COMPATIBILITY
-from sentence_transformers import util
+import asyncio
+import logging
+import uuid
 from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, TypeVar
+
+from sqlalchemy import literal
+from sqlalchemy.orm import Mapped
+from sqlmodel import Session, col, delete, func, select
+
+from app.core.config import settings
+from app.core.similarity import cosine_similarity
+from app.models import Product, ProductCompatibility, vector_col
+from app.worker.utils.config_model import CATEGORY_MAP, FIT_COMPATIBILITY
+from app.worker.utils.executor import inference_executor
 
 # --- STYLIST WEIGHTING CONFIGURATION ---
 # Higher values = more influence on the final recommendation
@@ -14,6 +25,13 @@ WEIGHTS = {
     "color": 0.05,  # Bonus: Harmony
 }
 
+# Number of outgoing edges kept per product in the compatibility graph
+MAX_MATCHES = 40
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
 
 def get_season_score(p1_season: str | None, p2_season: str | None) -> float:
     if not p1_season or not p2_season:
@@ -40,97 +58,83 @@ def get_occasion_score(p1_tags: list[str], p2_tags: list[str]) -> float:
     return len(intersection) / len(set1.union(set2))
 
 
-async def precompute_fuzzy_compatibility(session: Session, new_product: Product):
-    print("precompute start")
-    current_sub = (new_product.sub_category or "").lower()
-    target_categories = [c.lower() for c in CATEGORY_MAP.get(current_sub, [])]
+@dataclass(frozen=True)
+class ScoringProduct:
+    """
+    The fields scoring reads, as plain data: the inference executor may ship
+    them to another process, where an ORM instance has no session.
+    """
 
-    print(target_categories)
-    if not target_categories:
-        print(f"No target categories mapped for: {current_sub}")
-        return []
+    id: uuid.UUID
+    sub_category: str
+    season: str | None
+    fit: str | None
+    occasion_tags: list[str]
+    style_embedding: list[float] | None
+    complementary_embedding: list[float] | None
 
-    statement_1 = (
-        select(Product)
-        .where(
-            Product.id != new_product.id,
-            func.lower(Product.sub_category) == (target_categories[0]),
+    @classmethod
+    def of(cls, product: Any) -> "ScoringProduct":
+        """From a Product or a row of CANDIDATE_COLUMNS."""
+        return cls(
+            id=product.id,
+            sub_category=product.sub_category,
+            season=product.season,
+            fit=product.fit,
+            occasion_tags=list(product.occasion_tags or []),
+            style_embedding=product.style_embedding,
+            complementary_embedding=product.complementary_embedding,
         )
-        .limit(500)
-    )
 
-    statement_2 = (
-        select(Product)
-        .where(
-            Product.id != new_product.id,
-            func.lower(Product.sub_category) == (target_categories[1]),
-        )
-        .limit(300)
-    )
-
-    statement_3 = (
-        select(Product)
-        .where(
-            Product.id != new_product.id,
-            func.lower(Product.sub_category) == (target_categories[2]),
-        )
-        .limit(200)
-    )
 
-    candidates = (
-        session.exec(statement_1).all()
-        + session.exec(statement_2).all()
-        + session.exec(statement_3).all()
-    )
+def score_compatibility(
+    base: Product | ScoringProduct, cand: Product | ScoringProduct
+) -> float | None:
+    """
+    Weighted stylist score of `cand` as a match for `base`.
+    Returns None when one of the vectors is missing.
+    """
+    if base.complementary_embedding is None or cand.style_embedding is None:
+        return None
 
-    scored_candidates = []
+    # A. Season Score (Soft)
+    s_score = get_season_score(base.season, cand.season)
 
-    for cand in candidates:
-        # A. Season Score (Soft)
-        s_score = get_season_score(new_product.season, cand.season)
-
-        # B. Occasion Score (Soft)
-        o_score = get_occasion_score(
-            new_product.occasion_tags, cand.occasion_tags)
-
-        if new_product.complementary_embedding is None or cand.style_embedding is None:
-            print(
-                f"Skipping compatibility check: One vector is None",
-                new_product.complementary_embedding,
-                cand.style_embedding,
-            )
-            continue
+    # B. Occasion Score (Soft)
+    o_score = get_occasion_score(base.occasion_tags, cand.occasion_tags)
 
-        # C. Style/Vibe (Vector Similarity)
-        v_score = util.cos_sim(
-            new_product.complementary_embedding, cand.style_embedding
-        ).item()
+    # C. Style/Vibe (Vector Similarity)
+    v_score = cosine_similarity(base.complementary_embedding, cand.style_embedding)
 
-        # D. Fit (Stylist Rule)
-        f_score = FIT_COMPATIBILITY.get((new_product.fit, cand.fit), 0.5)
+    # D. Fit (Stylist Rule)
+    f_score = FIT_COMPATIBILITY.get((base.fit, cand.fit), 0.5)
 
-        # FINAL WEIGHTED SUM
-        final_score = (
-            (s_score * WEIGHTS["season"])
-            + (o_score * WEIGHTS["occasion"])
-            + (v_score * WEIGHTS["style_vibe"])
-            + (f_score * WEIGHTS["fit"])
-        )
+    # FINAL WEIGHTED SUM
+    return (
+        (s_score * WEIGHTS["season"])
+        + (o_score * WEIGHTS["occasion"])
+        + (v_score * WEIGHTS["style_vibe"])
+        + (f_score * WEIGHTS["fit"])
+    )
 
-        scored_candidates.append((cand, final_score))
 
-    category_groups = defaultdict(list)
-    for cand, score in scored_candidates:
-        # Assuming 'cand' has a .category attribute
-        category_groups[cand.sub_category].append((cand, score))
+def select_diverse_matches(
+    scored: list[tuple[T, float, str]], limit: int = MAX_MATCHES
+) -> list[tuple[T, float, str]]:
+    """
+    Round-robin selection over categories so one category can't fill the
+    whole top list. `scored` holds (item, score, category) tuples.
+    """
+    category_groups: defaultdict[str, list[tuple[T, float, str]]] = defaultdict(list)
+    for entry in scored:
+        category_groups[entry[2]].append(entry)
 
-    # 2. Sort each category group by score descending
+    # 1. Sort each category group by score descending
     for cat in category_groups:
         category_groups[cat].sort(key=lambda x: x[1], reverse=True)
 
-    # 3. Diverse Selection (Round-Robin)
-    top_matches = []
-    limit = 40
+    # 2. Diverse Selection (Round-Robin)
+    top_matches: list[tuple[T, float, str]] = []
     categories = list(category_groups.keys())
 
     # We loop through the ranks (0, 1, 2...) and pick one from each category
@@ -146,20 +150,285 @@ async def precompute_fuzzy_compatibility(session: Session, new_product: Product)
             else:
                 # No more items in this category, stop checking it
                 categories.remove(cat)
-        rank_idx += 1  # 2. Sort by Score and Pick Top 40
+        rank_idx += 1
+
+    return top_matches
+
+
+def get_occasion_context(product: Any) -> str:
+    return product.occasion_tags[0] if product.occasion_tags else "General"
+
+
+# Only the columns needed for scoring, so full rows aren't dragged over the wire
+CANDIDATE_COLUMNS: tuple[Mapped[Any], ...] = (
+    col(Product.id),
+    col(Product.sub_category),
+    col(Product.season),
+    col(Product.fit),
+    col(Product.occasion_tags),
+    col(Product.style_embedding),
+    col(Product.complementary_embedding),
+)
+
+
+def fetch_candidates(session: Session, new_product: Product) -> list[ScoringProduct]:
+    """
+    Nearest neighbours of the new product's complementary vector in each
+    target category, served by the partial HNSW indexes on style_embedding.
+    """
+    current_sub = (new_product.sub_category or "").lower()
+    target_categories = [c.lower() for c in CATEGORY_MAP.get(current_sub, [])]
+
+    if not target_categories:
+        logger.info(f"No target categories mapped for: {current_sub}")
+        return []
+
+    if new_product.complementary_embedding is None:
+        logger.info(f"Skipping candidate retrieval: no vector for {new_product.id}")
+        return []
+
+    limits = settings.COMPATIBILITY_CANDIDATE_LIMITS
+    # An HNSW scan returns at most ef_search rows
+    ef_search = max(settings.COMPATIBILITY_ANN_EF_SEARCH, max(limits))
+    session.exec(select(func.set_config("hnsw.ef_search", str(ef_search), True)))
+
+    candidates: list[ScoringProduct] = []
+    # Categories past the configured limits get no candidates
+    for category, limit in zip(target_categories, limits, strict=False):
+        statement = (
+            select(*CANDIDATE_COLUMNS)
+            .where(
+                Product.id != new_product.id,
+                # Inlined so the planner can match the partial index predicate
+                func.lower(Product.sub_category)
+                == literal(category, literal_execute=True),
+                col(Product.style_embedding).is_not(None),
+            )
+            .order_by(
+                vector_col(Product.style_embedding).cosine_distance(
+                    new_product.complementary_embedding
+                )
+            )
+            .limit(limit)
+        )
+        candidates += [ScoringProduct.of(row) for row in session.exec(statement)]
+
+    return candidates
+
+
+def fetch_linked_products(
+    session: Session, new_product: Product, candidates: list[ScoringProduct]
+) -> list[ScoringProduct]:
+    """
+    Products with an edge to `new_product` that aren't among its candidates.
+    After a re-ingest their edge is scored against the old signals, so it
+    has to be re-scored (or dropped) along with the candidates' edges.
+    """
+    statement = (
+        select(*CANDIDATE_COLUMNS)
+        .join(
+            ProductCompatibility,
+            col(ProductCompatibility.base_product_id) == col(Product.id),
+        )
+        .where(
+            ProductCompatibility.recommended_product_id == new_product.id,
+            col(Product.id).not_in([c.id for c in candidates]),
+        )
+    )
+    return [ScoringProduct.of(row) for row in session.exec(statement)]
+
+
+def score_candidates(
+    new_product: ScoringProduct, candidates: list[ScoringProduct]
+) -> list[tuple[ScoringProduct, float, str]]:
+    """(candidate, score, category) for every candidate that can be scored."""
+    scored_candidates: list[tuple[ScoringProduct, float, str]] = []
+    for cand in candidates:
+        score = score_compatibility(new_product, cand)
+        if score is None:
+            logger.info(
+                "Skipping compatibility check: One vector is None "
+                f"{new_product.id} {cand.id}"
+            )
+            continue
+        scored_candidates.append((cand, score, cand.sub_category))
+    return scored_candidates
+
+
+def score_reverse_edges(
+    new_product: ScoringProduct, neighbours: list[ScoringProduct]
+) -> list[tuple[ScoringProduct, float]]:
+    """
+    (neighbour, score) of `new_product` as a match for each neighbour whose
+    CATEGORY_MAP accepts the new product's category.
+    """
+    new_category = (new_product.sub_category or "").lower()
+    reverse_scored: list[tuple[ScoringProduct, float]] = []
+    for neighbour in neighbours:
+        targets = CATEGORY_MAP.get((neighbour.sub_category or "").lower(), [])
+        if new_category not in [c.lower() for c in targets]:
+            continue
+        score = score_compatibility(neighbour, new_product)
+        if score is not None:
+            reverse_scored.append((neighbour, score))
+    return reverse_scored
+
+
+def update_reverse_edges(
+    session: Session,
+    new_product: Product,
+    reverse_scored: list[tuple[ScoringProduct, float]],
+) -> list[uuid.UUID]:
+    """
+    Incremental maintenance: offer `new_product` to each neighbour's top list.
+    An edge is only inserted when the new score beats the neighbour's current
+    minimum (or the list isn't full yet), and the neighbour's list is then
+    re-selected with the same round-robin rules so diversity is preserved.
+    Edges to `new_product` from products that didn't score it again are
+    dropped. Cost depends on the neighbourhood size, not the catalog size.
+    Returns the ids of the neighbours whose edges changed.
+    """
+    rescored = [n.id for n, _ in reverse_scored]
+    changed = list(
+        session.exec(
+            select(ProductCompatibility.base_product_id).where(
+                ProductCompatibility.recommended_product_id == new_product.id,
+                col(ProductCompatibility.base_product_id).not_in(rescored),
+            )
+        ).all()
+    )
+    if changed:
+        session.exec(
+            delete(ProductCompatibility).where(
+                col(ProductCompatibility.recommended_product_id) == new_product.id,
+                col(ProductCompatibility.base_product_id).in_(changed),
+            )
+        )
+    if not reverse_scored:
+        return changed
+
+    # Load all current edges of the neighbourhood in one query
+    statement = (
+        select(ProductCompatibility, Product.sub_category)
+        .join(
+            Product,
+            col(Product.id) == col(ProductCompatibility.recommended_product_id),
+        )
+        .where(col(ProductCompatibility.base_product_id).in_(rescored))
+    )
+    edges_by_base: defaultdict[
+        uuid.UUID, list[tuple[ProductCompatibility, float, str]]
+    ] = defaultdict(list)
+    for edge, category in session.exec(statement).all():
+        edges_by_base[edge.base_product_id].append(
+            (edge, edge.compatibility_score, category)
+        )
+
+    for neighbour, score in reverse_scored:
+        existing: list[tuple[ProductCompatibility, float, str]] = []
+        for entry in edges_by_base[neighbour.id]:
+            if entry[0].recommended_product_id == new_product.id:
+                # Stale edge from a previous ingest of this product
+                session.delete(entry[0])
+                changed.append(neighbour.id)
+            else:
+                existing.append(entry)
+
+        if len(existing) >= MAX_MATCHES and score <= min(s for _, s, _ in existing):
+            continue
 
-    # 3. Store in DB
+        new_edge = ProductCompatibility(
+            base_product_id=neighbour.id,
+            recommended_product_id=new_product.id,
+            compatibility_score=score,
+            occasion_context=get_occasion_context(neighbour),
+        )
+        kept = select_diverse_matches(
+            existing + [(new_edge, score, new_product.sub_category)]
+        )
+        kept_edges = {id(edge) for edge, _, _ in kept}
+        if id(new_edge) not in kept_edges:
+            # Beats the minimum but would break the category balance
+            continue
+
+        for edge, _, _ in existing:
+            if id(edge) not in kept_edges:
+                session.delete(edge)
+        session.add(new_edge)
+        if neighbour.id not in changed:
+            changed.append(neighbour.id)
+
+    return changed
+
+
+def store_edges(
+    session: Session,
+    new_product: Product,
+    top_matches: list[tuple[ScoringProduct, float, str]],
+    reverse_scored: list[tuple[ScoringProduct, float]] | None,
+) -> list[uuid.UUID]:
+    # Replace the outgoing edges of a previous run
+    session.exec(
+        delete(ProductCompatibility).where(
+            col(ProductCompatibility.base_product_id) == new_product.id
+        )
+    )
     links = [
         ProductCompatibility(
             base_product_id=new_product.id,
             recommended_product_id=item.id,
             compatibility_score=score,
-            occasion_context=new_product.occasion_tags[0]
-            if new_product.occasion_tags
-            else "General",
+            occasion_context=get_occasion_context(new_product),
         )
-        for item, score in top_matches
+        for item, score, _ in top_matches
     ]
-
     session.add_all(links)
+
+    changed = []
+    if reverse_scored is not None:
+        changed = update_reverse_edges(session, new_product, reverse_scored)
     session.commit()
+    return changed
+
+
+async def precompute_fuzzy_compatibility(
+    session: Session, new_product: Product, incremental: bool = True
+) -> list[uuid.UUID]:
+    """
+    Builds the outgoing edges of `new_product`. With `incremental` the
+    reverse edges are also patched into the neighbours' top lists, so a
+    single ingest never needs to re-score the whole catalog.
+
+    Scoring runs on the inference executor and DB work on a thread, so the
+    event loop stays free for other jobs. Returns the ids of every product
+    whose outgoing edges changed.
+    """
+    logger.info(f"Precomputing compatibility of {new_product.id}")
+    candidates = await asyncio.to_thread(fetch_candidates, session, new_product)
+
+    # Plain data for the executor, which may run in another process
+    scoring_product = ScoringProduct.of(new_product)
+    scored_candidates = await inference_executor.run(
+        score_candidates, scoring_product, candidates
+    )
+    top_matches = select_diverse_matches(scored_candidates)
+
+    reverse_scored: list[tuple[ScoringProduct, float]] | None = None
+    if incremental:
+        # Includes the products linked to a previous ingest of this product
+        linked = await asyncio.to_thread(
+            fetch_linked_products, session, new_product, candidates
+        )
+        reverse_scored = await inference_executor.run(
+            score_reverse_edges, scoring_product, candidates + linked
+        )
+
+    changed = await asyncio.to_thread(
+        store_edges, session, new_product, top_matches, reverse_scored
+    )
+    if incremental:
+        logger.info(
+            f"Updated reverse edges of {len(changed)} neighbours of {new_product.id}"
+        )
+
+    return [new_product.id] + changed
@@ -0,0 +1,142 @@
+"""
+Materialises the top outfits (bottom + shoe + accessory) of every base
+product from its compatibility edges, so the API only re-weights a fixed
+number of stored outfits per request instead of searching combinations.
+"""
+
+import uuid
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.orm import Mapped
+from sqlmodel import Session, col, delete, select
+
+from app.core.config import settings
+from app.models import Product, ProductCompatibility, ProductOutfit
+from app.service.outfit_assembly import (
+    N_OUTFITS,
+    beam_search,
+    build_buckets,
+    pair_matrices,
+)
+
+OUTFIT_CANDIDATE_COLUMNS: tuple[Mapped[Any], ...] = (
+    col(ProductCompatibility.base_product_id),
+    col(ProductCompatibility.compatibility_score),
+    col(Product.id),
+    col(Product.sub_category),
+    col(Product.style_embedding),
+    col(Product.complementary_embedding),
+)
+
+
+def load_outfit_candidates(
+    session: Session, base_ids: Sequence[uuid.UUID]
+) -> dict[uuid.UUID, tuple[list[Any], list[float]]]:
+    """base id -> (candidate rows, compatibility scores) from the stored edges."""
+    statement = (
+        select(*OUTFIT_CANDIDATE_COLUMNS)
+        .join(
+            Product,
+            col(Product.id) == col(ProductCompatibility.recommended_product_id),
+        )
+        .where(col(ProductCompatibility.base_product_id).in_(base_ids))
+    )
+    grouped: dict[uuid.UUID, tuple[list[Any], list[float]]] = {}
+    for row in session.exec(statement).all():
+        rows, scores = grouped.setdefault(row.base_product_id, ([], []))
+        rows.append(row)
+        scores.append(row.compatibility_score)
+    return grouped
+
+
+def build_outfit_triples(
+    base_id: uuid.UUID, rows: list[Any], scores: list[float], k: int
+) -> list[dict[str, Any]]:
+    """Top `k` outfits of one base product, with their component scores."""
+    buckets = build_buckets(rows, np.asarray(scores, dtype=np.float32), size=None)
+    if buckets is None:
+        return []
+
+    # Unweighted pair scores are stored, the API applies PAIR_WEIGHT
+    pairs = pair_matrices(buckets)
+
+    # Round by round: the best outfits among the unused pieces, then the
+    # round's best outfit claims its pieces. Whenever the pieces allow, the
+    # stored set holds N_OUTFITS disjoint outfits plus alternatives to re-weight.
+    per_round = max(k // N_OUTFITS, 1)
+    used = [np.zeros(len(b.products), dtype=bool) for b in buckets]
+    seen: set[tuple[int, ...]] = set()
+    picked: list[tuple[int, ...]] = []
+    while len(picked) < k:
+        paths, _ = beam_search(
+            buckets, pairs, used, beam_width=max(per_round, settings.OUTFIT_BEAM_WIDTH)
+        )
+        if not len(paths):
+            break
+        for path in map(tuple, paths[:per_round]):
+            if path not in seen:
+                seen.add(path)
+                picked.append(path)
+        for taken, row in zip(used, paths[0], strict=True):
+            taken[row] = True
+
+    triples = []
+    for b, s, a in picked[:k]:
+        bottom, shoe, accessory = buckets
+        triples.append(
+            {
+                "base_product_id": base_id,
+                "bottom_id": bottom.products[b].id,
+                "shoe_id": shoe.products[s].id,
+                "accessory_id": accessory.products[a].id,
+                "bottom_score": float(bottom.scores[b]),
+                "shoe_score": float(shoe.scores[s]),
+                "accessory_score": float(accessory.scores[a]),
+                "pair_score": float(
+                    pairs[(0, 1)][b, s] + pairs[(0, 2)][b, a] + pairs[(1, 2)][s, a]
+                ),
+            }
+        )
+    return triples
+
+
+def store_outfits(
+    session: Session, base_ids: Sequence[uuid.UUID], commit: bool = True
+) -> int:
+    """Replaces the stored outfits of `base_ids`. Returns how many were written."""
+    if not base_ids:
+        return 0
+    k = settings.OUTFIT_TRIPLES_PER_PRODUCT
+    candidates = load_outfit_candidates(session, base_ids)
+
+    session.exec(
+        delete(ProductOutfit).where(col(ProductOutfit.base_product_id).in_(base_ids))
+    )
+    triples = [
+        t
+        for base_id, (rows, scores) in candidates.items()
+        for t in build_outfit_triples(base_id, rows, scores, k)
+    ]
+    if triples:
+        session.execute(insert(ProductOutfit), triples)
+    if commit:
+        session.commit()
+    return len(triples)
+
+
+def rebuild_outfits(session: Session, chunk_size: int = 256) -> int:
+    """Recomputes the outfits of every product with edges, in one transaction."""
+    base_ids = session.exec(
+        select(ProductCompatibility.base_product_id).distinct()
+    ).all()
+
+    session.exec(delete(ProductOutfit))
+    total = 0
+    for start in range(0, len(base_ids), chunk_size):
+        chunk = base_ids[start : start + chunk_size]
+        total += store_outfits(session, chunk, commit=False)
+    session.commit()
+    return total
@@ -0,0 +1,314 @@
+"""
+Full-catalog rebuild of the ProductCompatibility graph.
+
+Instead of scoring one candidate at a time, every product of a sub_category
+is loaded into a NumPy matrix and scored block by block with matrix
+products. Season and fit become lookup tables indexed by integer codes,
+occasion overlap is computed on tag bitmasks, and the per-category top-k is
+taken with argpartition. Memory is bounded by `block_size` rows x the size of
+the largest target category.
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+from sqlalchemy import insert
+from sqlmodel import Session, delete, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import ProductCompatibility
+from app.service.compatibility_graph import publish_graph_rebuild
+from app.service.queue_service import queue_service
+from app.worker.functions.precompute_compatibility_match import (
+    CANDIDATE_COLUMNS,
+    MAX_MATCHES,
+    WEIGHTS,
+    get_season_score,
+)
+from app.worker.functions.precompute_outfits import rebuild_outfits
+from app.worker.utils.config_model import CATEGORY_MAP, FIT_COMPATIBILITY
+
+logger = logging.getLogger(__name__)
+
+# Tag bitmasks are stored as int64, one bit per distinct occasion tag
+MAX_OCCASION_TAGS = 63
+
+
+@dataclass
+class CategoryMatrix:
+    ids: list[uuid.UUID]
+    season: np.ndarray  # int codes into the season vocabulary
+    fit: np.ndarray  # int codes into the fit vocabulary
+    occasions: np.ndarray  # int64 bitmask of occasion tags
+    style: np.ndarray  # L2-normalised style embeddings (n x d)
+    complementary: np.ndarray  # L2-normalised, zero rows where missing
+    has_complementary: np.ndarray  # bool mask over rows
+    context: list[str]  # occasion_context for the outgoing edges
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    normalised: np.ndarray = matrix / np.maximum(norms, 1e-12)
+    return normalised
+
+
+def _vocabulary(values: Iterable[str | None]) -> dict[str | None, int]:
+    # Index 0 is reserved for missing values
+    vocab: dict[str | None, int] = {None: 0}
+    for value in values:
+        if value and value not in vocab:
+            vocab[value] = len(vocab)
+    return vocab
+
+
+def build_season_table(vocab: dict[str | None, int]) -> np.ndarray:
+    labels = sorted(vocab, key=vocab.__getitem__)
+    return np.array(
+        [[get_season_score(a, b) for b in labels] for a in labels], dtype=np.float32
+    )
+
+
+def build_fit_table(vocab: dict[str | None, int]) -> np.ndarray:
+    labels = sorted(vocab, key=vocab.__getitem__)
+    return np.array(
+        [[FIT_COMPATIBILITY.get((a, b), 0.5) for b in labels] for a in labels],
+        dtype=np.float32,
+    )
+
+
+def occasion_scores(query: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """Vectorised get_occasion_score on tag bitmasks (Jaccard, 0.1 floor)."""
+    inter = np.bitwise_count(query[:, None] & target[None, :]).astype(np.float32)
+    union = np.bitwise_count(query[:, None] | target[None, :]).astype(np.float32)
+    return np.where(inter > 0, inter / np.maximum(union, 1.0), 0.1)
+
+
+def round_robin_pattern(counts: list[int], limit: int) -> list[tuple[int, int]]:
+    """
+    (category, rank) slots picked by the round-robin selection of
+    `select_diverse_matches`, given how many items each category offers.
+    The pattern is the same for every row of a source category.
+    """
+    pattern: list[tuple[int, int]] = []
+    rank_idx = 0
+    while len(pattern) < limit and rank_idx < max(counts, default=0):
+        for cat_idx, count in enumerate(counts):
+            if rank_idx < count:
+                pattern.append((cat_idx, rank_idx))
+                if len(pattern) >= limit:
+                    break
+        rank_idx += 1
+    return pattern
+
+
+def load_catalog(
+    session: Session,
+) -> tuple[dict[str, CategoryMatrix], np.ndarray, np.ndarray]:
+    rows = session.exec(select(*CANDIDATE_COLUMNS)).all()
+
+    season_vocab = _vocabulary(r.season for r in rows)
+    fit_vocab = _vocabulary(r.fit for r in rows)
+    tag_vocab = _vocabulary(t for r in rows for t in (r.occasion_tags or []))
+    del tag_vocab[None]
+    if len(tag_vocab) > MAX_OCCASION_TAGS:
+        raise ValueError(f"Too many distinct occasion tags: {len(tag_vocab)}")
+
+    grouped: defaultdict[str, list[Any]] = defaultdict(list)
+    for row in rows:
+        # Products without a style vector can't be scored as candidates
+        if row.style_embedding is None:
+            continue
+        grouped[(row.sub_category or "").lower()].append(row)
+
+    matrices = {}
+    for category, members in grouped.items():
+        style = _normalise(
+            np.asarray([r.style_embedding for r in members], dtype=np.float32)
+        )
+        has_comp = np.array(
+            [r.complementary_embedding is not None for r in members], dtype=bool
+        )
+        complementary = np.zeros_like(style)
+        if has_comp.any():
+            complementary[has_comp] = _normalise(
+                np.asarray(
+                    [
+                        r.complementary_embedding
+                        for r in members
+                        if r.complementary_embedding is not None
+                    ],
+                    dtype=np.float32,
+                )
+            )
+
+        occasions = np.zeros(len(members), dtype=np.int64)
+        for i, r in enumerate(members):
+            for tag in set(r.occasion_tags or []):
+                occasions[i] |= np.int64(1) << (tag_vocab[tag] - 1)
+
+        matrices[category] = CategoryMatrix(
+            ids=[r.id for r in members],
+            season=np.array([season_vocab[r.season or None] for r in members]),
+            fit=np.array([fit_vocab[r.fit or None] for r in members]),
+            occasions=occasions,
+            style=style,
+            complementary=complementary,
+            has_complementary=has_comp,
+            context=[
+                r.occasion_tags[0] if r.occasion_tags else "General" for r in members
+            ],
+        )
+
+    return matrices, build_season_table(season_vocab), build_fit_table(fit_vocab)
+
+
+def score_block(
+    source: CategoryMatrix,
+    rows: np.ndarray,
+    target: CategoryMatrix,
+    season_table: np.ndarray,
+    fit_table: np.ndarray,
+) -> np.ndarray:
+    """Same weighted sum as `score_compatibility`, for rows x all targets."""
+    v_score = source.complementary[rows] @ target.style.T
+    s_score = season_table[source.season[rows][:, None], target.season[None, :]]
+    f_score = fit_table[source.fit[rows][:, None], target.fit[None, :]]
+    o_score = occasion_scores(source.occasions[rows], target.occasions)
+
+    scores: np.ndarray = (
+        s_score * WEIGHTS["season"]
+        + o_score * WEIGHTS["occasion"]
+        + v_score * WEIGHTS["style_vibe"]
+        + f_score * WEIGHTS["fit"]
+    )
+    return scores
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Per-row top-k indices and scores, sorted descending."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(part, order, axis=1),
+        np.take_along_axis(part_scores, order, axis=1),
+    )
+
+
+def rebuild_graph(session: Session, block_size: int | None = None) -> int:
+    block_size = block_size or settings.COMPATIBILITY_REBUILD_BLOCK_SIZE
+    matrices, season_table, fit_table = load_catalog(session)
+
+    # Readers keep seeing the old graph until the commit
+    session.exec(delete(ProductCompatibility))
+
+    total = 0
+    for category, source in matrices.items():
+        targets = [
+            matrices[c.lower()]
+            for c in CATEGORY_MAP.get(category, [])
+            if c.lower() in matrices
+        ]
+        if not targets or not source.has_complementary.any():
+            continue
+
+        pattern = round_robin_pattern(
+            [min(MAX_MATCHES, len(t.ids)) for t in targets], MAX_MATCHES
+        )
+        sources = np.flatnonzero(source.has_complementary)
+
+        for start in range(0, len(sources), block_size):
+            rows = sources[start : start + block_size]
+            ranked = [
+                top_k(
+                    score_block(source, rows, t, season_table, fit_table), MAX_MATCHES
+                )
+                for t in targets
+            ]
+
+            links = []
+            for b, row in enumerate(rows):
+                for cat_idx, rank in pattern:
+                    idx, scores = ranked[cat_idx]
+                    links.append(
+                        {
+                            "base_product_id": source.ids[row],
+                            "recommended_product_id": targets[cat_idx].ids[
+                                idx[b, rank]
+                            ],
+                            "compatibility_score": float(scores[b, rank]),
+                            "occasion_context": source.context[row],
+                        }
+                    )
+            if links:
+                session.execute(insert(ProductCompatibility), links)
+                total += len(links)
+
+        logger.info(f"Rebuilt {category}: {len(sources)} products")
+
+    session.commit()
+    return total
+
+
+async def rebuild_compatibility_graph(
+    ctx: dict[str, Any], block_size: int | None = None
+) -> int:
+    """arq job: rebuilds the whole compatibility graph in one transaction."""
+    start = time.perf_counter()
+
+    def run() -> int:
+        with Session(engine) as session:
+            total = rebuild_graph(session, block_size=block_size)
+            rebuild_outfits(session)
+            return total
+
+    # NumPy releases the GIL, so the loop and heartbeat keep running
+    total = await asyncio.to_thread(run)
+    await publish_graph_rebuild(ctx["redis"])
+    logger.info(
+        f"Compatibility graph rebuilt: {total} edges in {time.perf_counter() - start:.1f}s"
+    )
+    return total
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the compatibility graph")
+    parser.add_argument(
+        "--block-size",
+        type=int,
+        default=settings.COMPATIBILITY_REBUILD_BLOCK_SIZE,
+        help="Source rows scored per matrix product (bounds memory)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Rebuilding compatibility graph")
+    start = time.perf_counter()
+    with Session(engine) as session:
+        total = rebuild_graph(session, block_size=args.block_size)
+        outfits = rebuild_outfits(session)
+    logger.info(
+        f"Wrote {total} edges and {outfits} outfits in {time.perf_counter() - start:.1f}s"
+    )
+
+    async def notify() -> None:
+        redis = await queue_service.get_redis()
+        await publish_graph_rebuild(redis)
+        await redis.aclose()
+
+    # API processes reload their in-memory graph
+    asyncio.run(notify())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Folds buffered interaction events (see app/service/profile_events.py) into
+the user's Style DNA and spending profile.
+
+Both are exponentially decayed averages: an event's weight halves every
+PROFILE_HALF_LIFE_DAYS, so recent taste dominates. `User.style_weight` keeps
+the decayed weight behind the current profile, which makes each update
+incremental: only the new events' products are read, never the history.
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any
+
+import numpy as np
+from arq import Retry
+from sqlalchemy.orm import Mapped
+from sqlmodel import Session, col, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import InteractionEvent, Product, User
+from app.service.profile_events import PROFILE_EVENTS_KEY, schedule_profile_update
+
+# How much one event says about the user's taste
+EVENT_WEIGHTS = {"view": 1.0, "click": 2.0, "add_to_cart": 4.0, "purchase": 8.0}
+
+# Only events that show willingness to pay move the price stats
+PRICE_EVENTS = {"add_to_cart", "purchase"}
+
+# What apply_events reads of each product
+PROFILE_PRODUCT_COLUMNS: tuple[Mapped[Any], ...] = (
+    col(Product.id),
+    col(Product.price),
+    col(Product.sub_category),
+    col(Product.style_embedding),
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _utc(value: datetime) -> datetime:
+    # Naive timestamps come back from the DB, they are stored in UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def decay(since: datetime, now: datetime) -> float:
+    age_days = max((now - _utc(since)).total_seconds(), 0.0) / 86400
+    return float(0.5 ** (age_days / settings.PROFILE_HALF_LIFE_DAYS))
+
+
+def apply_events(
+    user: User,
+    events: list[InteractionEvent],
+    products: dict[uuid.UUID, Any],
+    now: datetime,
+) -> None:
+    """Updates `user` in place. `products`: id -> row with price, sub_category, style_embedding."""
+    # Everything accumulated so far ages by the time since the last update
+    carried = decay(user.profile_updated_at, now) if user.profile_updated_at else 1.0
+
+    style_weight = user.style_weight * carried
+    if user.style_embedding is not None and style_weight > 0:
+        style_sum = np.asarray(user.style_embedding, dtype=np.float64) * style_weight
+    else:
+        style_sum, style_weight = None, 0.0
+
+    # So does every category's price history, touched by these events or not
+    profile = {
+        category: {**stats, "weight": stats.get("weight", 0.0) * carried}
+        for category, stats in (user.spending_profile or {}).items()
+    }
+
+    for event in events:
+        product = products.get(event.product_id)
+        if product is None:
+            continue
+        weight = EVENT_WEIGHTS[event.event_type] * decay(event.occurred_at or now, now)
+
+        if product.style_embedding is not None:
+            vector = np.asarray(product.style_embedding, dtype=np.float64)
+            style_sum = (
+                vector * weight if style_sum is None else style_sum + vector * weight
+            )
+            style_weight += weight
+
+        if event.event_type in PRICE_EVENTS and product.sub_category:
+            category = product.sub_category.lower()
+            stats = profile.setdefault(
+                category, {"avg": 0.0, "max": 0.0, "weight": 0.0}
+            )
+            total = stats["weight"] + weight
+            stats["avg"] = (
+                stats.get("avg", 0.0) * stats["weight"] + product.price * weight
+            ) / total
+            stats["max"] = max(stats.get("max", 0.0), product.price)
+            stats["weight"] = total
+
+    if style_sum is not None and style_weight > 0:
+        user.style_embedding = (style_sum / style_weight).astype(np.float32).tolist()
+        user.style_weight = style_weight
+    # A new dict, so the JSON column is seen as changed
+    user.spending_profile = profile
+    user.profile_updated_at = now
+
+
+def write_profile(user_id: uuid.UUID, events: list[InteractionEvent]) -> bool:
+    with Session(engine) as session:
+        product_ids = {e.product_id for e in events}
+        statement = select(*PROFILE_PRODUCT_COLUMNS).where(
+            col(Product.id).in_(product_ids)
+        )
+        products = {row.id: row for row in session.exec(statement).all()}
+        # Row lock: two updates of one user never interleave
+        user = session.exec(
+            select(User).where(User.id == user_id).with_for_update()
+        ).first()
+        if user is None:
+            return False
+        apply_events(user, events, products, datetime.now(timezone.utc))
+        session.add(user)
+        session.commit()
+        return True
+
+
+async def update_user_profile(ctx: dict[str, Any], user_id: str) -> int:
+    """arq job: one profile write for every event buffered since the last run."""
+    redis = ctx["redis"]
+    key = PROFILE_EVENTS_KEY.format(user_id)
+
+    pipe = redis.pipeline(transaction=True)
+    pipe.lrange(key, 0, -1)
+    pipe.delete(key)
+    raw, _ = await pipe.execute()
+    if not raw:
+        return 0
+
+    events = [InteractionEvent.model_validate_json(r) for r in raw]
+    try:
+        await asyncio.to_thread(write_profile, uuid.UUID(user_id), events)
+    except Exception as e:
+        # Put them back in front of anything newer and run again
+        await redis.lpush(key, *reversed(raw))
+        logger.warning(f"Profile update of user {user_id} failed, retrying: {e!r}")
+        raise Retry(
+            defer=ctx.get("job_try", 1) * settings.PROFILE_UPDATE_WINDOW_SECONDS
+        ) from e
+
+    # Events that came in while this ran belong to the next window's job,
+    # make sure there is one
+    if await redis.llen(key):
+        await schedule_profile_update(redis, user_id)
+
+    logger.info(f"Profile of user {user_id} updated from {len(events)} events")
+    return len(events)
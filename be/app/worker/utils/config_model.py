@@ -1,9 +1,13 @@
-import torch
-from PIL import Image
-from sentence_transformers import SentenceTransformer, util
+from app.core.config import settings
+from app.worker.utils.encoders import Encoder
 
-vision_model = SentenceTransformer("clip-ViT-B-32")
-text_model = SentenceTransformer("all-MiniLM-L6-v2")
+VISION_MODEL_NAME = "clip-ViT-B-32"
+TEXT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+# Backend (torch / onnx / int8) is picked per model from the settings.
+# Models load lazily on the first encode, only in processes that use them.
+vision_model = Encoder(VISION_MODEL_NAME, settings.VISION_ENCODER_BACKEND)
+text_model = Encoder(TEXT_MODEL_NAME, settings.TEXT_ENCODER_BACKEND)
 
 # Stylist Rule Constants
 CATEGORY_MAP = {
@@ -13,7 +17,7 @@ CATEGORY_MAP = {
     "accessories": ["topwear", "bottomwear", "shoes"],
 }
 
-FIT_COMPATIBILITY = {
+FIT_COMPATIBILITY: dict[tuple[str | None, str | None], float] = {
     ("slim", "oversized"): 1.2,  # bonus for contrast
     ("regular", "regular"): 1.0,
     ("oversized", "oversized"): 0.8,  # often too baggy
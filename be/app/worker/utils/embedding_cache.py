@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import Session, col, select
+
+from app.core.db import engine
+from app.models import ImageEmbedding
+
+
+class EmbeddingCache:
+    """
+    Content-addressed store of image embeddings, keyed by (sha256 of the
+    image bytes, model name). Re-ingests, product updates and duplicate
+    listings reuse the stored vector and skip decode and inference.
+    Hit/miss counters are kept per process.
+    """
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(
+        self, content_hashes: list[str], model_name: str
+    ) -> dict[str, np.ndarray]:
+        if not content_hashes:
+            return {}
+        with Session(engine) as session:
+            statement = select(
+                ImageEmbedding.content_hash, ImageEmbedding.embedding
+            ).where(
+                ImageEmbedding.model_name == model_name,
+                col(ImageEmbedding.content_hash).in_(set(content_hashes)),
+            )
+            found = {
+                content_hash: np.asarray(embedding, dtype=np.float32)
+                for content_hash, embedding in session.exec(statement).all()
+            }
+        self.hits += len(found)
+        self.misses += len(set(content_hashes)) - len(found)
+        return found
+
+    def put_many(self, embeddings: dict[str, np.ndarray], model_name: str) -> None:
+        if not embeddings:
+            return
+        now = datetime.now(timezone.utc)
+        rows = [
+            {
+                "content_hash": content_hash,
+                "model_name": model_name,
+                "embedding": np.asarray(embedding, dtype=np.float32).tolist(),
+                "created_at": now,
+            }
+            for content_hash, embedding in embeddings.items()
+        ]
+        with Session(engine) as session:
+            # Another worker may have cached the same image meanwhile
+            session.execute(
+                insert(ImageEmbedding).values(rows).on_conflict_do_nothing()
+            )
+            session.commit()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def report(self) -> str:
+        return (
+            f"Embedding cache: {self.hits} hits / {self.hits + self.misses} lookups "
+            f"({self.hit_rate:.1%})"
+        )
+
+
+embedding_cache = EmbeddingCache()
@@ -0,0 +1,154 @@
+"""
+Encoder backends for the SentenceTransformer models used by the worker.
+
+- "torch": full-precision PyTorch, the reference.
+- "onnx": ONNX Runtime through sentence-transformers' ONNX backend
+  (needs the `sentence-transformers[onnx]` extra). Transformer text models
+  only: the CLIP models have no ONNX export there.
+- "int8": PyTorch with dynamic int8 quantization of every Linear layer.
+
+Run `python -m app.worker.utils.encoders --model clip-ViT-B-32 --backend int8`
+to measure the cosine drift and the throughput of a backend against fp32.
+"""
+
+import argparse
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Literal
+
+import numpy as np
+from PIL import Image
+
+EncoderBackend = Literal["torch", "onnx", "int8"]
+
+logger = logging.getLogger(__name__)
+
+
+def load_sentence_transformer(model_name: str, backend: EncoderBackend) -> Any:
+    if backend == "onnx" and "clip" in model_name.lower():
+        raise ValueError(
+            f"The onnx encoder backend doesn't support CLIP models ({model_name})"
+        )
+
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "torch":
+        return SentenceTransformer(model_name, device="cpu")
+
+    if backend == "onnx":
+        try:
+            return SentenceTransformer(model_name, device="cpu", backend="onnx")
+        except ImportError as e:
+            raise ImportError(
+                "The onnx encoder backend needs `sentence-transformers[onnx]`"
+            ) from e
+
+    if backend == "int8":
+        import torch
+
+        model = SentenceTransformer(model_name, device="cpu")
+        return torch.ao.quantization.quantize_dynamic(
+            model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+        )
+
+    raise ValueError(f"Unknown encoder backend: {backend}")
+
+
+class Encoder:
+    """
+    One interface for every backend. `name` identifies the model *and* the
+    backend, so caches keyed by it never mix fp32 and quantized vectors.
+
+    The model is only loaded on first use, so importing this module (or
+    config_model) never pulls in torch.
+    """
+
+    def __init__(self, model_name: str, backend: EncoderBackend = "torch"):
+        self.model_name = model_name
+        self.backend = backend
+        self.name = model_name if backend == "torch" else f"{model_name}:{backend}"
+        self._model: Any = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self) -> Any:
+        # Encoders are shared by the executor threads, only one of them loads
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = load_sentence_transformer(
+                        self.model_name, self.backend
+                    )
+        return self._model
+
+    def encode(self, inputs: list[Any], batch_size: int = 32) -> np.ndarray:
+        embeddings: np.ndarray = self.model.encode(
+            inputs, batch_size=batch_size, convert_to_numpy=True
+        ).astype(np.float32)
+        return embeddings
+
+
+def cosine_drift(reference: np.ndarray, candidate: np.ndarray) -> dict[str, float]:
+    ref = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    cand = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cos = (ref * cand).sum(axis=1)
+    return {
+        "mean_cosine": float(cos.mean()),
+        "min_cosine": float(cos.min()),
+        "p5_cosine": float(np.percentile(cos, 5)),
+    }
+
+
+def parity_check(
+    model_name: str, backend: EncoderBackend, inputs: list[Any], batch_size: int = 32
+) -> dict[str, float]:
+    """Cosine drift and throughput of `backend` versus the fp32 torch encoder."""
+    results = {}
+    outputs = {}
+    for name in ("torch", backend):
+        encoder = Encoder(model_name, name)
+        encoder.encode(inputs[:batch_size], batch_size=batch_size)  # warm-up
+        start = time.perf_counter()
+        outputs[name] = encoder.encode(inputs, batch_size=batch_size)
+        results[f"{name}_items_per_s"] = len(inputs) / (time.perf_counter() - start)
+
+    results.update(cosine_drift(outputs["torch"], outputs[backend]))
+    results["speedup"] = (
+        results[f"{backend}_items_per_s"] / results["torch_items_per_s"]
+    )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Encoder backend parity check")
+    parser.add_argument("--model", default="clip-ViT-B-32")
+    parser.add_argument("--backend", choices=["onnx", "int8"], default="int8")
+    parser.add_argument(
+        "--images", help="Directory of sample images (text prompts are used otherwise)"
+    )
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    inputs: list[Any]
+    if args.images:
+        inputs = [
+            Image.open(p).convert("RGB")
+            for p in sorted(Path(args.images).iterdir())
+            if p.suffix.lower() in {".jpg", ".jpeg", ".png", ".webp"}
+        ]
+    else:
+        from app.worker.functions.compute_product import LABEL_TAXONOMIES
+
+        prompts = [p for group in LABEL_TAXONOMIES.values() for p in group]
+        inputs = prompts * 16
+
+    report = parity_check(args.model, args.backend, inputs, args.batch_size)
+    for key, value in report.items():
+        logger.info(f"{key}: {value:.4f}")
+
+
+if __name__ == "__main__":
+    main()
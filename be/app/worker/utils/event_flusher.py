@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import socket
+import uuid
+from datetime import datetime
+from typing import Any, cast
+
+import psycopg
+from redis.asyncio import Redis
+from redis.exceptions import ResponseError
+
+from app.core.config import settings
+from app.core.db import engine
+from app.service.event_log import EVENT_GROUP, EVENT_STREAM_KEY
+
+COPY_COLUMNS = "event_id, occurred_at, user_id, product_id, event_type"
+
+logger = logging.getLogger(__name__)
+
+
+def _str(value: bytes | str) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def partition_for(occurred_at: datetime) -> tuple[str, datetime, datetime]:
+    """Name and [start, end) range of the monthly partition holding `occurred_at`."""
+    start = occurred_at.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return f"interaction_event_{start:%Y_%m}", start, end
+
+
+class EventFlusher:
+    """
+    Moves the Redis event stream into the interaction_event table. Runs as a
+    background task of every worker, each one a consumer of the same group,
+    and writes a batch once EVENT_FLUSH_BATCH_SIZE events are read or
+    EVENT_FLUSH_INTERVAL_SECONDS passed.
+
+    A batch is COPY'd into a temp table and inserted with ON CONFLICT DO
+    NOTHING, keyed by the stream entry id: entries left unacknowledged by a
+    failed flush or a dead worker are claimed again and never duplicated.
+    """
+
+    def __init__(self) -> None:
+        # Stable across restarts of the same container
+        self.consumer = socket.gethostname()
+        self.task: asyncio.Task[None] | None = None
+        self.partitions: set[str] = set()
+        self.flushed = 0
+        self.batches = 0
+
+    def start(self, redis: Redis) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self.run(redis))
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            # Entries read but not flushed stay pending and are claimed again
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self, redis: Redis) -> None:
+        try:
+            await redis.xgroup_create(
+                EVENT_STREAM_KEY, EVENT_GROUP, id="0", mkstream=True
+            )
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+        while True:
+            try:
+                batch = await self.claim_stale(redis) or await self.read_batch(redis)
+                if not batch:
+                    continue
+                await asyncio.to_thread(self.write, batch)
+                ids = [entry_id for entry_id, _ in batch]
+                pipe = redis.pipeline(transaction=False)
+                pipe.xack(EVENT_STREAM_KEY, EVENT_GROUP, *ids)
+                pipe.xdel(EVENT_STREAM_KEY, *ids)
+                await pipe.execute()
+                self.flushed += len(batch)
+                self.batches += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # The batch stays pending and is retried by claim_stale
+                logger.warning(f"Event flush failed: {e!r}")
+                await asyncio.sleep(settings.EVENT_FLUSH_INTERVAL_SECONDS)
+
+    async def claim_stale(self, redis: Redis) -> list[Any]:
+        """Entries some consumer (this one included) read but never acknowledged."""
+        min_idle = int(settings.EVENT_FLUSH_INTERVAL_SECONDS * 10 * 1000)
+        _, entries, *_ = await redis.xautoclaim(
+            EVENT_STREAM_KEY,
+            EVENT_GROUP,
+            self.consumer,
+            min_idle_time=min_idle,
+            start_id="0-0",
+            count=settings.EVENT_FLUSH_BATCH_SIZE,
+        )
+        return cast(list[Any], entries)
+
+    async def read_batch(self, redis: Redis) -> list[Any]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.EVENT_FLUSH_INTERVAL_SECONDS
+        batch: list[Any] = []
+        while len(batch) < settings.EVENT_FLUSH_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            response = await redis.xreadgroup(
+                EVENT_GROUP,
+                self.consumer,
+                {EVENT_STREAM_KEY: ">"},
+                count=settings.EVENT_FLUSH_BATCH_SIZE - len(batch),
+                block=max(int(remaining * 1000), 1),
+            )
+            for _, entries in response or []:
+                batch.extend(entries)
+        return batch
+
+    def write(self, batch: list[Any]) -> None:
+        rows = []
+        for entry_id, fields in batch:
+            fields = {_str(k): _str(v) for k, v in fields.items()}
+            try:
+                rows.append(
+                    (
+                        _str(entry_id),
+                        datetime.fromisoformat(fields["occurred_at"]),
+                        uuid.UUID(fields["user_id"]),
+                        uuid.UUID(fields["product_id"]),
+                        fields["event_type"],
+                    )
+                )
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Skipping malformed event {_str(entry_id)}: {e!r}")
+        if not rows:
+            return
+
+        connection = engine.raw_connection()
+        try:
+            driver = cast(psycopg.Connection[Any], connection.driver_connection)
+            with driver.cursor() as cursor:
+                created = self.create_partitions(
+                    cursor, {partition_for(r[1]) for r in rows}
+                )
+                cursor.execute(
+                    "CREATE TEMP TABLE IF NOT EXISTS interaction_event_staging "
+                    "(LIKE interaction_event) ON COMMIT DELETE ROWS"
+                )
+                with cursor.copy(
+                    f"COPY interaction_event_staging ({COPY_COLUMNS}) FROM STDIN"
+                ) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+                cursor.execute(
+                    f"INSERT INTO interaction_event ({COPY_COLUMNS}) "
+                    f"SELECT {COPY_COLUMNS} FROM interaction_event_staging "
+                    "ON CONFLICT DO NOTHING"
+                )
+            connection.commit()
+        finally:
+            connection.close()
+        self.partitions.update(created)
+
+    def create_partitions(
+        self,
+        cursor: psycopg.Cursor[Any],
+        partitions: set[tuple[str, datetime, datetime]],
+    ) -> set[str]:
+        created = set()
+        for name, start, end in partitions:
+            if name in self.partitions:
+                continue
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF interaction_event "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+            created.add(name)
+        return created
+
+    def report(self) -> str:
+        return f"Event log: {self.flushed} events in {self.batches} batches"
+
+
+event_flusher = EventFlusher()
@@ -0,0 +1,61 @@
+import asyncio
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import ParamSpec, TypeVar
+
+from app.core.config import settings
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+class InferenceExecutor:
+    """
+    Runs model inference and CPU-heavy scoring off the arq event loop, so
+    image downloads, DB I/O and the arq heartbeat keep going while a job
+    computes. The number of calls waiting on the pool is bounded, which keeps
+    memory flat when `max_jobs` > 1.
+
+    With the process backend, dispatched functions and their arguments must
+    be picklable: callers pass plain data (ids, arrays, dataclasses), never
+    ORM instances, whose lazy loads would need a session in the child. Each
+    child loads its own copy of the models it uses (about 600 MB for CLIP
+    ViT-B/32 plus 100 MB for MiniLM in fp32, a quarter of that with the int8
+    backends), so worker memory grows with WORKER_EXECUTOR_WORKERS.
+    """
+
+    def __init__(self) -> None:
+        self.pool: Executor | None = None
+        # Created unbound, it attaches to the running loop on first wait
+        self.semaphore = asyncio.Semaphore(settings.WORKER_EXECUTOR_MAX_INFLIGHT)
+
+    def start(self) -> Executor:
+        if self.pool is not None:
+            return self.pool
+        if settings.WORKER_EXECUTOR == "process":
+            self.pool = ProcessPoolExecutor(
+                max_workers=settings.WORKER_EXECUTOR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        else:
+            self.pool = ThreadPoolExecutor(
+                max_workers=settings.WORKER_EXECUTOR_WORKERS,
+                thread_name_prefix="inference",
+            )
+        return self.pool
+
+    async def run(self, fn: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R:
+        pool = self.start()
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, partial(fn, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+
+inference_executor = InferenceExecutor()
@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass
+
+import httpx
+
+# Statuses worth retrying, anything else is a permanent failure
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+@dataclass
+class FetchedImage:
+    url: str
+    data: bytes
+    # sha256 of the raw bytes, computed while streaming
+    content_hash: str
+
+
+class ImageFetcher:
+    """
+    Shared image downloader for the worker. One pooled `httpx.AsyncClient`
+    keeps connections to the object store alive across jobs, downloads are
+    bounded by a semaphore, and failed requests are retried with exponential
+    backoff. Bytes are hashed as they stream in; decoding is left to the
+    caller so cached images never get decoded at all.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        timeout: float = 10.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+    ):
+        self.retries = retries
+        self.backoff = backoff
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=concurrency,
+                max_keepalive_connections=concurrency,
+            ),
+        )
+
+    async def _download(self, url: str) -> FetchedImage:
+        digest = hashlib.sha256()
+        chunks = []
+        async with self.client.stream("GET", url) as response:
+            if response.status_code != 200:
+                raise httpx.HTTPStatusError(
+                    f"Failed to download image from {url}: {response.status_code}",
+                    request=response.request,
+                    response=response,
+                )
+            async for chunk in response.aiter_bytes():
+                digest.update(chunk)
+                chunks.append(chunk)
+        return FetchedImage(
+            url=url, data=b"".join(chunks), content_hash=digest.hexdigest()
+        )
+
+    async def fetch(self, url: str) -> FetchedImage:
+        error: httpx.HTTPError | None = None
+        async with self.semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    return await self._download(url)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code not in RETRYABLE_STATUS:
+                        raise ImageFetchError(str(e))
+                    error = e
+                except httpx.TransportError as e:
+                    error = e
+
+                if attempt < self.retries:
+                    await asyncio.sleep(self.backoff * 2**attempt)
+
+            raise ImageFetchError(f"Failed to download image from {url}: {error}")
+
+    async def fetch_many(self, urls: list[str]) -> list[FetchedImage | None]:
+        """
+        Prefetches every url in parallel (bounded by the semaphore) and keeps
+        the input order. Failed downloads come back as None.
+        """
+
+        async def safe_fetch(url: str) -> FetchedImage | None:
+            try:
+                return await self.fetch(url)
+            except ImageFetchError as e:
+                logger.warning(f"Error loading image: {e}")
+                return None
+
+        return await asyncio.gather(*(safe_fetch(url) for url in urls))
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from app.worker.utils.encoders import Encoder
+
+logger = logging.getLogger(__name__)
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    probs: np.ndarray = exp / exp.sum(axis=-1, keepdims=True)
+    return probs
+
+
+class LabelBank:
+    """
+    Text embeddings of every taxonomy prompt, encoded once and stacked into a
+    single (labels x dim) matrix. Classifying a batch of image embeddings is
+    one matrix multiply followed by a softmax per taxonomy.
+
+    The matrix is cached on disk under a key made of the model name and a
+    hash of the prompts, so restarts don't re-encode anything and any change
+    to a taxonomy invalidates the cache.
+    """
+
+    def __init__(
+        self,
+        model: Encoder,
+        model_name: str,
+        taxonomies: dict[str, list[str]],
+        cache_dir: str | None = None,
+    ) -> None:
+        self.taxonomies = taxonomies
+        self.slices: dict[str, slice] = {}
+        offset = 0
+        for name, prompts in taxonomies.items():
+            self.slices[name] = slice(offset, offset + len(prompts))
+            offset += len(prompts)
+
+        self.cache_key = self._cache_key(model_name, taxonomies)
+        cached = self._load(cache_dir) if cache_dir else None
+        if cached is None:
+            prompts = [p for group in taxonomies.values() for p in group]
+            self.matrix: np.ndarray = np.asarray(
+                model.encode(prompts, batch_size=len(prompts)), dtype=np.float32
+            )
+            if cache_dir:
+                self._save(cache_dir)
+        else:
+            self.matrix = cached
+
+    @staticmethod
+    def _cache_key(model_name: str, taxonomies: dict[str, list[str]]) -> str:
+        payload = json.dumps(taxonomies, sort_keys=True).encode()
+        digest = hashlib.sha256(payload).hexdigest()[:16]
+        return f"{model_name.replace('/', '_')}-{digest}"
+
+    def _path(self, cache_dir: str) -> Path:
+        return Path(cache_dir) / f"{self.cache_key}.npy"
+
+    def _load(self, cache_dir: str) -> np.ndarray | None:
+        path = self._path(cache_dir)
+        if not path.exists():
+            return None
+        matrix: np.ndarray = np.load(path)
+        if matrix.shape[0] != sum(len(p) for p in self.taxonomies.values()):
+            return None
+        logger.info(f"Label bank loaded from {path}")
+        return matrix
+
+    def _save(self, cache_dir: str) -> None:
+        path = self._path(cache_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so concurrent workers never read a partial file
+        tmp = path.with_suffix(f".{os.getpid()}.tmp.npy")
+        np.save(tmp, self.matrix)
+        os.replace(tmp, path)
+
+    def classify(self, features: Any) -> dict[str, np.ndarray]:
+        """(batch x dim) image embeddings -> {taxonomy: (batch x labels) probs}."""
+        if hasattr(features, "cpu"):
+            features = features.cpu().numpy()
+        logits = np.asarray(features, dtype=np.float32) @ self.matrix.T
+        return {name: softmax(logits[:, s]) for name, s in self.slices.items()}
@@ -1,62 +1,202 @@
 import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
 from arq.connections import RedisSettings
-from sqlmodel import Session, select
+from arq.worker import func
+from sqlalchemy import or_
+from sqlmodel import Session, col, select
+
+from app.core.config import settings
 from app.core.db import engine  # Import your SQLModel engine
 from app.models import Product  # Import your Product model
-import os
-
-from app.worker.functions.compute_product import compute_product_signals
+from app.service.compatibility_graph import publish_graph_update
+from app.worker.functions.compute_product import (
+    compute_product_signals,
+    compute_products_signals,
+    image_batcher,
+    text_batcher,
+    warm_up,
+)
 from app.worker.functions.precompute_compatibility_match import (
     precompute_fuzzy_compatibility,
 )
-import time
+from app.worker.functions.precompute_outfits import store_outfits
+from app.worker.functions.rebuild_compatibility_graph import (
+    rebuild_compatibility_graph,
+)
+from app.worker.functions.update_user_profile import update_user_profile
+from app.worker.utils.embedding_cache import embedding_cache
+from app.worker.utils.event_flusher import event_flusher
+from app.worker.utils.executor import inference_executor
+from app.worker.utils.image_fetcher import ImageFetcher
+
+logger = logging.getLogger(__name__)
 
 
 # 1. The Task Function
-async def process_product(ctx, product_id: str):
+async def process_product(ctx: dict[str, Any], product_id: str) -> None:
     """
     This function runs in the background.
     'ctx' is a dictionary containing the redis connection and other metadata.
     """
-    print(f"--- Starting background task for product: {product_id} ---")
+    logger.info(f"Starting background task for product: {product_id}")
 
-    # Example logic: Fetch from DB and do something (e.g., generate embeddings)
     with Session(engine) as session:
-        statement = select(Product).where(True).limit(10000)
-        products = session.exec(statement).all()
-        for prod in products:
-            await precompute_fuzzy_compatibility(session, prod)
-
-        product = session.get(Product, product_id)
-        if not product or product:
-            print(f"Product {product_id} not found in DB yet. Retrying...")
+        product = await asyncio.to_thread(session.get, Product, product_id)
+        if not product:
+            logger.warning(f"Product {product_id} not found in DB yet")
             return
 
-        product = await compute_product_signals(product)
+        product = await compute_product_signals(product, ctx["image_fetcher"])
+        if product is None:
+            return
         session.add(product)
-        session.commit()
+        await asyncio.to_thread(session.commit)
 
         # 2. Build the Compatibility Graph (Step 3)
-        # This compares the new item against the existing catalog
-        await precompute_fuzzy_compatibility(session, product)
+        # Scores the new item against its candidates and patches the
+        # neighbours' top lists, without re-scoring the whole catalog
+        changed = await precompute_fuzzy_compatibility(
+            session, product, incremental=True
+        )
+        # Every product whose edges changed gets its outfits recomputed
+        await asyncio.to_thread(store_outfits, session, changed)
+        # Let the API processes patch their in-memory graph
+        await publish_graph_update(ctx["redis"], session, changed)
+
+        logger.info(f"Product {product.id} processed successfully!")
+        logger.info(embedding_cache.report())
+
+
+def claim_products(session: Session, product_ids: list[uuid.UUID]) -> list[Product]:
+    """
+    Locks the products of a batch just long enough to stamp a claim on them
+    and commits, so no row lock is held while images download and models
+    run. Claimed products are skipped by concurrent jobs until the claim is
+    released or INGEST_CLAIM_TTL_SECONDS have passed (the job died).
+    """
+    now = datetime.now(timezone.utc)
+    expired = now - timedelta(seconds=settings.INGEST_CLAIM_TTL_SECONDS)
+    statement = select(Product).where(
+        or_(
+            col(Product.ingest_claimed_at).is_(None),
+            col(Product.ingest_claimed_at) < expired,
+        )
+    )
+    if product_ids:
+        statement = statement.where(col(Product.id).in_(product_ids))
+    else:
+        statement = statement.where(
+            col(Product.style_embedding).is_(None),
+            Product.ingest_attempts < settings.INGEST_MAX_ATTEMPTS,
+        ).limit(settings.INGEST_BATCH_SIZE)
+    # Rows another job is claiming right now are skipped, not waited on
+    products = list(session.exec(statement.with_for_update(skip_locked=True)).all())
+    for product in products:
+        product.ingest_claimed_at = now
+    session.commit()
+    return products
+
+
+async def process_products_batch(
+    ctx: dict[str, Any], product_ids: list[uuid.UUID] | None = None
+) -> int:
+    """
+    Bulk ingestion: encodes up to INGEST_BATCH_SIZE products with one
+    batched forward pass per model. Without explicit ids, picks products
+    that have no signals yet and haven't failed INGEST_MAX_ATTEMPTS times.
+    """
+    product_ids = product_ids or []
+    if len(product_ids) > settings.INGEST_BATCH_SIZE:
+        # One job never encodes more than a batch, the rest goes to the next
+        await ctx["redis"].enqueue_job(
+            "process_products_batch", product_ids[settings.INGEST_BATCH_SIZE :]
+        )
+        product_ids = product_ids[: settings.INGEST_BATCH_SIZE]
 
-        time.sleep(1)
-        # Simulate work (e.g., calling an AI API for embeddings)
-        print(f"Product {product.id} processed successfully!")
+    # The claimed products stay loaded after the claim's commit
+    with Session(engine, expire_on_commit=False) as session:
+        products = await asyncio.to_thread(claim_products, session, product_ids)
+        if not products:
+            logger.info("No pending products to process")
+            return 0
+
+        logger.info(f"Starting batch task for {len(products)} products")
+        processed = await compute_products_signals(products, ctx["image_fetcher"])
+
+        # Failed products (no image, undecodable) are counted, so the pending
+        # query stops picking them after INGEST_MAX_ATTEMPTS
+        done = {p.id for p in processed}
+        for product in products:
+            if product.id not in done:
+                product.ingest_attempts += 1
+            product.ingest_claimed_at = None
+
+        # All signals are written back, and the claims released, in one
+        # transaction
+        session.add_all(products)
+        await asyncio.to_thread(session.commit)
+
+        changed: set[uuid.UUID] = set()
+        for product in processed:
+            changed.update(
+                await precompute_fuzzy_compatibility(session, product, incremental=True)
+            )
+        await asyncio.to_thread(store_outfits, session, list(changed))
+        await publish_graph_update(ctx["redis"], session, list(changed))
+
+        logger.info(f"Batch processed: {len(processed)}/{len(products)} products")
+        logger.info(embedding_cache.report())
+        return len(processed)
 
 
 # 2. Worker Configuration
 class WorkerSettings:
     # Point to your Redis container (using the service name from docker-compose)
-    redis_settings = RedisSettings(host=os.getenv(
-        "REDIS_HOST", "localhost"), port=6379)
+    redis_settings = RedisSettings(host=os.getenv("REDIS_HOST", "localhost"), port=6379)
+
+    # Inference runs on the executor pool, so concurrent jobs overlap their
+    # downloads and DB I/O with compute
+    max_jobs = settings.WORKER_MAX_JOBS
 
     # List of functions the worker is allowed to execute
-    functions = [process_product]
+    functions = [
+        process_product,
+        process_products_batch,
+        # Full-catalog rebuild, also available as
+        # `python -m app.worker.functions.rebuild_compatibility_graph`
+        func(rebuild_compatibility_graph, timeout=60 * 60),
+        # Enqueued by POST /events, at most once per user and window
+        update_user_profile,
+    ]
 
     # Optional: Logic to run when the worker starts
-    async def on_startup(ctx):
-        print("Worker starting up...")
+    @staticmethod
+    async def on_startup(ctx: dict[str, Any]) -> None:
+        logger.info("Worker starting up...")
+        inference_executor.start()
+        # One pooled HTTP client for every image download of this worker
+        ctx["image_fetcher"] = ImageFetcher(
+            concurrency=settings.IMAGE_DOWNLOAD_CONCURRENCY,
+            timeout=settings.IMAGE_DOWNLOAD_TIMEOUT,
+            retries=settings.IMAGE_DOWNLOAD_RETRIES,
+        )
+        # Encode (or load) the taxonomy prompts before the first job
+        await inference_executor.run(warm_up)
+        # Writes the POST /events stream to the event log in the background
+        event_flusher.start(ctx["redis"])
 
-    async def on_shutdown(ctx):
-        print("Worker shutting down...")
+    @staticmethod
+    async def on_shutdown(ctx: dict[str, Any]) -> None:
+        logger.info("Worker shutting down...")
+        logger.info(embedding_cache.report())
+        logger.info(image_batcher.report())
+        logger.info(text_batcher.report())
+        await event_flusher.stop()
+        logger.info(event_flusher.report())
+        await ctx["image_fetcher"].aclose()
+        inference_executor.shutdown()
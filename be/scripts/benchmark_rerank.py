@@ -0,0 +1,106 @@
+"""
+Latency of the personalized re-ranking stage for growing candidate pools.
+
+    python scripts/benchmark_rerank.py [--runs 200]
+
+Prints p50/p99 in milliseconds for the vectorised `rank_candidates`, the
+per-candidate Python loop it replaced, and the greedy and beam-search outfit
+assemblers. No database is needed.
+"""
+
+import argparse
+import time
+import uuid
+
+import numpy as np
+
+from app.api.routes.recommedation import (
+    USER_WEIGHTS,
+    calculate_price_score,
+    rank_candidates,
+)
+from app.core.similarity import cosine_similarity
+from app.models import Product, User
+from app.service.outfit_assembly import BeamSearchAssembler, GreedyAssembler
+
+CATEGORIES = ["Bottomwear", "Shoes", "Accessories"]
+
+
+def make_candidates(n: int, rng: np.random.Generator) -> list[Product]:
+    return [
+        Product(
+            id=uuid.uuid4(),
+            name=f"Product {i}",
+            brand="Brand",
+            master_category="Apparel",
+            sub_category=CATEGORIES[i % len(CATEGORIES)],
+            article_type="Item",
+            gender="Unisex",
+            mrp=200.0,
+            price=float(rng.uniform(10, 300)),
+            primary_colour="Black",
+            catalog_date=0,
+            landing_page_url="",
+            style_embedding=rng.normal(size=512).astype(np.float32),
+            complementary_embedding=rng.normal(size=512).astype(np.float32),
+        )
+        for i in range(n)
+    ]
+
+
+def loop_rank(user: User, products: list[Product], comp_scores: list[float]) -> list:
+    scores = []
+    for candidate, comp_score in zip(products, comp_scores):
+        p_score = calculate_price_score(user, candidate)
+        u_style_score = cosine_similarity(user.style_embedding, candidate.style_embedding)
+        scores.append(
+            comp_score * USER_WEIGHTS["compatibility"]
+            + p_score * USER_WEIGHTS["price_match"]
+            + u_style_score * USER_WEIGHTS["style_alignment"]
+        )
+    return scores
+
+
+def measure(fn, runs: int) -> tuple[float, float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Re-ranking latency benchmark")
+    parser.add_argument("--runs", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    user = User(
+        email="bench@example.com",
+        full_name="Bench",
+        hashed_password="",
+        spending_profile={
+            "bottomwear": {"avg": 80.0, "max": 150.0},
+            "shoes": {"avg": 120.0, "max": 250.0},
+        },
+        style_embedding=rng.normal(size=512).astype(np.float32),
+    )
+
+    print(f"{'candidates':>10} {'impl':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for n in (40, 400, 4000):
+        products = make_candidates(n, rng)
+        comp_scores = rng.uniform(0, 1, n).tolist()
+        scores = rank_candidates(user, products, comp_scores)
+        for name, fn in (
+            ("numpy", lambda: rank_candidates(user, products, comp_scores)),
+            ("loop", lambda: loop_rank(user, products, comp_scores)),
+            ("greedy", lambda: GreedyAssembler().assemble(None, products, scores)),
+            ("beam", lambda: BeamSearchAssembler().assemble(None, products, scores)),
+        ):
+            p50, p99 = measure(fn, args.runs)
+            print(f"{n:>10} {name:>10} {p50:>8.3f} {p99:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
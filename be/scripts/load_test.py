@@ -0,0 +1,101 @@
+"""
+Concurrency load test for the hot API routes.
+
+    python scripts/load_test.py --email user@example.com --password ... \
+        --product-id <uuid> [--base-url http://localhost:8000/api/v1]
+        [--concurrency 8 32 128] [--requests 2000]
+
+Logs in once, then hits GET /products/, GET /products/{id} and
+GET /recommendation/{id} with N concurrent clients and prints throughput
+and p50/p99 latency per route and concurrency level. Run it against a
+server built from the previous commit and against this one to compare the
+threadpool-bound sync routes with the async engine. Use the same
+uvicorn --workers and Postgres both times.
+
+The recommendation route is served from the response cache after the
+first request; set RECOMMENDATION_CACHE_ENABLED=false on the server to
+measure the DB path instead.
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+
+
+async def login(client: httpx.AsyncClient, email: str, password: str) -> str:
+    response = await client.post(
+        "/login/access-token", data={"username": email, "password": password}
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def run_level(
+    client: httpx.AsyncClient, path: str, concurrency: int, total: int
+) -> dict:
+    latencies = []
+    errors = 0
+    remaining = total
+
+    async def worker() -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await client.get(path)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "rps": len(latencies) / elapsed,
+        "p50": float(np.percentile(latencies, 50)),
+        "p99": float(np.percentile(latencies, 99)),
+        "errors": errors,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="API concurrency load test")
+    parser.add_argument("--base-url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--product-id", required=True)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 128])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(
+        base_url=args.base_url, limits=limits, timeout=60
+    ) as client:
+        token = await login(client, args.email, args.password)
+        client.headers["Authorization"] = f"Bearer {token}"
+
+        paths = [
+            "/products/?limit=20",
+            f"/products/{args.product_id}",
+            f"/recommendation/{args.product_id}",
+        ]
+        print(f"{'route':<50} {'conc':>5} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8} {'err':>5}")
+        for path in paths:
+            await client.get(path)  # warm-up
+            for concurrency in args.concurrency:
+                r = await run_level(client, path, concurrency, args.requests)
+                print(
+                    f"{path:<50} {concurrency:>5} {r['rps']:>8.1f} "
+                    f"{r['p50']:>8.2f} {r['p99']:>8.2f} {r['errors']:>5}"
+                )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,27 @@
+import os
+from collections.abc import Iterator
+
+# Settings are validated on import. The tests never reach Postgres, they only
+# need these to be set (the environment still wins when it defines them)
+os.environ.setdefault("FIRST_SUPERUSER", "admin@example.com")
+os.environ.setdefault("POSTGRES_SERVER", "localhost")
+os.environ.setdefault("POSTGRES_USER", "postgres")
+os.environ.setdefault("POSTGRES_DB", "app")
+
+import pytest  # noqa: E402
+from sqlalchemy.schema import CreateTable  # noqa: E402
+from sqlmodel import Session, SQLModel, create_engine  # noqa: E402
+
+import app.models  # noqa: E402, F401
+
+
+@pytest.fixture
+def session() -> Iterator[Session]:
+    # In-memory SQLite with the tables only: the HNSW and trigram indexes
+    # are Postgres-specific
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        for table in SQLModel.metadata.sorted_tables:
+            connection.execute(CreateTable(table))
+    with Session(engine) as session:
+        yield session
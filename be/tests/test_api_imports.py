@@ -0,0 +1,21 @@
+import subprocess
+import sys
+
+# Run in a fresh interpreter: other tests may already have imported the models
+CHECK = """
+import sys
+
+import app.main  # noqa: F401
+
+print(",".join(m for m in ("torch", "sentence_transformers") if m in sys.modules))
+"""
+
+
+def test_api_does_not_import_inference_libraries() -> None:
+    # The API process must start without torch / sentence-transformers:
+    # they cost seconds of cold start and hundreds of MB per uvicorn worker
+    result = subprocess.run(
+        [sys.executable, "-c", CHECK], capture_output=True, text=True, check=True
+    )
+    heavy = result.stdout.strip()
+    assert not heavy, f"Importing app.main pulled in: {heavy}"
@@ -0,0 +1,53 @@
+import uuid
+
+import numpy as np
+
+from app.service.compatibility_graph import CompatibilityGraph
+
+
+def make_graph(
+    edges: dict[uuid.UUID, list[tuple[uuid.UUID, float]]],
+) -> CompatibilityGraph:
+    graph = CompatibilityGraph()
+    for base_id, targets in edges.items():
+        graph._node(base_id)
+        for rec_id, _ in targets:
+            graph._node(rec_id)
+    rows = [
+        (graph.node_index[base_id], graph.node_index[rec_id], score)
+        for base_id, targets in edges.items()
+        for rec_id, score in targets
+    ]
+    graph.csr = graph._to_csr(
+        np.array([r[0] for r in rows], dtype=np.int32),
+        np.array([r[1] for r in rows], dtype=np.int32),
+        np.array([r[2] for r in rows], dtype=np.float32),
+        len(graph.node_ids),
+    )
+    return graph
+
+
+def edges_of(
+    graph: CompatibilityGraph, product_id: uuid.UUID
+) -> list[tuple[uuid.UUID, float]]:
+    nodes, scores = graph.get_edges(product_id)
+    return list(zip(graph.product_ids(nodes), scores.tolist(), strict=True))
+
+
+def test_update_overrides_the_edges_until_and_after_compaction() -> None:
+    top, bottom, shoe, new = (uuid.uuid4() for _ in range(4))
+    graph = make_graph({top: [(bottom, 0.25), (shoe, 0.75)], shoe: [(top, 0.5)]})
+    assert edges_of(graph, top) == [(shoe, 0.75), (bottom, 0.25)]
+
+    graph.apply_update({str(top): {"edges": [[str(new), 0.5], [str(shoe), 1.0]]}})
+    updated = [(shoe, 1.0), (new, 0.5)]
+    assert edges_of(graph, top) == updated
+    assert graph.needs_compaction()
+
+    graph.compact()
+
+    assert graph.overlay == {}
+    assert edges_of(graph, top) == updated
+    assert edges_of(graph, shoe) == [(top, 0.5)]
+    # Added by the update, no edges of its own
+    assert edges_of(graph, new) == []
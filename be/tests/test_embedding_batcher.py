@@ -0,0 +1,53 @@
+import asyncio
+
+import numpy as np
+
+from app.service.embedding_batcher import BatchingEncoder
+
+
+def double(inputs: list) -> np.ndarray:
+    return np.asarray(inputs, dtype=np.float32)[:, None] * 2
+
+
+def test_each_caller_gets_its_own_rows() -> None:
+    batcher = BatchingEncoder("test", double, max_batch_size=8, max_wait_ms=5)
+
+    async def main() -> list:
+        return await asyncio.gather(*(batcher.encode([i, i + 100]) for i in range(10)))
+
+    results = asyncio.run(main())
+
+    for i, rows in enumerate(results):
+        assert rows.tolist() == [[2.0 * i], [2.0 * (i + 100)]]
+    assert batcher.encoded == 20
+    assert batcher.batches < 10
+
+
+def test_batches_run_concurrently_up_to_the_limit() -> None:
+    in_flight, peak = 0, 0
+
+    async def run(fn, inputs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        return fn(inputs)
+
+    batcher = BatchingEncoder(
+        "test",
+        double,
+        run=run,
+        max_batch_size=1,
+        max_wait_ms=0,
+        max_concurrent_batches=2,
+    )
+
+    async def main() -> list:
+        return await asyncio.gather(*(batcher.encode_one(i) for i in range(6)))
+
+    results = asyncio.run(main())
+
+    assert [float(r[0]) for r in results] == [2.0 * i for i in range(6)]
+    assert peak == 2
+    assert batcher.batches == 6
@@ -0,0 +1,103 @@
+import itertools
+
+import numpy as np
+
+from app.models import Product
+from app.service.outfit_assembly import (
+    PAIR_WEIGHT,
+    BeamSearchAssembler,
+    GreedyAssembler,
+    build_buckets,
+    pair_matrices,
+)
+
+
+def make_product(name: str, sub_category: str, style: list[float] | None) -> Product:
+    return Product(
+        name=name,
+        brand="Brand",
+        master_category="Apparel",
+        sub_category=sub_category,
+        article_type="Type",
+        gender="Men",
+        mrp=10.0,
+        price=10.0,
+        primary_colour="Black",
+        catalog_date=0,
+        landing_page_url="",
+        style_embedding=style,
+    )
+
+
+def make_candidates() -> tuple[list[Product], np.ndarray]:
+    # The best piece of each slot clashes with the others, the runners-up
+    # share one style
+    products = [
+        make_product("b1", "Bottomwear", [1.0, 0.0]),
+        make_product("b2", "Bottomwear", [0.0, 1.0]),
+        make_product("s1", "Shoes", [-1.0, 0.0]),
+        make_product("s2", "Shoes", [0.0, 1.0]),
+        make_product("a1", "Accessories", [0.0, -1.0]),
+        make_product("a2", "Accessories", [0.0, 1.0]),
+    ]
+    scores = np.array([1.0, 0.9, 1.0, 0.9, 1.0, 0.9], dtype=np.float32)
+    return products, scores
+
+
+def names(outfit: dict[str, Product]) -> list[str]:
+    return [outfit[slot].name for slot in ("bottom", "shoe", "accessory")]
+
+
+def brute_force_best(products: list[Product], scores: np.ndarray) -> list[str]:
+    buckets = build_buckets(products, scores, size=None)
+    assert buckets is not None
+    pairs = pair_matrices(buckets, PAIR_WEIGHT)
+
+    def total(rows: tuple[int, ...]) -> float:
+        return sum(
+            float(b.scores[r]) for b, r in zip(buckets, rows, strict=True)
+        ) + sum(float(pairs[(i, j)][rows[i], rows[j]]) for i, j in pairs)
+
+    best = max(itertools.product(*(range(len(b.products)) for b in buckets)), key=total)
+    return [b.products[r].name for b, r in zip(buckets, best, strict=True)]
+
+
+def test_beam_search_finds_the_outfit_greedy_misses() -> None:
+    products, scores = make_candidates()
+    base = make_product("top", "Topwear", [0.0, 1.0])
+
+    greedy = GreedyAssembler().assemble(base, products, scores, n_outfits=1)
+    beam = BeamSearchAssembler(beam_width=4, time_budget_ms=10_000).assemble(
+        base, products, scores, n_outfits=1
+    )
+
+    assert names(greedy[0]) == ["b1", "s1", "a1"]
+    assert names(beam[0]) == brute_force_best(products, scores) == ["b2", "s2", "a2"]
+
+
+def test_spent_budget_falls_back_to_greedy_outfits() -> None:
+    products, scores = make_candidates()
+    base = make_product("top", "Topwear", [0.0, 1.0])
+
+    # The deadline has passed before the first slot is expanded
+    beam = BeamSearchAssembler(time_budget_ms=-1).assemble(base, products, scores)
+    greedy = GreedyAssembler().assemble(base, products, scores)
+
+    assert [names(o) for o in beam] == [names(o) for o in greedy]
+
+
+def test_missing_style_only_drops_the_pair_terms_of_that_piece() -> None:
+    products, scores = make_candidates()
+    products[1].style_embedding = None  # b2
+
+    buckets = build_buckets(products, scores, size=None)
+    assert buckets is not None
+    bottoms = buckets[0]
+    pairs = pair_matrices(buckets)
+
+    assert [p.name for p in bottoms.products] == ["b1", "b2"]
+    assert not bottoms.style[1].any()
+    # b1 still pairs with the shoes and accessories, b2 with nothing
+    assert pairs[(0, 1)][0].tolist() == [-1.0, 0.0]
+    assert not pairs[(0, 1)][1].any() and not pairs[(0, 2)][1].any()
+    assert pairs[(1, 2)].any()
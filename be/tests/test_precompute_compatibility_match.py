@@ -0,0 +1,127 @@
+import pickle
+import uuid
+
+from sqlmodel import Session, select
+
+from app.models import Product, ProductCompatibility
+from app.worker.functions.precompute_compatibility_match import (
+    MAX_MATCHES,
+    ScoringProduct,
+    fetch_linked_products,
+    score_candidates,
+    score_compatibility,
+    select_diverse_matches,
+    update_reverse_edges,
+)
+
+
+def make_product(session: Session, sub_category: str) -> Product:
+    product = Product(
+        name="Product",
+        brand="Brand",
+        master_category="Apparel",
+        sub_category=sub_category,
+        article_type="Type",
+        gender="Men",
+        mrp=10.0,
+        price=10.0,
+        primary_colour="Black",
+        catalog_date=0,
+        landing_page_url="",
+    )
+    session.add(product)
+    return product
+
+
+def link(session: Session, base: Product, target: Product, score: float) -> None:
+    session.add(
+        ProductCompatibility(
+            base_product_id=base.id,
+            recommended_product_id=target.id,
+            compatibility_score=score,
+            occasion_context="General",
+        )
+    )
+
+
+def edges_of(session: Session, base: Product) -> dict[uuid.UUID, float]:
+    edges = session.exec(
+        select(ProductCompatibility).where(
+            ProductCompatibility.base_product_id == base.id
+        )
+    ).all()
+    return {e.recommended_product_id: e.compatibility_score for e in edges}
+
+
+def test_diverse_matches_take_turns_between_categories() -> None:
+    scored = [("a1", 0.9, "a"), ("a2", 0.8, "a"), ("a3", 0.7, "a"), ("b1", 0.1, "b")]
+
+    assert select_diverse_matches(scored, limit=3) == [
+        ("a1", 0.9, "a"),
+        ("b1", 0.1, "b"),
+        ("a2", 0.8, "a"),
+    ]
+
+
+def test_new_product_joins_a_neighbour_list_that_is_not_full(session: Session) -> None:
+    top = make_product(session, "Topwear")
+    bottom = make_product(session, "Bottomwear")
+    shoe = make_product(session, "Shoes")
+    link(session, top, bottom, 0.5)
+    session.commit()
+
+    changed = update_reverse_edges(session, shoe, [(ScoringProduct.of(top), 0.2)])
+    session.commit()
+
+    assert changed == [top.id]
+    assert edges_of(session, top) == {bottom.id: 0.5, shoe.id: 0.2}
+
+
+def test_full_list_keeps_its_edges_against_a_weaker_product(session: Session) -> None:
+    top = make_product(session, "Topwear")
+    for _ in range(MAX_MATCHES):
+        link(session, top, make_product(session, "Bottomwear"), 0.5)
+    shoe = make_product(session, "Shoes")
+    session.commit()
+
+    assert update_reverse_edges(session, shoe, [(ScoringProduct.of(top), 0.4)]) == []
+    assert shoe.id not in edges_of(session, top)
+
+
+def test_reingest_rescores_or_drops_every_edge_to_the_product(
+    session: Session,
+) -> None:
+    shoe = make_product(session, "Shoes")
+    kept, dropped = make_product(session, "Topwear"), make_product(session, "Topwear")
+    link(session, kept, shoe, 0.9)
+    link(session, dropped, shoe, 0.9)
+    session.commit()
+
+    # Neither is an ANN candidate of the re-ingested shoe
+    linked = fetch_linked_products(session, shoe, [])
+    assert {p.id for p in linked} == {kept.id, dropped.id}
+
+    # Only `kept` still scores the new signals
+    changed = update_reverse_edges(session, shoe, [(ScoringProduct.of(kept), 0.3)])
+    session.commit()
+
+    assert set(changed) == {kept.id, dropped.id}
+    assert edges_of(session, kept) == {shoe.id: 0.3}
+    assert edges_of(session, dropped) == {}
+
+
+def test_scoring_runs_on_plain_data_that_pickles(session: Session) -> None:
+    top, shoe = make_product(session, "Topwear"), make_product(session, "Shoes")
+    top.complementary_embedding = [1.0, 0.0, 1.0]
+    shoe.style_embedding = [1.0, 1.0, 0.0]
+    shoe.occasion_tags = ["Casual"]
+    session.commit()
+
+    # What the process backend of the inference executor sends to a child
+    base, cand = pickle.loads(
+        pickle.dumps([ScoringProduct.of(top), ScoringProduct.of(shoe)])
+    )
+
+    [(scored, score, category)] = score_candidates(base, [cand])
+    assert scored.id == shoe.id and category == "Shoes"
+    assert score == score_compatibility(top, shoe)
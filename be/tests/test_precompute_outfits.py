@@ -0,0 +1,99 @@
+import itertools
+import random
+import uuid
+
+import numpy as np
+import pytest
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.models import Product, ProductCompatibility, ProductOutfit
+from app.service.outfit_assembly import N_OUTFITS, select_disjoint
+from app.worker.functions.precompute_outfits import store_outfits
+
+CATEGORIES = ("Bottomwear", "Shoes", "Accessories")
+
+
+def make_product(session: Session, rng: random.Random, sub_category: str) -> Product:
+    product = Product(
+        name="Product",
+        brand="Brand",
+        master_category="Apparel",
+        sub_category=sub_category,
+        article_type="Type",
+        gender="Men",
+        mrp=10.0,
+        price=10.0,
+        primary_colour="Black",
+        catalog_date=0,
+        landing_page_url="",
+        style_embedding=[rng.uniform(-1.0, 1.0) for _ in range(4)],
+        complementary_embedding=[rng.uniform(-1.0, 1.0) for _ in range(4)],
+    )
+    session.add(product)
+    return product
+
+
+def link(session: Session, base: Product, product: Product, score: float) -> None:
+    session.add(
+        ProductCompatibility(
+            base_product_id=base.id,
+            recommended_product_id=product.id,
+            compatibility_score=score,
+            occasion_context="General",
+        )
+    )
+
+
+def unit(vector: list[float] | None) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    return array / np.linalg.norm(array)
+
+
+def pair(a: Product, b: Product) -> float:
+    """Symmetric style compatibility, as pair_matrix computes it."""
+    return (
+        float(unit(a.complementary_embedding) @ unit(b.style_embedding))
+        + float(unit(a.style_embedding) @ unit(b.complementary_embedding))
+    ) / 2
+
+
+def test_stored_triples_hold_the_best_and_enough_disjoint_outfits(
+    session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "OUTFIT_TRIPLES_PER_PRODUCT", 10)
+    rng = random.Random(11)
+    base = make_product(session, rng, "Topwear")
+    slots = [[make_product(session, rng, c) for _ in range(6)] for c in CATEGORIES]
+    products = {p.id: p for slot in slots for p in slot}
+    scores = {pid: rng.random() for pid in products}
+    for pid, score in scores.items():
+        link(session, base, products[pid], score)
+    session.commit()
+
+    def pair_score(ids: tuple[uuid.UUID, ...]) -> float:
+        b, s, a = (products[pid] for pid in ids)
+        return pair(b, s) + pair(b, a) + pair(s, a)
+
+    assert store_outfits(session, [base.id]) == 10
+    # A second run replaces the outfits instead of adding to them
+    assert store_outfits(session, [base.id]) == 10
+    triples = session.exec(select(ProductOutfit)).all()
+    assert len(triples) == 10
+
+    outfits = [(t.bottom_id, t.shoe_id, t.accessory_id) for t in triples]
+    for t, ids in zip(triples, outfits, strict=True):
+        assert [t.bottom_score, t.shoe_score, t.accessory_score] == pytest.approx(
+            [scores[pid] for pid in ids]
+        )
+        assert t.pair_score == pytest.approx(pair_score(ids), abs=1e-5)
+
+    # The first round's best outfit is the exhaustive optimum
+    def total(ids: tuple[uuid.UUID, ...]) -> float:
+        return sum(scores[pid] for pid in ids) + pair_score(ids)
+
+    combinations = itertools.product(*([p.id for p in slot] for slot in slots))
+    assert max(outfits, key=total) == max(combinations, key=total)
+
+    # The API can always pick N_OUTFITS outfits sharing no piece
+    assert len(select_disjoint(outfits, np.ones(len(outfits)), N_OUTFITS)) == N_OUTFITS
@@ -0,0 +1,23 @@
+import uuid
+
+import pytest
+
+from app.service.product_search import RRF_K, reciprocal_rank_fusion
+
+
+def test_fusion_favours_products_both_rankings_agree_on() -> None:
+    only_semantic, both, only_lexical, tail = (uuid.uuid4() for _ in range(4))
+    semantic = [only_semantic, both, tail]
+    lexical = [only_lexical, both]
+
+    fused = reciprocal_rank_fusion(semantic, lexical)
+
+    assert [pid for pid, _ in fused] == [both, only_semantic, only_lexical, tail]
+    scores = dict(fused)
+    assert scores[both] == pytest.approx(2 / (RRF_K + 2))
+    assert scores[only_semantic] == scores[only_lexical] == 1 / (RRF_K + 1)
+    assert scores[tail] == 1 / (RRF_K + 3)
+
+
+def test_fusion_of_empty_rankings_is_empty() -> None:
+    assert reciprocal_rank_fusion([], []) == []
@@ -0,0 +1,70 @@
+import asyncio
+import random
+import uuid
+from typing import Any
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session
+
+from app.api.routes.products import (
+    encode_cursor,
+    products_page_statement,
+    read_products,
+)
+from app.models import Product
+
+
+def make_product(session: Session, catalog_date: int) -> Product:
+    product = Product(
+        name="Product",
+        brand="Brand",
+        master_category="Apparel",
+        sub_category="Topwear",
+        article_type="Type",
+        gender="Men",
+        mrp=10.0,
+        price=10.0,
+        primary_colour="Black",
+        catalog_date=catalog_date,
+        landing_page_url="",
+    )
+    session.add(product)
+    return product
+
+
+def test_cursor_pages_through_every_product_once(session: Session) -> None:
+    rng = random.Random(7)
+    # Few distinct dates, so most pages end inside a run of ties
+    products = [make_product(session, rng.randrange(3)) for _ in range(11)]
+    session.commit()
+    expected = [
+        p.id
+        for p in sorted(products, key=lambda p: (p.catalog_date, p.id), reverse=True)
+    ]
+
+    seen: list[uuid.UUID] = []
+    cursor = None
+    while True:
+        page: list[Any] = list(session.exec(products_page_statement(cursor, 0, 3)))
+        seen.extend(row.id for row in page)
+        if len(page) < 3:
+            break
+        cursor = encode_cursor(page[-1].catalog_date, page[-1].id)
+
+    assert seen == expected
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"cursor": "not a cursor", "skip": 0},
+        {"cursor": encode_cursor(1, uuid.uuid4()), "skip": 3},
+    ],
+)
+def test_bad_paging_is_a_400(params: dict[str, Any]) -> None:
+    # Rejected before the database is touched
+    session: Any = None
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(read_products(session, limit=10, in_stock=False, **params))
+    assert error.value.status_code == 400
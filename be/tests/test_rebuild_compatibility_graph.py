@@ -0,0 +1,98 @@
+import random
+import uuid
+
+import pytest
+from sqlmodel import Session, select
+
+from app.models import Product, ProductCompatibility
+from app.worker.functions import rebuild_compatibility_graph as rebuild
+from app.worker.functions.precompute_compatibility_match import (
+    score_compatibility,
+    select_diverse_matches,
+)
+from app.worker.utils.config_model import CATEGORY_MAP
+
+LIMIT = 5
+
+
+def random_vector(rng: random.Random) -> list[float]:
+    return [rng.uniform(-1.0, 1.0) for _ in range(512)]
+
+
+def make_catalog(session: Session) -> list[Product]:
+    rng = random.Random(7)
+    products = []
+    for category in ("Topwear", "Bottomwear", "Shoes", "Accessories"):
+        for i in range(6):
+            products.append(
+                Product(
+                    name="Product",
+                    brand="Brand",
+                    master_category="Apparel",
+                    sub_category=category,
+                    article_type="Type",
+                    gender="Men",
+                    mrp=10.0,
+                    price=10.0,
+                    primary_colour="Black",
+                    catalog_date=0,
+                    landing_page_url="",
+                    season=rng.choice(["Summer", "Winter", "Spring", None]),
+                    fit=rng.choice(["slim", "oversized", "regular", None]),
+                    occasion_tags=rng.sample(["Casual", "Formal", "Party"], i % 3),
+                    style_embedding=random_vector(rng),
+                    # Products without one have no outgoing edges
+                    complementary_embedding=random_vector(rng) if i else None,
+                )
+            )
+    session.add_all(products)
+    session.commit()
+    return products
+
+
+def loop_edges(products: list[Product], base: Product) -> dict[uuid.UUID, float]:
+    """The per-candidate scoring loop the rebuild replaces."""
+    scored = [
+        (cand.id, score, target)
+        for target in CATEGORY_MAP[base.sub_category.lower()]
+        for cand in products
+        if cand.sub_category.lower() == target
+        and (score := score_compatibility(base, cand)) is not None
+    ]
+    return {
+        cand_id: score for cand_id, score, _ in select_diverse_matches(scored, LIMIT)
+    }
+
+
+def test_rebuild_matches_the_scoring_loop(
+    session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(rebuild, "MAX_MATCHES", LIMIT)
+    products = make_catalog(session)
+
+    # Blocks smaller than a category, so rows are split across blocks
+    total = rebuild.rebuild_graph(session, block_size=4)
+
+    edges = session.exec(select(ProductCompatibility)).all()
+    assert total == len(edges)
+    for base in products:
+        built = {
+            e.recommended_product_id: e.compatibility_score
+            for e in edges
+            if e.base_product_id == base.id
+        }
+        expected = loop_edges(products, base) if base.complementary_embedding else {}
+        assert built.keys() == expected.keys()
+        for product_id, score in expected.items():
+            assert built[product_id] == pytest.approx(score, abs=1e-5)
+
+
+def test_round_robin_pattern_matches_the_selection() -> None:
+    # Category 1 runs out after one item, the others take turns
+    assert rebuild.round_robin_pattern([3, 1, 2], 5) == [
+        (0, 0),
+        (1, 0),
+        (2, 0),
+        (0, 1),
+        (2, 1),
+    ]
@@ -0,0 +1,175 @@
+import asyncio
+import random
+import time
+import uuid
+from typing import Any
+
+import pytest
+
+from app.api.routes import recommedation
+from app.api.routes.recommedation import (
+    USER_WEIGHTS,
+    calculate_price_score,
+    calculate_user_scores,
+    generate_personalized_outfits,
+    get_personalized_outfits_batch_route,
+    rank_candidates,
+    serialize_outfits,
+)
+from app.core.similarity import cosine_similarity
+from app.models import (
+    PersonalizedOutfitsBatch,
+    PersonalizedOutfitsBatchRequest,
+    Product,
+    User,
+)
+from app.service.outfit_assembly import Outfit
+
+
+def make_product(rng: random.Random, sub_category: str) -> Product:
+    return Product(
+        name="Product",
+        brand="Brand",
+        master_category="Apparel",
+        sub_category=sub_category,
+        article_type="Type",
+        gender="Men",
+        mrp=200.0,
+        price=float(rng.randrange(10, 200)),
+        primary_colour="Black",
+        catalog_date=0,
+        landing_page_url="",
+        style_embedding=(
+            [rng.uniform(-1.0, 1.0) for _ in range(8)] if rng.random() < 0.8 else None
+        ),
+    )
+
+
+def make_user(rng: random.Random) -> User:
+    return User(
+        email="user@example.com",
+        hashed_password="x",
+        # No history in bottomwear, avg == max in shoes
+        spending_profile={
+            "topwear": {"avg": 50.0, "max": 120.0},
+            "shoes": {"avg": 80.0, "max": 80.0},
+        },
+        price_sensitivity_score=0.7,
+        style_embedding=[rng.uniform(-1.0, 1.0) for _ in range(8)],
+    )
+
+
+def loop_score(user: User, product: Product, compatibility: float) -> float:
+    """The per-product re-rank the vectorised scoring replaced."""
+    style = (
+        cosine_similarity(user.style_embedding, product.style_embedding)
+        if user.style_embedding is not None and product.style_embedding is not None
+        else 0.6
+    )
+    return (
+        compatibility * USER_WEIGHTS["compatibility"]
+        + calculate_price_score(user, product) * USER_WEIGHTS["price_match"]
+        + style * USER_WEIGHTS["style_alignment"]
+    )
+
+
+def test_vectorised_rerank_matches_the_per_product_loop() -> None:
+    rng = random.Random(3)
+    user = make_user(rng)
+    products = [
+        make_product(rng, category)
+        for category in ("Topwear", "Bottomwear", "Shoes")
+        for _ in range(20)
+    ]
+    compatibility = [rng.random() for _ in products]
+
+    ranked = rank_candidates(user, products, compatibility)
+
+    expected = [
+        loop_score(user, p, c) for p, c in zip(products, compatibility, strict=True)
+    ]
+    assert ranked.tolist() == pytest.approx(expected, abs=1e-5)
+
+
+def test_user_without_style_scores_every_product_neutral() -> None:
+    rng = random.Random(5)
+    user = make_user(rng)
+    user.style_embedding = None
+    products = [make_product(rng, "Bottomwear") for _ in range(3)]
+
+    # No spending history in the category either: 0.5 price, 0.6 style
+    neutral = 0.5 * USER_WEIGHTS["price_match"] + 0.6 * USER_WEIGHTS["style_alignment"]
+    assert calculate_user_scores(user, products).tolist() == pytest.approx(
+        [neutral] * 3
+    )
+
+
+def test_batch_leaves_what_is_past_the_deadline_pending(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    rng = random.Random(7)
+    base_products = [make_product(rng, "Topwear") for _ in range(3)]
+
+    async def nothing(*_args: Any) -> dict[Any, Any]:
+        return {}
+
+    def slow_assemble(*_args: Any) -> list[Outfit]:
+        time.sleep(0.3)
+        return []
+
+    # No stored outfits, every product is assembled live
+    for loader in ("load_outfit_triples", "load_edges", "load_products"):
+        monkeypatch.setattr(recommedation, loader, nothing)
+    monkeypatch.setattr(recommedation, "assemble_outfits", slow_assemble)
+
+    session: Any = None
+    results, pending = asyncio.run(
+        generate_personalized_outfits(
+            session,
+            make_user(rng),
+            base_products,
+            deadline=time.perf_counter() + 0.2,
+        )
+    )
+
+    assert list(results) == [base_products[0].id]
+    assert pending == [b.id for b in base_products[1:]]
+
+
+def test_batch_splices_the_cached_bodies_in_request_order(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    rng = random.Random(9)
+    outfit = {
+        slot: make_product(rng, category)
+        for slot, category in (
+            ("base", "Topwear"),
+            ("bottom", "Bottomwear"),
+            ("shoe", "Shoes"),
+            ("accessory", "Accessories"),
+        )
+    }
+    first, second, late, unknown = (uuid.uuid4() for _ in range(4))
+    bodies = {first: serialize_outfits([outfit]), second: serialize_outfits([])}
+
+    async def build_outfit_bodies(
+        *_args: Any, **_kwargs: Any
+    ) -> tuple[dict[uuid.UUID, bytes], list[uuid.UUID], list[uuid.UUID]]:
+        return bodies, [late], [unknown]
+
+    monkeypatch.setattr(recommedation, "build_outfit_bodies", build_outfit_bodies)
+
+    session: Any = None
+    request = PersonalizedOutfitsBatchRequest(
+        product_ids=[second, late, first, second, unknown]
+    )
+    response = asyncio.run(
+        get_personalized_outfits_batch_route(request, session, make_user(rng))
+    )
+
+    batch = PersonalizedOutfitsBatch.model_validate_json(response.body)
+    assert [r.product_id for r in batch.results] == [second, first]
+    assert batch.results[0].outfits == []
+    assert batch.results[1].outfits[0].shoe.id == outfit["shoe"].id
+    assert batch.pending == [late]
+    assert batch.not_found == [unknown]
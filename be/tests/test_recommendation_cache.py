@@ -0,0 +1,81 @@
+import asyncio
+import uuid
+from typing import Any
+
+from app.models import User
+from app.service.recommendation_cache import RecommendationCache, bump_graph_version
+
+
+class FakePipeline:
+    def __init__(self, redis: "FakeRedis") -> None:
+        self.redis = redis
+        self.keys: list[str] = []
+
+    def incr(self, key: str) -> None:
+        self.keys.append(key)
+
+    async def execute(self) -> None:
+        for key in self.keys:
+            await self.redis.incr(key)
+
+
+class FakeRedis:
+    """The counter commands the cache keys are built from."""
+
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+
+    async def mget(self, *keys: str) -> list[bytes | None]:
+        return [self.data.get(key) for key in keys]
+
+    async def incr(self, key: str) -> None:
+        self.data[key] = str(int(self.data.get(key, b"0")) + 1).encode()
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+
+def make_cache() -> tuple[RecommendationCache, Any]:
+    redis = FakeRedis()
+
+    async def get_redis() -> Any:
+        return redis
+
+    return RecommendationCache(get_redis), redis
+
+
+def make_user() -> User:
+    return User(
+        email="user@example.com",
+        hashed_password="x",
+        spending_profile={"shoes": {"avg": 50.0, "max": 80.0}},
+        style_embedding=[0.5] * 4,
+    )
+
+
+def test_keys_change_with_the_versions_they_depend_on() -> None:
+    cache, redis = make_cache()
+    user = make_user()
+    edited, other = uuid.uuid4(), uuid.uuid4()
+
+    async def keys() -> dict[uuid.UUID, str]:
+        return await cache.keys(user, [edited, other])
+
+    before = asyncio.run(keys())
+    assert asyncio.run(keys()) == before
+
+    # Editing a product invalidates only its own outfits
+    asyncio.run(cache.invalidate([edited]))
+    after_edit = asyncio.run(keys())
+    assert after_edit[edited] != before[edited]
+    assert after_edit[other] == before[other]
+
+    # A full rebuild invalidates everything
+    asyncio.run(bump_graph_version(redis))
+    after_rebuild = asyncio.run(keys())
+    assert all(after_rebuild[pid] != after_edit[pid] for pid in (edited, other))
+
+    # So does any change to the user's profile
+    user.spending_profile = {"shoes": {"avg": 60.0, "max": 80.0}}
+    after_profile = asyncio.run(keys())
+    assert all(after_profile[pid] != after_rebuild[pid] for pid in (edited, other))
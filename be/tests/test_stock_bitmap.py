@@ -0,0 +1,128 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+from sqlmodel import Session
+
+from app.api.routes.products import read_products
+from app.core.config import settings
+from app.models import Inventory, Product
+from app.service.stock_bitmap import StockBitmap, StockSnapshot, stock_bitmap
+
+LONG_AGO = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+def make_product(session: Session, catalog_date: int) -> Product:
+    product = Product(
+        name="Product",
+        brand="Brand",
+        master_category="Apparel",
+        sub_category="Topwear",
+        article_type="Type",
+        gender="Men",
+        mrp=10.0,
+        price=10.0,
+        primary_colour="Black",
+        catalog_date=catalog_date,
+        landing_page_url="",
+    )
+    session.add(product)
+    return product
+
+
+def stock(
+    session: Session, product: Product, count: int, updated_at: datetime = LONG_AGO
+) -> Inventory:
+    inventory = Inventory(
+        product_id=product.id,
+        sku_id=0,
+        size="M",
+        stock_count=count,
+        updated_at=updated_at,
+    )
+    session.add(inventory)
+    return inventory
+
+
+class AsyncSessionOf:
+    """The part of AsyncSession the routes use, over a sync session."""
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    async def exec(self, statement: Any) -> Any:
+        return self.session.exec(statement)
+
+
+def test_snapshot_apply_updates_and_appends() -> None:
+    a, b, new = (uuid.uuid4() for _ in range(3))
+    snapshot = StockSnapshot.build([(a, True), (b, False)])
+
+    updated = snapshot.apply([(b, True), (new, False)])
+
+    assert [updated.in_stock(pid) for pid in (a, b, new)] == [True, True, False]
+    assert updated.sold_out == [new]
+    # The published snapshot is never modified
+    assert snapshot.bits.tolist() == [True, False] and new not in snapshot.index
+
+
+def test_refresh_only_rereads_products_written_since(
+    session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(settings, "STOCK_FULL_REFRESH_SECONDS", 3600)
+    products = [make_product(session, 0) for _ in range(3)]
+    rows = [stock(session, p, 1) for p in products]
+    session.commit()
+    bitmap = StockBitmap()
+
+    assert bitmap.refresh(session) == 0
+    assert bitmap.snapshot.sold_out == []
+
+    # Written without a new timestamp: invisible until the next full rebuild
+    rows[0].stock_count = 0
+    # Stamped, as the trigger would
+    rows[1].stock_count = 0
+    rows[1].updated_at = datetime.now(timezone.utc)
+    added = make_product(session, 0)
+    stock(session, added, 0, updated_at=datetime.now(timezone.utc))
+    session.commit()
+
+    assert bitmap.refresh(session) == 2
+    assert set(bitmap.snapshot.sold_out) == {products[1].id, added.id}
+
+    bitmap.rebuilt_at -= 3600
+    assert bitmap.refresh(session) == 1
+    assert set(bitmap.snapshot.sold_out) == {p.id for p in (*products[:2], added)}
+
+
+def test_in_stock_pages_are_refilled(
+    session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    products = [make_product(session, date) for date in range(10, 0, -1)]
+    for i in (1, 2, 4):
+        stock(session, products[i], 0)
+    session.commit()
+    bitmap = StockBitmap()
+    bitmap.refresh(session)
+    monkeypatch.setattr(stock_bitmap, "snapshot", bitmap.snapshot)
+    monkeypatch.setattr(settings, "PRODUCT_COUNT_TTL", 0)
+
+    async_session: Any = AsyncSessionOf(session)
+
+    def page(cursor: str | None) -> Any:
+        return asyncio.run(
+            read_products(async_session, skip=0, limit=3, cursor=cursor, in_stock=True)
+        )
+
+    first = page(None)
+    second = page(first.next_cursor)
+    last = page(second.next_cursor)
+
+    in_stock = [p.id for i, p in enumerate(products) if i not in (1, 2, 4)]
+    assert [p.id for p in first.data] == in_stock[:3]
+    assert [p.id for p in second.data] == in_stock[3:6]
+    assert [p.id for p in last.data] == in_stock[6:]
+    assert last.next_cursor is None
+    assert all(p.is_in_stock for p in first.data + second.data + last.data)
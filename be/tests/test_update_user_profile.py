@@ -0,0 +1,81 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.models import InteractionEvent, User
+from app.worker.functions.update_user_profile import apply_events
+
+DAY_0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def half_life(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "PROFILE_HALF_LIFE_DAYS", 30.0)
+
+
+def make_product(sub_category: str, price: float, style=None) -> SimpleNamespace:
+    return SimpleNamespace(
+        id=uuid.uuid4(), price=price, sub_category=sub_category, style_embedding=style
+    )
+
+
+def purchase(user: User, product: SimpleNamespace, day: int) -> None:
+    now = DAY_0 + timedelta(days=day)
+    event = InteractionEvent(
+        product_id=product.id, event_type="purchase", occurred_at=now
+    )
+    apply_events(user, [event], {product.id: product}, now)
+
+
+def make_user() -> User:
+    return User(email="user@example.com", full_name="User", hashed_password="x")
+
+
+def test_untouched_categories_age_with_the_profile() -> None:
+    user = make_user()
+    purchase(user, make_product("Shoes", 100.0), day=0)
+    purchase(user, make_product("Tops", 50.0), day=30)
+    purchase(user, make_product("Shoes", 200.0), day=60)
+
+    # The day 0 purchase (weight 8) is two half-lives old by day 60
+    shoes = user.spending_profile["shoes"]
+    assert shoes["weight"] == pytest.approx(8 * 0.25 + 8)
+    assert shoes["avg"] == pytest.approx(180.0)
+    assert shoes["max"] == 200.0
+    # Tops weren't touched on day 60 but are one half-life old
+    assert user.spending_profile["tops"]["weight"] == pytest.approx(4.0)
+    assert user.profile_updated_at == DAY_0 + timedelta(days=60)
+
+
+def test_style_embedding_is_a_decayed_average() -> None:
+    user = make_user()
+    purchase(user, make_product("Shoes", 10.0, style=[1.0, 0.0]), day=0)
+    purchase(user, make_product("Tops", 10.0, style=[0.0, 1.0]), day=30)
+
+    # Weights 4 (one half-life old) and 8
+    assert user.style_embedding == pytest.approx([1 / 3, 2 / 3])
+    assert user.style_weight == pytest.approx(12.0)
+
+
+def test_views_move_the_style_but_not_the_price_stats() -> None:
+    user = make_user()
+    product = make_product("Shoes", 10.0, style=[1.0, 0.0])
+    event = InteractionEvent(product_id=product.id, event_type="view")
+
+    apply_events(user, [event], {product.id: product}, DAY_0)
+
+    assert user.spending_profile == {}
+    assert user.style_weight == pytest.approx(1.0)
+
+
+def test_unknown_products_are_ignored() -> None:
+    user = make_user()
+    event = InteractionEvent(product_id=uuid.uuid4(), event_type="purchase")
+
+    apply_events(user, [event], {}, DAY_0)
+
+    assert user.spending_profile == {}
+    assert user.style_embedding is None
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.models import Product
+from app.worker.worker import claim_products
+
+
+def make_product(session: Session) -> Product:
+    product = Product(
+        name="Product",
+        brand="Brand",
+        master_category="Apparel",
+        sub_category="Topwear",
+        article_type="Type",
+        gender="Men",
+        mrp=10.0,
+        price=10.0,
+        primary_colour="Black",
+        catalog_date=0,
+        landing_page_url="",
+    )
+    session.add(product)
+    session.commit()
+    return product
+
+
+def test_claimed_products_are_skipped_by_the_next_batch(session: Session) -> None:
+    first, second = make_product(session), make_product(session)
+
+    claimed = claim_products(session, [first.id])
+
+    assert [p.id for p in claimed] == [first.id]
+    assert first.ingest_claimed_at is not None
+    # The claim is committed, a concurrent job only gets the other product
+    assert [p.id for p in claim_products(session, [first.id, second.id])] == [second.id]
+
+
+def test_expired_claim_is_taken_over(session: Session) -> None:
+    product = make_product(session)
+    product.ingest_claimed_at = datetime.now(timezone.utc) - timedelta(
+        seconds=settings.INGEST_CLAIM_TTL_SECONDS + 1
+    )
+    session.commit()
+
+    assert [p.id for p in claim_products(session, [])] == [product.id]